@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga do fan-out do servidor de tempo real.
+
+Simula N clientes WebSocket locais (em memória) conectados ao FanoutEngine,
+faz uma série de broadcasts e mede:
+- o tempo da chamada de broadcast (custo para o /notify);
+- a latência de entrega (do broadcast até o send_text de cada cliente), p50 e p99.
+
+Uma fração dos clientes pode ser lenta, para mostrar que eles não atrasam os demais.
+
+Uso:
+    python benchmark_realtime.py --clientes 5000 --mensagens 50 --lentos 0.01
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from realtime_fanout import FanoutEngine
+
+
+class ClienteSimulado:
+    def __init__(self, atraso, latencias):
+        self.atraso = atraso
+        self.latencias = latencias
+
+    async def send_text(self, mensagem):
+        if self.atraso:
+            await asyncio.sleep(self.atraso)
+        enviado_em = float(mensagem)
+        self.latencias.append(time.perf_counter() - enviado_em)
+
+    async def close(self):
+        pass
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+async def executar(num_clientes, num_mensagens, fracao_lentos, atraso_lento, intervalo, politica, tamanho_fila):
+    engine = FanoutEngine(tamanho_fila=tamanho_fila, politica=politica)
+    latencias_rapidos = []
+    latencias_lentos = []
+    num_lentos = int(num_clientes * fracao_lentos)
+    for i in range(num_clientes):
+        if i < num_lentos:
+            engine.conectar(ClienteSimulado(atraso_lento, latencias_lentos))
+        else:
+            engine.conectar(ClienteSimulado(0, latencias_rapidos))
+
+    tempos_broadcast = []
+    for _ in range(num_mensagens):
+        inicio = time.perf_counter()
+        engine.broadcast(repr(inicio))
+        tempos_broadcast.append(time.perf_counter() - inicio)
+        await asyncio.sleep(intervalo)
+
+    # Aguarda os clientes rápidos esvaziarem as filas
+    esperado = (num_clientes - num_lentos) * num_mensagens
+    limite = time.perf_counter() + 30
+    while len(latencias_rapidos) < esperado and time.perf_counter() < limite:
+        await asyncio.sleep(0.01)
+
+    for websocket in list(engine.clientes):
+        engine.desconectar(websocket)
+    await asyncio.sleep(0)
+    return tempos_broadcast, latencias_rapidos, latencias_lentos
+
+
+def ms(segundos):
+    return f'{segundos * 1000:.3f} ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do fan-out de WebSockets')
+    parser.add_argument('--clientes', type=int, default=5000)
+    parser.add_argument('--mensagens', type=int, default=50)
+    parser.add_argument('--lentos', type=float, default=0.01, help='Fração de clientes lentos (padrão: 0.01)')
+    parser.add_argument('--atraso-lento', type=float, default=0.5, help='Atraso de envio dos clientes lentos, em segundos')
+    parser.add_argument('--intervalo', type=float, default=0.02, help='Intervalo entre broadcasts, em segundos')
+    parser.add_argument('--politica', choices=['coalesce', 'drop'], default='coalesce')
+    parser.add_argument('--tamanho-fila', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f'🚀 {args.clientes} clientes, {args.mensagens} broadcasts, '
+          f'{args.lentos:.0%} lentos, política {args.politica}')
+    tempos, rapidos, lentos = asyncio.run(executar(
+        args.clientes, args.mensagens, args.lentos, args.atraso_lento,
+        args.intervalo, args.politica, args.tamanho_fila,
+    ))
+
+    print('\n📊 Chamada de broadcast (enfileiramento):')
+    print(f'   p50: {ms(statistics.median(tempos))}   p99: {ms(percentil(tempos, 99))}   máx: {ms(max(tempos))}')
+    print(f'\n📊 Latência de entrega - clientes rápidos ({len(rapidos)} entregas):')
+    print(f'   p50: {ms(percentil(rapidos, 50))}   p99: {ms(percentil(rapidos, 99))}   máx: {ms(max(rapidos, default=0))}')
+    if lentos:
+        print(f'\n📊 Latência de entrega - clientes lentos ({len(lentos)} entregas):')
+        print(f'   p50: {ms(percentil(lentos, 50))}   p99: {ms(percentil(lentos, 99))}')
+
+
+if __name__ == '__main__':
+    main()
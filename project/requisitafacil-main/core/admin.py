@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Sector, Request, RequestItem
+from .models import User, Sector, Request, RequestItem, SectorSequence, Item, RequestStatusEvent
 from .forms import CustomUserCreationForm # Importa o formulário personalizado
+from .busca import filtrar_por_busca
 
 # Register your models here.
 
@@ -32,20 +33,29 @@ class UserAdmin(BaseUserAdmin):
 
 admin.site.register(Sector)
 
+@admin.register(SectorSequence)
+class SectorSequenceAdmin(admin.ModelAdmin):
+    list_display = ('prefix', 'last_number', 'updated_at')
+    readonly_fields = ('updated_at',)
+
 @admin.register(Request)
 class RequestAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'requester', 'sector', 'request_code', 'urgency', 'created_at', 'status',
     )
     list_filter = ('status', 'urgency', 'sector')
-    search_fields = (
-        'request_code',
-        'observations',
-        'requester__username', 'requester__email',
-        'sector__name',
-    )
+    # Só para exibir a caixa de busca: a busca é feita em get_search_results, pelo índice textual
+    search_fields = ('request_code',)
     date_hierarchy = 'created_at'
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'finished_at', 'wait_seconds', 'service_seconds')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Busca textual indexada (código, itens e observações, sem acentos e por prefixo),
+        # sem os icontains do admin; um código completo também casa exatamente
+        termo = search_term.strip()
+        if not termo:
+            return queryset, False
+        return queryset.filter(request_code=termo) | filtrar_por_busca(queryset, termo), False
 
     fieldsets = (
         (None, {
@@ -57,6 +67,34 @@ class RequestAdmin(admin.ModelAdmin):
         ('Datas de Controle',{
             'fields':('created_at','updated_at')
         }),
+        ('SLA', {
+            'fields': ('started_at', 'finished_at', 'wait_seconds', 'service_seconds')
+        }),
     )
 
-admin.site.register(RequestItem)
\ No newline at end of file
+admin.site.register(RequestItem)
+
+@admin.register(Item)
+class ItemAdmin(admin.ModelAdmin):
+    list_display = ('name', 'category', 'is_active', 'normalized_name', 'updated_at')
+    list_filter = ('category', 'is_active')
+    search_fields = ('name', 'normalized_name')
+    readonly_fields = ('normalized_name', 'created_at', 'updated_at')
+
+@admin.register(RequestStatusEvent)
+class RequestStatusEventAdmin(admin.ModelAdmin):
+    # Histórico só de leitura: eventos são gravados pelas transições de status
+    list_display = ('request', 'action', 'from_status', 'to_status', 'user', 'created_at')
+    list_filter = ('action', 'to_status')
+    search_fields = ('request__request_code', 'user__username')
+    date_hierarchy = 'created_at'
+    list_select_related = ('request', 'user')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,170 @@
+"""
+API JSON somente leitura das requisições, para integrações.
+
+- /api/requisicoes/: listagem com os mesmos filtros de listar_requisicoes (status, urgency, data);
+- /api/requisicoes/<id>/: detalhe de uma requisição;
+- /api/requisicoes/<id>/itens/: itens da requisição.
+
+As regras de acesso são as das telas: Gestor e Almoxarife veem todas as
+requisições, os demais só as próprias. `fields=` escolhe as colunas, e a consulta
+usa `.values()` só com elas, sem instanciar modelos. A listagem é paginada por
+cursor sobre (updated_at, id) em ordem crescente: com `updated_since=` e o
+`cursor` da última resposta, um integrador sincroniza só o que mudou desde a
+última vez. As respostas saem comprimidas com gzip quando o cliente aceita.
+"""
+from functools import wraps
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from .models import RequestItem
+from .pagination import codificar_posicao, decodificar_cursor
+from .queries import filtrar_requisicoes, requisicoes_visiveis
+
+# Nome do campo na API -> caminho no ORM
+CAMPOS_REQUISICAO = {
+    'id': 'id',
+    'request_code': 'request_code',
+    'status': 'status',
+    'urgency': 'urgency',
+    'observations': 'observations',
+    'sector_id': 'sector_id',
+    'sector': 'sector__name',
+    'requester_id': 'requester_id',
+    'requester': 'requester__username',
+    'atendido_por': 'atendido_por__username',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+CAMPOS_REQUISICAO_PADRAO = ['id', 'request_code', 'sector', 'requester', 'urgency', 'status', 'created_at', 'updated_at']
+
+CAMPOS_ITEM = {
+    campo: campo for campo in [
+        'id', 'request_id', 'item_requested', 'quantify', 'category',
+        'quantidade_atendida', 'observacao_item', 'created_at', 'updated_at',
+    ]
+}
+CAMPOS_ITEM_PADRAO = ['id', 'item_requested', 'quantify', 'category', 'quantidade_atendida', 'observacao_item']
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+
+def api_login_required(view):
+    """Como login_required, mas responde 401 em JSON em vez de redirecionar para o login."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'erro': 'Autenticação necessária'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def erro(mensagem, status=400):
+    return JsonResponse({'erro': mensagem}, status=status)
+
+
+def campos_pedidos(request, disponiveis, padrao):
+    bruto = request.GET.get('fields')
+    if not bruto:
+        return list(padrao)
+    campos = list(dict.fromkeys(campo.strip() for campo in bruto.split(',') if campo.strip()))
+    invalidos = [campo for campo in campos if campo not in disponiveis]
+    if invalidos or not campos:
+        raise ValueError(f'Campos inválidos: {", ".join(invalidos)}. Disponíveis: {", ".join(disponiveis)}')
+    return campos
+
+
+def projetar(queryset, campos, mapa, internos=()):
+    """`.values()` só com as colunas pedidas (mais as `internos`, usadas na paginação)."""
+    caminhos = list(dict.fromkeys([mapa[campo] for campo in campos] + list(internos)))
+    return queryset.values(*caminhos)
+
+
+def renomear(linha, campos, mapa):
+    return {campo: linha[mapa[campo]] for campo in campos}
+
+
+def ler_limite(request):
+    try:
+        limite = int(request.GET.get('limit', LIMITE_PADRAO))
+    except ValueError:
+        raise ValueError('limit deve ser um número inteiro')
+    return max(1, min(limite, LIMITE_MAXIMO))
+
+
+def ler_data_hora(valor):
+    momento = parse_datetime(valor)
+    if momento is None:
+        raise ValueError('updated_since deve estar no formato ISO 8601 (ex.: 2025-01-31T08:00:00-03:00)')
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
+
+
+@gzip_page
+@api_login_required
+@require_GET
+def api_requisicoes(request):
+    try:
+        campos = campos_pedidos(request, CAMPOS_REQUISICAO, CAMPOS_REQUISICAO_PADRAO)
+        limite = ler_limite(request)
+        queryset = filtrar_requisicoes(requisicoes_visiveis(request.user), request.GET)
+        if request.GET.get('updated_since'):
+            queryset = queryset.filter(updated_at__gte=ler_data_hora(request.GET['updated_since']))
+        cursor = request.GET.get('cursor')
+        if cursor:
+            posicao = decodificar_cursor(cursor)
+            if posicao is None:
+                raise ValueError('Cursor inválido')
+            updated_at, pk = posicao
+            queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+    except ValueError as e:
+        return erro(str(e))
+
+    linhas = list(
+        projetar(queryset.order_by('updated_at', 'id'), campos, CAMPOS_REQUISICAO, internos=['id', 'updated_at'])
+        [:limite + 1]
+    )
+    tem_mais = len(linhas) > limite
+    linhas = linhas[:limite]
+    if linhas:
+        cursor = codificar_posicao(linhas[-1]['updated_at'], linhas[-1]['id'])
+    return JsonResponse({
+        'resultados': [renomear(linha, campos, CAMPOS_REQUISICAO) for linha in linhas],
+        # Guardar o cursor e continuar dele depois traz só o que mudou nesse meio tempo
+        'cursor': cursor or None,
+        'tem_mais': tem_mais,
+    })
+
+
+@gzip_page
+@api_login_required
+@require_GET
+def api_requisicao(request, pk):
+    try:
+        campos = campos_pedidos(request, CAMPOS_REQUISICAO, CAMPOS_REQUISICAO_PADRAO)
+    except ValueError as e:
+        return erro(str(e))
+    linha = projetar(requisicoes_visiveis(request.user).filter(pk=pk), campos, CAMPOS_REQUISICAO).first()
+    if linha is None:
+        return erro('Requisição não encontrada', status=404)
+    return JsonResponse(renomear(linha, campos, CAMPOS_REQUISICAO))
+
+
+@gzip_page
+@api_login_required
+@require_GET
+def api_itens_requisicao(request, pk):
+    try:
+        campos = campos_pedidos(request, CAMPOS_ITEM, CAMPOS_ITEM_PADRAO)
+    except ValueError as e:
+        return erro(str(e))
+    if not requisicoes_visiveis(request.user).filter(pk=pk).exists():
+        return erro('Requisição não encontrada', status=404)
+    itens = projetar(RequestItem.objects.filter(request_id=pk).order_by('created_at', 'id'), campos, CAMPOS_ITEM)
+    return JsonResponse({'resultados': [renomear(linha, campos, CAMPOS_ITEM) for linha in itens]})
@@ -0,0 +1,54 @@
+"""
+Transições de status do atendimento feitas com UPDATE condicional.
+
+Em vez de carregar a requisição, conferir o status em Python e salvar o modelo
+inteiro (dois almoxarifes podem ler PENDING ao mesmo tempo e ambos "ganhar"),
+a troca de status é um único `UPDATE ... WHERE status = 'PENDING'`: o banco
+garante que só uma transação altera a linha, e o número de linhas afetadas diz
+quem ganhou. Só as colunas que mudam são gravadas.
+
+Como o UPDATE não dispara os sinais de post_save, o consolidado diário, o
+histórico de status, o cache dos dashboards e o evento de tempo real são
+atualizados aqui.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import daily_stats, dashboard_cache
+from .models import Request, RequestStatus, RequestStatusEvent, duracao_em_segundos
+from .notifications import evento_requisicao, notificar
+
+
+def assumir_requisicao(requisicao_id, usuario):
+    """
+    Passa a requisição de PENDING para EM_ATENDIMENTO em nome do usuário.
+    Retorna a requisição atualizada se este usuário a assumiu, ou None se ela
+    não existe ou já não estava pendente (outro almoxarife chegou antes).
+    """
+    with transaction.atomic():
+        requisicao = Request.objects.select_related('requester', 'sector').filter(pk=requisicao_id).first()
+        if requisicao is None or requisicao.status != RequestStatus.PENDING:
+            return None
+
+        agora = timezone.now()
+        alteracoes = {
+            'status': RequestStatus.EM_ATENDIMENTO,
+            'atendido_por': usuario,
+            'started_at': agora,
+            'wait_seconds': duracao_em_segundos(requisicao.created_at, agora),
+            'updated_at': agora,
+        }
+        # O WHERE no status decide a corrida: quem leu PENDING junto com outro pode perder aqui
+        if not Request.objects.filter(pk=requisicao_id, status=RequestStatus.PENDING).update(**alteracoes):
+            return None
+        for campo, valor in alteracoes.items():
+            setattr(requisicao, campo, valor)
+
+        chave_antiga = requisicao._chave_estatistica
+        requisicao._chave_estatistica = daily_stats.chave_requisicao(requisicao)
+        daily_stats.mover_requisicao(chave_antiga, requisicao._chave_estatistica, requisicao.pk)
+        RequestStatusEvent.registrar(requisicao, RequestStatus.PENDING, usuario=usuario)
+        requisicao._status_registrado = requisicao.status
+        dashboard_cache.invalidar_apos_commit()
+        notificar(evento_requisicao('claimed', requisicao, RequestStatus.PENDING))
+    return requisicao
@@ -0,0 +1,232 @@
+"""
+Medição das views principais para o comando benchmark_views.
+
+Cada cenário é uma requisição HTTP feita pelo test client do Django como um
+usuário de determinado papel. As repetições rodam dentro de uma transação
+desfeita ao final, então os POSTs (criar e finalizar requisição) não alteram a
+massa de dados medida. Por cenário são registrados:
+
+- tempo de parede (mínimo, mediana e p95 das repetições);
+- número de consultas e tempo gasto em SQL (da repetição mediana);
+- pico de memória alocada em Python, medido em uma execução à parte com
+  tracemalloc, para não distorcer os tempos.
+"""
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from . import dashboard_cache
+from .models import ItemCategory, Request, RequestItem, RequestStatus, Role, Urgency, User
+
+VERSAO_RELATORIO = 1
+
+# Só considera regressão de tempo acima deste valor absoluto, para ignorar ruído em views rápidas
+PISO_REGRESSAO_MS = 5
+
+
+@dataclass
+class Cenario:
+    nome: str
+    papel: str
+    url_name: str
+    metodo: str = 'get'
+    # Recebe o usuário; retorna (args da URL, dados do POST) ou None se não houver dados para o cenário
+    preparar: object = None
+    status_esperado: tuple = (200,)
+    chave: str = field(init=False)
+
+    def __post_init__(self):
+        self.chave = f'{self.nome}:{self.papel}'
+
+
+def _sem_argumentos(usuario):
+    return [], None
+
+
+def _requisicao_qualquer(usuario):
+    pk = Request.objects.order_by('-created_at').values_list('pk', flat=True).first()
+    return ([pk], None) if pk else None
+
+
+def _requisicao_propria(usuario):
+    pk = Request.objects.filter(requester=usuario).order_by('-created_at').values_list('pk', flat=True).first()
+    return ([pk], None) if pk else None
+
+
+def _dados_criacao(usuario):
+    return [], {
+        'urgency': Urgency.NORMAL,
+        'observations': 'Requisição do benchmark',
+        'items-TOTAL_FORMS': '2',
+        'items-INITIAL_FORMS': '0',
+        'items-MIN_NUM_FORMS': '0',
+        'items-MAX_NUM_FORMS': '1000',
+        'items-0-item_requested': 'Papel A4',
+        'items-0-quantify': '3',
+        'items-0-category': ItemCategory.ADMINISTRATIVO,
+        'items-1-item_requested': 'Detergente',
+        'items-1-quantify': '5',
+        'items-1-category': ItemCategory.LIMPEZA,
+    }
+
+
+def _dados_atendimento(usuario):
+    requisicao = Request.objects.filter(status=RequestStatus.PENDING).order_by('-created_at').first()
+    if requisicao is None:
+        return None
+    itens = list(RequestItem.objects.filter(request=requisicao).values_list('pk', 'quantify'))
+    return [requisicao.pk], {
+        'item_id': [str(pk) for pk, _ in itens],
+        'quantidade_atendida': [str(quantidade) for _, quantidade in itens],
+        'observacao_item': ['' for _ in itens],
+        'observacoes_atendimento': 'Atendida pelo benchmark',
+    }
+
+
+CENARIOS = [
+    Cenario('listar_requisicoes', Role.Gestor, 'core:listar_requisicoes', preparar=_sem_argumentos),
+    Cenario('listar_requisicoes', Role.Encarregado, 'core:listar_requisicoes', preparar=_sem_argumentos),
+    Cenario('dashboard', Role.Encarregado, 'core:dashboard', preparar=_sem_argumentos),
+    Cenario('dashboard', Role.Almoxarife, 'core:dashboard', preparar=_sem_argumentos),
+    Cenario('gestor_dashboard', Role.Gestor, 'core:gestor_dashboard', preparar=_sem_argumentos),
+    Cenario('almoxarife_dashboard', Role.Almoxarife, 'core:almoxarife_dashboard', preparar=_sem_argumentos),
+    Cenario('detalhe_requisicao', Role.Gestor, 'core:detalhe_requisicao', preparar=_requisicao_qualquer),
+    Cenario('detalhe_requisicao', Role.Encarregado, 'core:detalhe_requisicao', preparar=_requisicao_propria),
+    Cenario('criar_requisicao', Role.Encarregado, 'core:criar_requisicao', metodo='post',
+            preparar=_dados_criacao, status_esperado=(302,)),
+    Cenario('finalizar_atendimento', Role.Almoxarife, 'core:almoxarife_atender_requisicao', metodo='post',
+            preparar=_dados_atendimento, status_esperado=(302,)),
+    Cenario('proxima_requisicao', Role.Almoxarife, 'core:almoxarife_proxima_requisicao', metodo='post',
+            preparar=_sem_argumentos, status_esperado=(302,)),
+]
+
+
+def usuario_do_papel(papel):
+    usuarios = User.objects.filter(role=papel, is_active=True)
+    if papel == Role.Encarregado:
+        # Um encarregado com requisições, para as telas dele não saírem vazias
+        recente = Request.objects.filter(requester__role=papel, requester__is_active=True, requester__sector__isnull=False) \
+            .order_by('-created_at').values_list('requester_id', flat=True).first()
+        return usuarios.filter(pk=recente).first() if recente else None
+    return usuarios.order_by('username').first()
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+
+class _Cronometro:
+    """execute_wrapper que conta as consultas e soma o tempo gasto nelas."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.tempo += time.perf_counter() - inicio
+
+
+def _executar(client, cenario, url, dados, cache_frio):
+    if cache_frio:
+        # Mede o cálculo dos dashboards, não a leitura do cache
+        dashboard_cache.invalidar()
+    requisitar = getattr(client, cenario.metodo)
+    cronometro = _Cronometro()
+    # Cada repetição é desfeita ao final: os POSTs não mudam a massa de dados
+    with transaction.atomic():
+        with connection.execute_wrapper(cronometro):
+            inicio = time.perf_counter()
+            response = requisitar(url, dados) if dados is not None else requisitar(url)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            decorrido = time.perf_counter() - inicio
+        transaction.set_rollback(True)
+    return response.status_code, decorrido, cronometro.consultas, cronometro.tempo
+
+
+def medir(cenario, repeticoes=5, aquecimento=1, cache_frio=True):
+    """Mede o cenário; retorna o dicionário de resultados ou None se não houver dados para ele."""
+    usuario = usuario_do_papel(cenario.papel)
+    if usuario is None:
+        return None
+    preparado = cenario.preparar(usuario)
+    if preparado is None:
+        return None
+    args, dados = preparado
+    url = reverse(cenario.url_name, args=args)
+
+    client = Client(SERVER_NAME='localhost')
+    hosts = [*settings.ALLOWED_HOSTS, 'localhost']
+    with transaction.atomic(), override_settings(ALLOWED_HOSTS=hosts):
+        client.force_login(usuario)
+        for _ in range(aquecimento):
+            _executar(client, cenario, url, dados, cache_frio)
+
+        execucoes = [_executar(client, cenario, url, dados, cache_frio) for _ in range(max(1, repeticoes))]
+
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            _executar(client, cenario, url, dados, cache_frio)
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        transaction.set_rollback(True)
+
+    tempos = [execucao[1] for execucao in execucoes]
+    mediana = sorted(execucoes, key=lambda execucao: execucao[1])[len(execucoes) // 2]
+    return {
+        'status_http': mediana[0],
+        'ok': all(execucao[0] in cenario.status_esperado for execucao in execucoes),
+        'tempo_min_ms': round(min(tempos) * 1000, 2),
+        'tempo_mediano_ms': round(statistics.median(tempos) * 1000, 2),
+        'tempo_p95_ms': round(_percentil(tempos, 0.95) * 1000, 2),
+        'consultas': mediana[2],
+        'tempo_sql_ms': round(mediana[3] * 1000, 2),
+        'pico_memoria_kb': round(pico / 1024, 1),
+    }
+
+
+def comparar(relatorio, baseline, tolerancia=0.25, piso_ms=PISO_REGRESSAO_MS):
+    """
+    Compara dois relatórios. Retorna a lista de regressões, cada uma com escala,
+    cenário, métrica, valor da baseline e valor atual. É regressão:
+    - tempo mediano acima da baseline em mais de `tolerancia` (e de `piso_ms`);
+    - qualquer consulta a mais;
+    - cenário que funcionava na baseline e agora falha.
+    """
+    regressoes = []
+    for escala, dados in relatorio.get('escalas', {}).items():
+        anteriores = baseline.get('escalas', {}).get(escala, {}).get('cenarios', {})
+        for chave, atual in dados['cenarios'].items():
+            anterior = anteriores.get(chave)
+            if anterior is None:
+                continue
+
+            def registrar(metrica):
+                regressoes.append({
+                    'escala': escala, 'cenario': chave, 'metrica': metrica,
+                    'baseline': anterior[metrica], 'atual': atual[metrica],
+                })
+
+            if anterior['ok'] and not atual['ok']:
+                registrar('ok')
+            limite = max(anterior['tempo_mediano_ms'] * (1 + tolerancia), anterior['tempo_mediano_ms'] + piso_ms)
+            if atual['tempo_mediano_ms'] > limite:
+                registrar('tempo_mediano_ms')
+            if atual['consultas'] > anterior['consultas']:
+                registrar('consultas')
+    return regressoes
@@ -0,0 +1,178 @@
+"""
+Busca textual de requisições por código, observações e itens (nome e observação).
+
+Usa as estruturas criadas na migração 0013_busca_textual, mantidas por triggers:
+
+- PostgreSQL: tsvector em português, sem acentos, com pesos (código > itens >
+  observações), em índice GIN, mais similaridade de trigramas (pg_trgm) para
+  erros de digitação. Cada termo também casa como prefixo ("nitr" acha "nitrílicas");
+- SQLite: tabela FTS5 com ranking bm25 e termos como prefixo. Os triggers dos
+  itens só marcam a requisição como pendente; as pendentes são recalculadas,
+  de uma vez, antes de cada busca (ver atualizar_pendentes);
+- outros bancos (ou SQLite sem FTS5): icontains, sem ranking.
+
+A busca sempre parte de um queryset de Request já filtrado (regras de acesso,
+status, datas...), usado como subconsulta, então os resultados respeitam os filtros.
+"""
+import re
+import uuid
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Request
+
+# Resultados ranqueados devolvidos para a listagem
+LIMITE_RESULTADOS = 100
+
+# Termos considerados em uma busca (o resto é ignorado)
+MAX_TERMOS = 8
+
+_disponivel = {}
+
+# Recalcula, numa consulta só, as linhas FTS5 das requisições cujos itens mudaram
+SQLITE_ATUALIZAR_PENDENTES = """
+    INSERT OR REPLACE INTO core_busca_fts (rowid, request_code, observations, itens)
+    SELECT c.id, r.request_code, r.observations, i.itens
+    FROM core_busca_pendente p
+    JOIN core_request r ON r.id = p.request_id
+    JOIN core_busca_chave c ON c.request_id = r.id
+    LEFT JOIN (
+        SELECT request_id,
+               group_concat(coalesce(item_requested, '') || ' ' || coalesce(observacao_item, ''), ' ') AS itens
+        FROM core_requestitem
+        WHERE request_id IN (SELECT request_id FROM core_busca_pendente)
+        GROUP BY request_id
+    ) i ON i.request_id = r.id
+"""
+
+
+def termos(texto):
+    return re.findall(r'\w+', (texto or '').lower())[:MAX_TERMOS]
+
+
+def backend():
+    """'postgresql', 'sqlite' ou None (sem índice de busca: usa icontains)."""
+    chave = (connection.vendor, str(connection.settings_dict['NAME']))
+    if chave not in _disponivel:
+        tabela = {'postgresql': 'core_request_busca', 'sqlite': 'core_busca_fts'}.get(connection.vendor)
+        existe = tabela is not None and tabela in connection.introspection.table_names()
+        _disponivel[chave] = connection.vendor if existe else None
+    return _disponivel[chave]
+
+
+def atualizar_pendentes():
+    """
+    SQLite: recalcula as requisições marcadas pelos triggers dos itens (migração
+    0019), uma vez cada, em vez de uma vez por item gravado. No PostgreSQL os
+    triggers já fazem isso por comando.
+    """
+    if backend() != 'sqlite':
+        return
+    chave = ('pendentes', str(connection.settings_dict['NAME']))
+    if chave not in _disponivel:
+        # Antes da 0019 os triggers dos itens ainda recalculam a busca na hora
+        _disponivel[chave] = 'core_busca_pendente' in connection.introspection.table_names()
+    if not _disponivel[chave]:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM core_busca_pendente)')
+        if not cursor.fetchone()[0]:
+            return
+        with transaction.atomic():
+            cursor.execute(SQLITE_ATUALIZAR_PENDENTES)
+            cursor.execute('DELETE FROM core_busca_pendente')
+
+
+def _expressao_fts5(lista):
+    # Cada termo entre aspas e como prefixo; termos separados por espaço = E
+    return ' '.join(f'"{termo}"*' for termo in lista)
+
+
+def _expressao_tsquery(lista):
+    return ' & '.join(f'{termo}:*' for termo in lista)
+
+
+def _sql_ids(lista):
+    """SQL (e parâmetros) que seleciona os ids das requisições que casam com os termos."""
+    if backend() == 'postgresql':
+        return (
+            "SELECT request_id FROM core_request_busca "
+            "WHERE documento @@ to_tsquery('portuguese', unaccent(%s)) OR unaccent(%s) <%% texto",
+            [_expressao_tsquery(lista), ' '.join(lista)],
+        )
+    return (
+        "SELECT c.request_id FROM core_busca_fts JOIN core_busca_chave c ON c.id = core_busca_fts.rowid "
+        "WHERE core_busca_fts MATCH %s",
+        [_expressao_fts5(lista)],
+    )
+
+
+def _filtro_icontains(lista):
+    condicao = Q()
+    for termo in lista:
+        condicao &= (
+            Q(request_code__icontains=termo) | Q(observations__icontains=termo)
+            | Q(items__item_requested__icontains=termo) | Q(items__observacao_item__icontains=termo)
+        )
+    return Request.objects.filter(condicao).values('pk')
+
+
+def filtrar_por_busca(queryset, texto):
+    """Restringe o queryset às requisições que casam com a busca, sem ordenar por relevância."""
+    lista = termos(texto)
+    if not lista:
+        return queryset
+    if backend() is None:
+        return queryset.filter(pk__in=_filtro_icontains(lista))
+    atualizar_pendentes()
+    sql, params = _sql_ids(lista)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def _ids_ranqueados(queryset, lista, limite):
+    subconsulta, params_subconsulta = queryset.order_by().values('pk').query.sql_with_params()
+    if backend() == 'postgresql':
+        texto = ' '.join(lista)
+        sql = f"""
+            SELECT b.request_id,
+                   ts_rank_cd(b.documento, to_tsquery('portuguese', unaccent(%s)), 32)
+                   + word_similarity(unaccent(%s), b.texto) AS relevancia
+            FROM core_request_busca b
+            WHERE (b.documento @@ to_tsquery('portuguese', unaccent(%s)) OR unaccent(%s) <%% b.texto)
+              AND b.request_id IN ({subconsulta})
+            ORDER BY relevancia DESC
+            LIMIT %s
+        """
+        tsquery = _expressao_tsquery(lista)
+        params = [tsquery, texto, tsquery, texto, *params_subconsulta, limite]
+    else:
+        # bm25: quanto menor, mais relevante; pesos das colunas código, observações e itens
+        sql = f"""
+            SELECT c.request_id, bm25(core_busca_fts, 10.0, 1.0, 5.0) AS relevancia
+            FROM core_busca_fts JOIN core_busca_chave c ON c.id = core_busca_fts.rowid
+            WHERE core_busca_fts MATCH %s AND c.request_id IN ({subconsulta})
+            ORDER BY relevancia
+            LIMIT %s
+        """
+        params = [_expressao_fts5(lista), *params_subconsulta, limite]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [uuid.UUID(str(linha[0])) for linha in cursor.fetchall()]
+
+
+def buscar(queryset, texto, limite=LIMITE_RESULTADOS):
+    """
+    Até `limite` requisições do queryset que casam com a busca, da mais para a
+    menos relevante (sem índice de busca, das mais recentes para as mais antigas).
+    """
+    lista = termos(texto)
+    if not lista:
+        return []
+    if backend() is None:
+        return list(queryset.filter(pk__in=_filtro_icontains(lista)).order_by('-created_at', '-id')[:limite])
+    atualizar_pendentes()
+    ids = _ids_ranqueados(queryset, lista, limite)
+    por_id = {requisicao.pk: requisicao for requisicao in queryset.filter(pk__in=ids)}
+    return [por_id[pk] for pk in ids if pk in por_id]
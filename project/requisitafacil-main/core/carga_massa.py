@@ -0,0 +1,314 @@
+"""
+Geração de grandes volumes de requisições para testes de carga (gerar_dados_teste --bulk).
+
+As requisições são geradas em lotes. Cada lote usa o próprio gerador aleatório,
+semeado com (semente, índice do lote), então a mesma semente reproduz a mesma
+distribuição (setores, datas, status, itens). As chaves primárias não vêm desse
+gerador e sim de uuid4(): rodar o comando de novo, inclusive depois de uma carga
+interrompida, acrescenta dados em vez de colidir com os já gravados. Com
+--processos, os códigos saem na ordem em que os lotes terminam. Por lote:
+
+1. sorteia setor, data/hora, status, urgência e itens de cada requisição, com uma
+   distribuição parecida com a real (mais movimento em dias úteis e no horário
+   comercial, requisições antigas quase todas atendidas, as de hoje pendentes);
+2. reserva os códigos com uma chamada a SectorSequence.reserve por setor;
+3. grava requisições, itens e o histórico de status (criação e, conforme o
+   status, início e fim do atendimento) em uma transação, com COPY no
+   PostgreSQL ou bulk_create em blocos nos outros bancos.
+
+A gravação em massa não passa por save() nem pelos sinais: ao final, o
+consolidado diário é reconstruído e o cache dos dashboards invalidado.
+"""
+import csv
+import io
+import random
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+from multiprocessing import get_context
+
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from . import daily_stats, dashboard_cache
+from .carga_processo import iniciar_processo
+from .models import (
+    ItemCategory, Request, RequestItem, RequestStatus, RequestStatusEvent, SectorSequence, StatusEventAction,
+    Urgency,
+)
+
+ITENS = [
+    "Papel A4", "Caneta", "Lápis", "Borracha", "Régua", "Tesoura",
+    "Cola", "Fita adesiva", "Post-it", "Grampeador", "Clips",
+    "Envelope", "Cartolina", "EVA", "Tinta", "Pincel", "Pano",
+    "Detergente", "Desinfetante", "Papel higiênico", "Sabão",
+    "Luvas", "Máscaras", "Álcool", "Lixeira", "Vassoura",
+    "Rodo", "Balde", "Esponja", "Saco de lixo", "Fita crepe",
+]
+
+# Volume relativo de requisições por setor (setores fora da lista pesam 1)
+PESOS_SETORES = {
+    'FLV': 3, 'Padaria': 2, 'Açougue': 2, 'Frios': 2, 'Loja': 2,
+    'Limpeza': 1.5, 'Deposito': 1, 'Comercial': 0.5, 'ADM': 0.5,
+}
+
+# Segunda a domingo
+PESOS_DIAS_SEMANA = [1, 1, 1, 1, 1.1, 0.7, 0.3]
+
+# Horário comercial, com picos no início da manhã e da tarde
+PESOS_HORAS = [0, 0, 0, 0, 0, 0.2, 1, 3, 5, 5, 4, 2, 1, 2, 4, 4, 3, 2, 1, 0.5, 0.2, 0, 0, 0]
+
+# (idade máxima em horas, pesos de PENDING, EM_ATENDIMENTO, APPROVED)
+STATUS_POR_IDADE = [
+    (24, [0.5, 0.3, 0.2]),
+    (72, [0.2, 0.2, 0.6]),
+    (None, [0.03, 0.02, 0.95]),
+]
+STATUS = [RequestStatus.PENDING, RequestStatus.EM_ATENDIMENTO, RequestStatus.APPROVED]
+
+PESOS_NUM_ITENS = [0.35, 0.3, 0.2, 0.1, 0.05]
+PROPORCAO_URGENTES = 0.15
+CATEGORIAS = ItemCategory.values
+
+
+@dataclass
+class SetorCarga:
+    id: object
+    nome: str
+    abreviacao: str
+    requester_id: object
+    peso: float = 1
+
+
+@dataclass
+class PlanoCarga:
+    """Tudo o que um processo precisa para gerar e gravar qualquer lote (precisa ser serializável)."""
+    total: int
+    setores: list
+    almoxarife_id: object
+    semente: int = 42
+    dias_atras: int = 30
+    tamanho_lote: int = 10000
+    batch_size: int = 2000
+    usar_copy: bool = True
+    agora: object = field(default_factory=timezone.now)
+
+    @property
+    def num_lotes(self):
+        return -(-self.total // self.tamanho_lote)
+
+    def tamanho(self, indice):
+        return min(self.tamanho_lote, self.total - indice * self.tamanho_lote)
+
+
+def _acumulados(pesos):
+    total, acumulados = 0, []
+    for peso in pesos:
+        total += peso
+        acumulados.append(total)
+    return acumulados
+
+
+def _momento(rng, plano, dias_acumulados):
+    dias = rng.choices(range(plano.dias_atras + 1), cum_weights=dias_acumulados)[0]
+    hora = rng.choices(range(24), weights=PESOS_HORAS)[0]
+    dia = timezone.localtime(plano.agora) - timedelta(days=dias)
+    momento = dia.replace(hour=hora, minute=rng.randrange(60), second=rng.randrange(60), microsecond=rng.randrange(10 ** 6))
+    if momento > plano.agora:
+        # Hora sorteada para hoje que ainda não chegou
+        momento = plano.agora - timedelta(seconds=rng.randrange(1, 3600))
+    return momento
+
+
+def _status(rng, idade):
+    for limite, pesos in STATUS_POR_IDADE:
+        if limite is None or idade < timedelta(hours=limite):
+            return rng.choices(STATUS, weights=pesos)[0]
+
+
+def gerar_lote(plano, indice):
+    """
+    Requisições e itens do lote `indice`, ainda sem código, em memória.
+    Determinístico para o mesmo plano e índice.
+    """
+    rng = random.Random(plano.semente * 1_000_003 + indice)
+    pesos_setores = _acumulados([setor.peso for setor in plano.setores])
+    local = timezone.localtime(plano.agora)
+    dias_acumulados = _acumulados([
+        PESOS_DIAS_SEMANA[(local - timedelta(days=dias)).weekday()] for dias in range(plano.dias_atras + 1)
+    ])
+
+    requisicoes, itens = [], []
+    for _ in range(plano.tamanho(indice)):
+        setor = rng.choices(plano.setores, cum_weights=pesos_setores)[0]
+        criada = _momento(rng, plano, dias_acumulados)
+        status = _status(rng, plano.agora - criada)
+        atualizada = criada
+        if status == RequestStatus.APPROVED:
+            atualizada = criada + timedelta(minutes=rng.randint(10, 48 * 60))
+        elif status == RequestStatus.EM_ATENDIMENTO:
+            atualizada = criada + timedelta(minutes=rng.randint(5, 240))
+
+        requisicao = Request(
+            id=uuid.uuid4(),
+            requester_id=setor.requester_id,
+            sector_id=setor.id,
+            atendido_por_id=None if status == RequestStatus.PENDING else plano.almoxarife_id,
+            urgency=Urgency.URGENTE if rng.random() < PROPORCAO_URGENTES else Urgency.NORMAL,
+            observations=f'Observação teste para {setor.nome}',
+            status=status,
+            created_at=criada,
+            updated_at=min(atualizada, plano.agora),
+        )
+        # O bulk não passa por save(): marcos de SLA gravados direto (aprovadas: metade do tempo em espera)
+        if status == RequestStatus.APPROVED:
+            requisicao.started_at = criada + (requisicao.updated_at - criada) / 2
+            requisicao.finished_at = requisicao.updated_at
+        elif status == RequestStatus.EM_ATENDIMENTO:
+            requisicao.started_at = requisicao.updated_at
+        requisicao.atualizar_marcos(agora=requisicao.updated_at)
+        requisicao._setor_carga = setor
+        requisicoes.append(requisicao)
+
+        num_itens = rng.choices(range(1, len(PESOS_NUM_ITENS) + 1), weights=PESOS_NUM_ITENS)[0]
+        for j in range(num_itens):
+            quantidade = rng.randint(1, 20)
+            itens.append(RequestItem(
+                id=uuid.uuid4(),
+                request_id=requisicao.id,
+                item_requested=rng.choice(ITENS),
+                quantify=quantidade,
+                category=rng.choice(CATEGORIAS),
+                quantidade_atendida=rng.randint(0, quantidade) if status == RequestStatus.APPROVED else 0,
+                observacao_item=f'Observação do item {j + 1}',
+                created_at=criada,
+                updated_at=requisicao.updated_at,
+            ))
+    return requisicoes, itens
+
+
+def eventos_do_lote(requisicoes):
+    """Histórico de status das requisições geradas, com os mesmos eventos que os sinais gravariam."""
+    eventos = []
+    for requisicao in requisicoes:
+        eventos.append(RequestStatusEvent(
+            request_id=requisicao.id, action=StatusEventAction.CREATED, to_status=RequestStatus.PENDING,
+            user_id=requisicao.requester_id, created_at=requisicao.created_at,
+        ))
+        if requisicao.started_at:
+            eventos.append(RequestStatusEvent(
+                request_id=requisicao.id, action=StatusEventAction.CLAIMED,
+                from_status=RequestStatus.PENDING, to_status=RequestStatus.EM_ATENDIMENTO,
+                user_id=requisicao.atendido_por_id, created_at=requisicao.started_at,
+            ))
+        if requisicao.finished_at:
+            eventos.append(RequestStatusEvent(
+                request_id=requisicao.id, action=StatusEventAction.FINALIZED,
+                from_status=RequestStatus.EM_ATENDIMENTO, to_status=RequestStatus.APPROVED,
+                user_id=requisicao.atendido_por_id, created_at=requisicao.finished_at,
+            ))
+    return eventos
+
+
+def atribuir_codigos(requisicoes):
+    """Reserva os códigos do lote com uma chamada por setor e os distribui na ordem de geração."""
+    por_setor = {}
+    for requisicao in requisicoes:
+        por_setor.setdefault(requisicao._setor_carga.abreviacao, []).append(requisicao)
+    for abreviacao, lista in por_setor.items():
+        numeros = SectorSequence.reserve(abreviacao, len(lista))
+        for requisicao, numero in zip(lista, numeros):
+            requisicao.request_code = f'{abreviacao}-{numero}'
+
+
+@contextmanager
+def datas_explicitas(*modelos):
+    """Desliga auto_now/auto_now_add para o bulk_create gravar as datas geradas."""
+    campos = [
+        (campo, campo.auto_now, campo.auto_now_add)
+        for modelo in modelos for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in campos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+NULO_COPY = '\\N'
+
+
+def copiar(modelo, objetos):
+    """Grava `objetos` com COPY ... FROM STDIN (só PostgreSQL/psycopg2)."""
+    campos = modelo._meta.concrete_fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for objeto in objetos:
+        linha = []
+        for campo in campos:
+            valor = campo.get_db_prep_save(getattr(objeto, campo.attname), connection)
+            linha.append(NULO_COPY if valor is None else valor)
+        writer.writerow(linha)
+    buffer.seek(0)
+    colunas = ', '.join(connection.ops.quote_name(campo.column) for campo in campos)
+    sql = f"COPY {connection.ops.quote_name(modelo._meta.db_table)} ({colunas}) FROM STDIN WITH (FORMAT csv, NULL '{NULO_COPY}')"
+    with connection.cursor() as cursor:
+        cursor.cursor.copy_expert(sql, buffer)
+
+
+def gravar(plano, modelo, objetos):
+    if plano.usar_copy and connection.vendor == 'postgresql':
+        for inicio in range(0, len(objetos), plano.batch_size):
+            copiar(modelo, objetos[inicio:inicio + plano.batch_size])
+    else:
+        with datas_explicitas(modelo):
+            modelo.objects.bulk_create(objetos, batch_size=plano.batch_size)
+
+
+def processar_lote(plano, indice):
+    """Gera e grava o lote `indice`; retorna (requisições, itens) gravados."""
+    requisicoes, itens = gerar_lote(plano, indice)
+    # Fora da transação do lote: a linha da sequência não fica travada durante a gravação
+    atribuir_codigos(requisicoes)
+    with transaction.atomic():
+        gravar(plano, Request, requisicoes)
+        gravar(plano, RequestItem, itens)
+        gravar(plano, RequestStatusEvent, eventos_do_lote(requisicoes))
+    return len(requisicoes), len(itens)
+
+
+def executar(plano, processos=1, ao_concluir_lote=None):
+    """
+    Grava todos os lotes do plano, em `processos` processos paralelos, e depois
+    reconstrói o consolidado diário. Retorna (requisições, itens) gravados.
+    """
+    total_requisicoes = total_itens = 0
+
+    def concluir(indice, resultado):
+        nonlocal total_requisicoes, total_itens
+        total_requisicoes += resultado[0]
+        total_itens += resultado[1]
+        if ao_concluir_lote:
+            ao_concluir_lote(indice, total_requisicoes, total_itens)
+
+    if processos > 1:
+        # Cada processo abre a própria conexão; a do processo principal não pode ser herdada
+        nome_banco = connection.settings_dict['NAME']
+        connections.close_all()
+        with ProcessPoolExecutor(processos, mp_context=get_context('spawn'), initializer=iniciar_processo,
+                                 initargs=(nome_banco,)) as executor:
+            futuros = {executor.submit(processar_lote, plano, indice): indice for indice in range(plano.num_lotes)}
+            for futuro in as_completed(futuros):
+                concluir(futuros[futuro], futuro.result())
+    else:
+        for indice in range(plano.num_lotes):
+            concluir(indice, processar_lote(plano, indice))
+
+    daily_stats.reconstruir()
+    dashboard_cache.invalidar_apos_commit()
+    return total_requisicoes, total_itens
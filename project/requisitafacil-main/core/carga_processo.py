@@ -0,0 +1,16 @@
+"""
+Inicialização dos processos paralelos da carga em massa (carga_massa.executar).
+
+Fica fora de carga_massa porque um processo novo (spawn) importa o módulo do
+initializer antes de configurar o Django, e carga_massa importa os models.
+"""
+
+
+def iniciar_processo(nome_banco):
+    import django
+    django.setup()
+
+    from django.db import connections
+    # O processo novo lê as settings do zero; o banco em uso no principal pode ser outro
+    # (o de benchmark, criado em tempo de execução por create_test_db)
+    connections['default'].settings_dict['NAME'] = nome_banco
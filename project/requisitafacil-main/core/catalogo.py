@@ -0,0 +1,176 @@
+"""
+Catálogo de itens: índice de prefixos em memória para o autocompletar e
+vínculo dos itens das requisições com o catálogo.
+
+O índice é uma lista ordenada de chaves normalizadas, uma por palavra de cada
+item ativo (o nome a partir daquela palavra), então "a4" acha "Papel A4" e
+"pap" acha o mesmo item pelo começo. A consulta é uma busca binária, sem ir ao
+banco. Cada processo monta o próprio índice; uma versão no cache (como em
+dashboard_cache.py) avisa os outros processos de que o catálogo mudou e o
+índice é remontado na próxima consulta.
+"""
+import bisect
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Item, RequestItem, normalizar_nome_item
+
+CHAVE_VERSAO = 'catalogo:versao'
+
+# Sugestões devolvidas por consulta
+LIMITE_SUGESTOES = 10
+
+
+def versao_atual():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+        versao = cache.get(CHAVE_VERSAO, 1)
+    return versao
+
+
+def invalidar():
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+
+
+def invalidar_apos_commit():
+    invalidar()
+    transaction.on_commit(invalidar)
+
+
+class IndicePrefixos:
+    def __init__(self, itens):
+        """`itens`: tuplas (id, nome, nome normalizado, categoria, uso)."""
+        self.itens = list(itens)
+        entradas = []
+        for posicao, (_, _, normalizado, _, _) in enumerate(self.itens):
+            palavras = normalizado.split()
+            for inicio in range(len(palavras)):
+                entradas.append((' '.join(palavras[inicio:]), inicio, posicao))
+        entradas.sort()
+        self.chaves = [entrada[0] for entrada in entradas]
+        self.entradas = entradas
+
+    def __len__(self):
+        return len(self.itens)
+
+    def sugerir(self, texto, limite=LIMITE_SUGESTOES):
+        prefixo = normalizar_nome_item(texto)
+        if not prefixo:
+            return []
+        # Melhor casamento por item: começo do nome antes de palavra do meio
+        encontrados = {}
+        i = bisect.bisect_left(self.chaves, prefixo)
+        while i < len(self.chaves) and self.chaves[i].startswith(prefixo):
+            _, inicio, posicao = self.entradas[i]
+            encontrados[posicao] = min(inicio > 0, encontrados.get(posicao, True))
+            i += 1
+        # Mais usados primeiro; empate pelo nome
+        ordem = sorted(encontrados, key=lambda p: (encontrados[p], -self.itens[p][4], self.itens[p][1].lower()))
+        return [
+            {'id': str(self.itens[p][0]), 'nome': self.itens[p][1], 'categoria': self.itens[p][3]}
+            for p in ordem[:limite]
+        ]
+
+
+def montar_indice():
+    itens = (
+        Item.objects.filter(is_active=True)
+        .annotate(uso=Count('request_items'))
+        .values_list('id', 'name', 'normalized_name', 'category', 'uso')
+    )
+    return IndicePrefixos(itens)
+
+
+_indice = None
+_versao_indice = None
+_trava = threading.Lock()
+
+
+def indice():
+    """Índice do processo, remontado quando a versão do catálogo no cache muda."""
+    global _indice, _versao_indice
+    versao = versao_atual()
+    if _indice is None or _versao_indice != versao:
+        with _trava:
+            if _indice is None or _versao_indice != versao:
+                _indice = montar_indice()
+                _versao_indice = versao
+    return _indice
+
+
+def sugerir(texto, limite=LIMITE_SUGESTOES):
+    return indice().sugerir(texto, limite)
+
+
+def item_do_catalogo(nome):
+    """Item do catálogo com o mesmo nome normalizado, ou None."""
+    normalizado = normalizar_nome_item(nome)
+    if not normalizado:
+        return None
+    return Item.objects.filter(normalized_name=normalizado).first()
+
+
+# --- Carga do catálogo a partir dos itens já requisitados ---
+
+def agrupar_nomes(contagens):
+    """
+    Agrupa os textos livres pelo nome normalizado.
+    `contagens`: tuplas (texto, categoria, quantidade de itens).
+    Retorna {nome normalizado: (nome mais usado, categoria mais usada, textos do grupo)}.
+    """
+    grupos = {}
+    for texto, categoria, quantidade in contagens:
+        normalizado = normalizar_nome_item(texto)
+        if not normalizado:
+            continue
+        nomes, categorias = grupos.setdefault(normalizado, ({}, {}))
+        nomes[texto] = nomes.get(texto, 0) + quantidade
+        categorias[categoria] = categorias.get(categoria, 0) + quantidade
+
+    def mais_usado(contagem):
+        return min(contagem, key=lambda chave: (-contagem[chave], chave or ''))
+
+    return {
+        normalizado: (mais_usado(nomes).strip(), mais_usado(categorias) or '', sorted(nomes))
+        for normalizado, (nomes, categorias) in grupos.items()
+    }
+
+
+def popular_catalogo(revincular=False, lote=500):
+    """
+    Cria no catálogo os itens que ainda não existem e vincula os RequestItem a eles.
+    Com `revincular`, refaz também os vínculos já existentes. Retorna
+    (grupos encontrados, itens criados no catálogo, itens de requisição vinculados).
+    """
+    contagens = (
+        RequestItem.objects.order_by()
+        .values_list('item_requested', 'category')
+        .annotate(total=Count('id'))
+    )
+    grupos = agrupar_nomes(contagens)
+
+    with transaction.atomic():
+        existentes = dict(Item.objects.values_list('normalized_name', 'id'))
+        novos = [
+            Item(name=nome, normalized_name=normalizado, category=categoria)
+            for normalizado, (nome, categoria, _) in grupos.items()
+            if normalizado not in existentes
+        ]
+        Item.objects.bulk_create(novos, batch_size=lote)
+        existentes.update((item.normalized_name, item.id) for item in novos)
+
+        vinculados = 0
+        pendentes = RequestItem.objects.all() if revincular else RequestItem.objects.filter(item__isnull=True)
+        for normalizado, (_, _, textos) in grupos.items():
+            for inicio in range(0, len(textos), lote):
+                vinculados += pendentes.filter(item_requested__in=textos[inicio:inicio + lote]) \
+                    .exclude(item_id=existentes[normalizado]).update(item_id=existentes[normalizado])
+        invalidar_apos_commit()
+    return len(grupos), len(novos), vinculados
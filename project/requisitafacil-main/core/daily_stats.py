@@ -0,0 +1,156 @@
+"""
+Manutenção do consolidado diário (DailyRequestStats).
+
+Cada requisição conta em uma linha (data, setor, status, urgência, categoria='')
+e cada item conta em uma linha com a categoria do item. A data é o dia local de
+criação da requisição. Os sinais em core/signals.py chamam as funções abaixo
+para mover as contagens quando uma requisição ou item muda de chave.
+"""
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyRequestStats, Request, RequestItem
+
+# Ajustes acumulados por agrupar_ajustes() na thread atual: {(chave, categoria): [requisições, itens]}
+_agrupamento = threading.local()
+
+CAMPOS_CHAVE = ('date', 'sector', 'status', 'urgency', 'category')
+
+
+def chave_requisicao(requisicao):
+    """Chave da requisição no consolidado, ou None se ainda não foi salva."""
+    campos = requisicao.__dict__
+    if any(campos.get(nome) is None for nome in ('created_at', 'sector_id', 'status', 'urgency')):
+        return None
+    return (timezone.localdate(campos['created_at']), campos['sector_id'], campos['status'], campos['urgency'])
+
+
+def ajustar(chave, category='', requests=0, items=0):
+    """Soma (ou subtrai) contagens na linha da chave, criando a linha se necessário."""
+    if chave is None or not (requests or items):
+        return
+    pendentes = getattr(_agrupamento, 'pendentes', None)
+    if pendentes is not None:
+        contagem = pendentes.setdefault((chave, category), [0, 0])
+        contagem[0] += requests
+        contagem[1] += items
+        return
+    gravar_ajustes({(chave, category): (requests, items)})
+
+
+@contextmanager
+def agrupar_ajustes():
+    """
+    Acumula os ajustes feitos dentro do bloco e grava uma vez por linha do
+    consolidado ao sair, em vez de uma vez por requisição ou item salvo.
+    Deve ficar dentro da transação que grava os dados.
+    """
+    if getattr(_agrupamento, 'pendentes', None) is not None:
+        # Bloco aninhado: os ajustes ficam com o bloco de fora
+        yield
+        return
+    _agrupamento.pendentes = {}
+    try:
+        yield
+        pendentes = _agrupamento.pendentes
+    finally:
+        _agrupamento.pendentes = None
+    gravar_ajustes(pendentes)
+
+
+def _upsert_suportado():
+    # INSERT ... ON CONFLICT DO UPDATE: PostgreSQL e SQLite a partir da 3.24
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 24, 0)
+
+
+def gravar_ajustes(ajustes):
+    """Aplica {(chave, categoria): (requisições, itens)} ao consolidado, em uma única consulta quando possível."""
+    ajustes = {chave: contagem for chave, contagem in ajustes.items() if any(contagem)}
+    if not ajustes:
+        return
+    if not _upsert_suportado():
+        for ((date, sector_id, status, urgency), category), (requests, items) in ajustes.items():
+            filtro = dict(date=date, sector_id=sector_id, status=status, urgency=urgency, category=category)
+            incremento = dict(request_count=F('request_count') + requests, item_count=F('item_count') + items)
+            with transaction.atomic():
+                if not DailyRequestStats.objects.filter(**filtro).update(**incremento):
+                    DailyRequestStats.objects.get_or_create(**filtro)
+                    DailyRequestStats.objects.filter(**filtro).update(**incremento)
+        return
+
+    opts = DailyRequestStats._meta
+    campos = [opts.pk] + [opts.get_field(nome) for nome in CAMPOS_CHAVE] + \
+        [opts.get_field('request_count'), opts.get_field('item_count')]
+    params = []
+    for (chave, category), (requests, items) in ajustes.items():
+        valores = (uuid.uuid4(), *chave, category, requests, items)
+        params += [campo.get_db_prep_save(valor, connection) for campo, valor in zip(campos, valores)]
+
+    q = connection.ops.quote_name
+    tabela = q(opts.db_table)
+    colunas = ', '.join(q(campo.column) for campo in campos)
+    conflito = ', '.join(q(opts.get_field(nome).column) for nome in CAMPOS_CHAVE)
+    linha = f"({', '.join(['%s'] * len(campos))})"
+    sql = (
+        f"INSERT INTO {tabela} ({colunas}) VALUES {', '.join([linha] * len(ajustes))} "
+        f"ON CONFLICT ({conflito}) DO UPDATE SET "
+        f"request_count = {tabela}.request_count + excluded.request_count, "
+        f"item_count = {tabela}.item_count + excluded.item_count"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def mover_requisicao(chave_antiga, chave_nova, request_id):
+    """Move a requisição e os seus itens de uma chave para outra."""
+    if chave_antiga == chave_nova:
+        return
+    with agrupar_ajustes():
+        ajustar(chave_antiga, requests=-1)
+        ajustar(chave_nova, requests=1)
+        # Requisição nova: os itens ainda não existem e serão contados ao serem salvos
+        if chave_antiga is not None:
+            mover_itens(chave_antiga, chave_nova, request_id)
+
+
+def mover_itens(chave_antiga, chave_nova, request_id):
+    """Move os itens da requisição entre chaves (chave None apenas desconta ou apenas soma)."""
+    por_categoria = RequestItem.objects.filter(request_id=request_id) \
+        .values('category').annotate(total=Count('id')).order_by()
+    with agrupar_ajustes():
+        for linha in por_categoria:
+            ajustar(chave_antiga, linha['category'], items=-linha['total'])
+            ajustar(chave_nova, linha['category'], items=linha['total'])
+
+
+def reconstruir():
+    """Recalcula todo o consolidado a partir de Request e RequestItem."""
+    requisicoes = Request.objects.annotate(dia=TruncDate('created_at')) \
+        .values('dia', 'sector_id', 'status', 'urgency') \
+        .annotate(total=Count('id')).order_by()
+    itens = RequestItem.objects.annotate(dia=TruncDate('request__created_at')) \
+        .values('dia', 'request__sector_id', 'request__status', 'request__urgency', 'category') \
+        .annotate(total=Count('id')).order_by()
+
+    linhas = [
+        DailyRequestStats(date=r['dia'], sector_id=r['sector_id'], status=r['status'],
+                          urgency=r['urgency'], request_count=r['total'])
+        for r in requisicoes
+    ]
+    linhas += [
+        DailyRequestStats(date=i['dia'], sector_id=i['request__sector_id'], status=i['request__status'],
+                          urgency=i['request__urgency'], category=i['category'], item_count=i['total'])
+        for i in itens
+    ]
+    with transaction.atomic():
+        DailyRequestStats.objects.all().delete()
+        DailyRequestStats.objects.bulk_create(linhas, batch_size=1000)
+    return len(linhas)
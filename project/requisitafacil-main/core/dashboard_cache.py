@@ -0,0 +1,61 @@
+"""
+Cache do contexto calculado dos dashboards.
+
+A chave leva o papel, o usuário (só para o Encarregado, que vê apenas as
+próprias requisições), o setor, a data local e um número de versão global.
+Qualquer gravação em Request ou RequestItem incrementa a versão (ver signals.py),
+o que torna todas as entradas antigas inalcançáveis de uma vez; elas expiram
+sozinhas pelo timeout. Só usa get/set/add/incr, então funciona com os backends
+de memória local e de arquivo, sem serviço externo. Com vários processos
+(Gunicorn), use o backend de arquivo para que a invalidação valha para todos.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Role
+
+CHAVE_VERSAO = 'dashboard:versao'
+
+
+def versao_atual():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+        versao = cache.get(CHAVE_VERSAO, 1)
+    return versao
+
+
+def invalidar():
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        # Chave ainda não existe (ou foi despejada): qualquer valor novo serve
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+
+
+def invalidar_apos_commit():
+    # Invalida já (leituras na mesma transação) e de novo no commit, para descartar
+    # o que outro processo tenha calculado com os dados antigos nesse intervalo
+    invalidar()
+    transaction.on_commit(invalidar)
+
+
+def chave(nome, user, dia=None):
+    dia = dia or timezone.localdate()
+    usuario = user.pk if user.role == Role.Encarregado else '-'
+    return f'dashboard:{nome}:v{versao_atual()}:{user.role}:{usuario}:{user.sector_id or "-"}:{dia.isoformat()}'
+
+
+def contexto_em_cache(nome, user, calcular):
+    """Retorna o contexto do dashboard `nome` para o usuário, calculando com `calcular()` se preciso."""
+    timeout = settings.DASHBOARD_CACHE_TIMEOUT
+    if not timeout:
+        return calcular()
+    chave_cache = chave(nome, user)
+    contexto = cache.get(chave_cache)
+    if contexto is None:
+        contexto = calcular()
+        cache.set(chave_cache, contexto, timeout)
+    return contexto
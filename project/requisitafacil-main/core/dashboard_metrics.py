@@ -0,0 +1,201 @@
+"""
+Cálculo agregado das métricas do painel do gestor.
+
+Todos os KPIs escalares saem de uma única consulta com agregação condicional
+(Count/Avg com filter=Q(...)) e os gráficos saem de poucas consultas agrupadas.
+Os gráficos por período (setores, evolução diária e categorias) são lidos do
+consolidado DailyRequestStats, então o custo não cresce com o histórico.
+Os KPIs de SLA (tempos médios, percentis e % no prazo) usam as durações
+gravadas em cada requisição na troca de status (wait_seconds e service_seconds)
+e olham só as finalizadas na janela recente, lidas pelo índice de finished_at.
+O resultado é um objeto tipado usado tanto pela página HTML quanto pelo
+endpoint JSON.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db.models import Avg, Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import DailyRequestStats, ItemCategory, Request, RequestStatus, Urgency
+from .queries import no_dia, no_mes
+
+# Prazo usado no KPI "% atendidas no prazo"
+PRAZO_ATENDIMENTO = timedelta(hours=24)
+
+# Janela dos KPIs de SLA: requisições finalizadas nos últimos N dias
+JANELA_SLA = timedelta(days=30)
+
+
+@dataclass
+class GestorMetrics:
+    pendentes: int = 0
+    aprovadas_hoje: int = 0
+    total_mes: int = 0
+    departamentos_ativos: int = 0
+    urgentes_pendentes: int = 0
+    tempo_medio: timedelta | None = None
+    espera_media: timedelta | None = None
+    atendimento_medio: timedelta | None = None
+    tempo_p50: timedelta | None = None
+    tempo_p90: timedelta | None = None
+    atendidas_no_prazo: int = 0
+    total_aprovadas: int = 0
+    setores_labels: list = field(default_factory=list)
+    setores_data: list = field(default_factory=list)
+    status_labels: list = field(default_factory=list)
+    status_data: list = field(default_factory=list)
+    evolucao_labels: list = field(default_factory=list)
+    evolucao_data: list = field(default_factory=list)
+    top_users_labels: list = field(default_factory=list)
+    top_users_data: list = field(default_factory=list)
+    categorias_labels: list = field(default_factory=list)
+    categorias_data: list = field(default_factory=list)
+
+    @property
+    def pct_no_prazo(self):
+        if not self.total_aprovadas:
+            return 0
+        return round(self.atendidas_no_prazo / self.total_aprovadas * 100, 1)
+
+    @property
+    def setor_top(self):
+        return self.setores_labels[0] if self.setores_labels else 'N/A'
+
+    @property
+    def user_top(self):
+        return self.top_users_labels[0] if self.top_users_labels else 'N/A'
+
+    def as_context(self):
+        """Dicionário com as chaves esperadas pelo template dashboard_gestor.html."""
+        context = {name: getattr(self, name) for name in self.__dataclass_fields__}
+        context.update({
+            'tempo_medio_str': format_timedelta(self.tempo_medio),
+            'espera_media_str': format_timedelta(self.espera_media),
+            'atendimento_medio_str': format_timedelta(self.atendimento_medio),
+            'tempo_p90_str': format_timedelta(self.tempo_p90),
+            'pct_no_prazo': self.pct_no_prazo,
+            'setor_top': self.setor_top,
+            'user_top': self.user_top,
+        })
+        return context
+
+    def as_json(self):
+        """Versão serializável em JSON (durações em segundos)."""
+        data = self.as_context()
+        for nome, valor in data.items():
+            if isinstance(valor, timedelta):
+                data[nome] = valor.total_seconds()
+        return data
+
+
+def format_timedelta(td):
+    if not td:
+        return "N/A"
+    total_seconds = int(td.total_seconds())
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, _ = divmod(remainder, 60)
+    if hours > 0:
+        return f"{hours}h {minutes}min"
+    else:
+        return f"{minutes}min"
+
+
+def segundos_para_timedelta(segundos):
+    return timedelta(seconds=segundos) if segundos is not None else None
+
+
+def percentil_tempo(finalizadas, total, fracao):
+    """Tempo total (espera + atendimento) no percentil `fracao`, pelo método do vizinho mais próximo."""
+    if not total:
+        return None
+    posicao = min(total - 1, int(fracao * total))
+    valor = finalizadas.order_by('tempo_total').values_list('tempo_total', flat=True)[posicao:posicao + 1]
+    return segundos_para_timedelta(next(iter(valor), None))
+
+
+def calcular_metricas_gestor(today=None):
+    """Calcula todas as métricas do painel do gestor para a data local `today`."""
+    today = today or timezone.localdate()
+    month_start = today.replace(day=1)
+    inicio_30_dias = today - timedelta(days=30)
+
+    metrics = GestorMetrics()
+    qs = Request.objects.all()
+
+    # --- KPIs escalares: uma única consulta ---
+    aprovada = Q(status=RequestStatus.APPROVED)
+    pendente = Q(status=RequestStatus.PENDING)
+    kpis = qs.aggregate(
+        pendentes=Count('id', filter=pendente),
+        aprovadas_hoje=Count('id', filter=aprovada & no_dia('finished_at', today)),
+        total_mes=Count('id', filter=no_mes('created_at', today)),
+        departamentos_ativos=Count('sector', distinct=True),
+        urgentes_pendentes=Count('id', filter=pendente & Q(urgency=Urgency.URGENTE)),
+    )
+    for name, value in kpis.items():
+        setattr(metrics, name, value)
+
+    # --- SLA: finalizadas na janela, só com as colunas do índice request_sla_idx ---
+    finalizadas = qs.filter(finished_at__gte=timezone.now() - JANELA_SLA) \
+        .annotate(tempo_total=F('wait_seconds') + F('service_seconds'))
+    sla = finalizadas.aggregate(
+        total_aprovadas=Count('id'),
+        atendidas_no_prazo=Count('id', filter=Q(tempo_total__lte=PRAZO_ATENDIMENTO.total_seconds())),
+        tempo_medio=Avg('tempo_total'),
+        espera_media=Avg('wait_seconds'),
+        atendimento_medio=Avg('service_seconds'),
+    )
+    metrics.total_aprovadas = sla['total_aprovadas']
+    metrics.atendidas_no_prazo = sla['atendidas_no_prazo']
+    for name in ('tempo_medio', 'espera_media', 'atendimento_medio'):
+        setattr(metrics, name, segundos_para_timedelta(sla[name]))
+    metrics.tempo_p50 = percentil_tempo(finalizadas, metrics.total_aprovadas, 0.5)
+    metrics.tempo_p90 = percentil_tempo(finalizadas, metrics.total_aprovadas, 0.9)
+
+    # --- Setores (30 dias) e evolução diária (mês): uma consulta no consolidado diário ---
+    inicio = min(month_start, inicio_30_dias)
+    por_dia_setor = (
+        DailyRequestStats.objects.filter(date__gte=inicio, category='')
+        .values('date', 'sector__name')
+        .annotate(total=Sum('request_count'))
+        .filter(total__gt=0)
+        .order_by()
+    )
+    setores = {}
+    evolucao = {}
+    for row in por_dia_setor:
+        if row['date'] >= inicio_30_dias:
+            nome = row['sector__name'] or 'N/A'
+            setores[nome] = setores.get(nome, 0) + row['total']
+        if row['date'] >= month_start:
+            evolucao[row['date']] = evolucao.get(row['date'], 0) + row['total']
+    setores_ordenados = sorted(setores.items(), key=lambda s: -s[1])
+    metrics.setores_labels = [nome for nome, _ in setores_ordenados]
+    metrics.setores_data = [total for _, total in setores_ordenados]
+    metrics.evolucao_labels = [data.strftime('%d/%m') for data in sorted(evolucao)]
+    metrics.evolucao_data = [evolucao[data] for data in sorted(evolucao)]
+
+    # --- Distribuição por status ---
+    status_nomes = dict(RequestStatus.choices)
+    status_dist = qs.values('status').annotate(total=Count('id')).order_by()
+    metrics.status_labels = [status_nomes.get(s['status'], s['status']) for s in status_dist]
+    metrics.status_data = [s['total'] for s in status_dist]
+
+    # --- Top 5 usuários que mais requisitam ---
+    top_users = qs.values('requester__username').annotate(total=Count('id')).order_by('-total')[:5]
+    metrics.top_users_labels = [u['requester__username'] for u in top_users]
+    metrics.top_users_data = [u['total'] for u in top_users]
+
+    # --- Categorias mais requisitadas (30 dias) ---
+    categoria_nomes = dict(ItemCategory.choices)
+    categorias = DailyRequestStats.objects.filter(date__gte=inicio_30_dias) \
+        .exclude(category='') \
+        .values('category') \
+        .annotate(total=Sum('item_count')) \
+        .filter(total__gt=0) \
+        .order_by('-total')
+    metrics.categorias_labels = [categoria_nomes.get(c['category'], c['category']) for c in categorias]
+    metrics.categorias_data = [c['total'] for c in categorias]
+
+    return metrics
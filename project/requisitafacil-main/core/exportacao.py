@@ -0,0 +1,239 @@
+"""
+Exportação das requisições com seus itens em CSV ou XLSX, em streaming.
+
+As linhas vêm de um único `values_list` (Request com LEFT JOIN nos itens)
+percorrido com `.iterator(chunk_size=...)`, e cada bloco é escrito e enviado
+antes de ler o próximo: a memória usada é a mesma para mil ou milhões de linhas.
+O XLSX é gerado à mão (SpreadsheetML mínimo dentro de um zip escrito em
+sequência, com ZIP64 para passar de 2 GiB), sem depender de bibliotecas
+externas; acima do limite de linhas do Excel os dados continuam em novas abas.
+No CSV, textos que o Excel interpretaria como fórmula recebem um apóstrofo na frente.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .models import RequestStatus, Urgency
+from .busca import filtrar_por_busca
+from .queries import filtrar_requisicoes, inicio_do_dia
+
+TAMANHO_BLOCO = 2000
+
+# Limite de linhas de uma aba do Excel (cabeçalho incluído)
+LIMITE_LINHAS_XLSX = 1_048_576
+
+# Começos de texto que o Excel trata como fórmula ao abrir um CSV
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+COLUNAS = [
+    'Código', 'Setor', 'Requisitante', 'Urgência', 'Status', 'Criada em', 'Atualizada em',
+    'Item', 'Quantidade', 'Quantidade atendida', 'Observação do item',
+]
+
+CAMPOS = [
+    'request_code', 'sector__name', 'requester__first_name', 'requester__last_name', 'requester__username',
+    'urgency', 'status', 'created_at', 'updated_at',
+    'items__item_requested', 'items__quantify', 'items__quantidade_atendida', 'items__observacao_item',
+]
+
+STATUS = dict(RequestStatus.choices)
+URGENCIAS = dict(Urgency.choices)
+
+
+def filtrar_exportacao(queryset, params):
+    """
+    Filtros da listagem (status, urgency, data e a busca textual q) mais o período
+    data_inicio/data_fim, inclusivo. Datas do período em formato inválido levantam ValueError.
+    """
+    queryset = filtrar_por_busca(filtrar_requisicoes(queryset, params), params.get('q'))
+    inicio = date.fromisoformat(params['data_inicio']) if params.get('data_inicio') else None
+    fim = date.fromisoformat(params['data_fim']) if params.get('data_fim') else None
+    if inicio:
+        queryset = queryset.filter(created_at__gte=inicio_do_dia(inicio))
+    if fim:
+        queryset = queryset.filter(created_at__lt=inicio_do_dia(fim + timedelta(days=1)))
+    return queryset
+
+
+def _data_hora(valor):
+    return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M:%S') if valor else ''
+
+
+def linhas_exportacao(queryset, tamanho_bloco=TAMANHO_BLOCO):
+    """Uma tupla por item (ou por requisição sem itens), já formatada para a planilha."""
+    linhas = (
+        queryset.order_by('created_at', 'id', 'items__created_at')
+        .values_list(*CAMPOS)
+        .iterator(chunk_size=tamanho_bloco)
+    )
+    for (codigo, setor, nome, sobrenome, usuario, urgencia, status, criada, atualizada,
+         item, quantidade, atendida, observacao) in linhas:
+        yield (
+            codigo or '', setor or '', f'{nome} {sobrenome}'.strip() or usuario,
+            URGENCIAS.get(urgencia, urgencia), STATUS.get(status, status),
+            _data_hora(criada), _data_hora(atualizada),
+            item or '', quantidade, atendida, observacao or '',
+        )
+
+
+class _Eco:
+    """Arquivo falso para o csv.writer: devolve a linha escrita em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    # Texto digitado pelo usuário (itens, observações) não pode virar fórmula no Excel
+    if isinstance(valor, str) and valor.startswith(_INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def gerar_csv(linhas):
+    # BOM para o Excel reconhecer UTF-8; ";" é o separador esperado pelo Excel em português
+    yield '\ufeff'
+    writer = csv.writer(_Eco(), delimiter=';')
+    yield writer.writerow(COLUNAS)
+    for linha in linhas:
+        yield writer.writerow([_valor_csv(valor) for valor in linha])
+
+
+class _SaidaSequencial(io.RawIOBase):
+    """Destino não pesquisável do zip: acumula os bytes até o próximo `esvaziar()`."""
+
+    def __init__(self):
+        self.partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def esvaziar(self):
+        dados = b''.join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+# Caracteres de controle não são aceitos em XML
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{abas}'
+    '</Types>'
+)
+_CONTENT_TYPE_ABA = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{abas}</sheets>'
+    '</workbook>'
+)
+_WORKBOOK_ABA = '<sheet name="{nome}" sheetId="{n}" r:id="rId{n}"/>'
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{abas}'
+    '</Relationships>'
+)
+_WORKBOOK_RELS_ABA = (
+    '<Relationship Id="rId{n}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{n}.xml"/>'
+)
+_INICIO_ABA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_FIM_ABA = '</sheetData></worksheet>'
+
+
+
+def _celula(valor):
+    if valor is None or valor == '':
+        return '<c/>'
+    if isinstance(valor, (int, float)):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_INVALIDOS_XML.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha_xml(valores):
+    return '<row>' + ''.join(_celula(valor) for valor in valores) + '</row>'
+
+
+def _nome_aba(n):
+    return 'Requisições' if n == 1 else f'Requisições {n}'
+
+
+def gerar_xlsx(linhas, linhas_por_bloco=TAMANHO_BLOCO, linhas_por_aba=LIMITE_LINHAS_XLSX - 1):
+    """
+    Gera o XLSX em pedaços. Cada aba recebe até `linhas_por_aba` linhas de dados
+    além do cabeçalho; as partes que listam as abas vão no fim do zip, quando já
+    se sabe quantas são.
+    """
+    saida = _SaidaSequencial()
+    linhas = iter(linhas)
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as arquivo:
+        abas = 0
+        proxima = next(linhas, None)
+        while abas == 0 or proxima is not None:
+            abas += 1
+            # force_zip64: o tamanho da aba não é conhecido antes e pode passar de 2 GiB
+            with arquivo.open(f'xl/worksheets/sheet{abas}.xml', 'w', force_zip64=True) as planilha:
+                planilha.write((_INICIO_ABA + _linha_xml(COLUNAS)).encode())
+                bloco = []
+                na_aba = 0
+                while proxima is not None and na_aba < linhas_por_aba:
+                    bloco.append(_linha_xml(proxima))
+                    na_aba += 1
+                    proxima = next(linhas, None)
+                    if len(bloco) >= linhas_por_bloco:
+                        planilha.write(''.join(bloco).encode())
+                        bloco.clear()
+                        yield saida.esvaziar()
+                planilha.write((''.join(bloco) + _FIM_ABA).encode())
+
+        numeros = range(1, abas + 1)
+        arquivo.writestr('[Content_Types].xml', _CONTENT_TYPES.format(
+            abas=''.join(_CONTENT_TYPE_ABA.format(n=n) for n in numeros)))
+        arquivo.writestr('_rels/.rels', _RELS)
+        arquivo.writestr('xl/workbook.xml', _WORKBOOK.format(
+            abas=''.join(_WORKBOOK_ABA.format(nome=_nome_aba(n), n=n) for n in numeros)))
+        arquivo.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS.format(
+            abas=''.join(_WORKBOOK_RELS_ABA.format(n=n) for n in numeros)))
+    yield saida.esvaziar()
+
+
+FORMATOS = {
+    'csv': (gerar_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (gerar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
@@ -0,0 +1,68 @@
+"""
+Fila de atendimento dos almoxarifes: a próxima requisição pendente por
+prioridade (urgentes primeiro, depois a mais antiga), com preferência opcional
+pelo setor do almoxarife dentro do mesmo nível de urgência.
+
+No PostgreSQL a requisição é escolhida com `SELECT ... FOR UPDATE SKIP LOCKED`:
+cada almoxarife pega a primeira linha que ninguém está assumindo naquele
+instante, sem esperar pelos outros. Nos bancos sem SKIP LOCKED (SQLite) os
+primeiros candidatos são tentados em ordem e o UPDATE condicional de
+assumir_requisicao decide quem fica com cada um.
+
+A ordem da fila é a de um índice parcial só com as pendentes (ver
+Request.Meta.indexes), então pegar a próxima custa o mesmo com 10 ou com
+100 mil requisições na fila.
+"""
+from django.db import connection, transaction
+
+from .atendimento import assumir_requisicao
+from .models import Request, RequestStatus
+
+# 'URGENTE' vem depois de 'NORMAL' em ordem alfabética: '-urgency' põe as urgentes na frente
+ORDEM_FILA = ('-urgency', 'created_at', 'id')
+
+# Sem SKIP LOCKED: candidatos lidos por vez e rodadas de leitura antes de desistir
+CANDIDATOS_POR_RODADA = 5
+RODADAS = 3
+
+
+def fila_pendente(queryset=None):
+    """Requisições pendentes na ordem em que devem ser atendidas."""
+    if queryset is None:
+        queryset = Request.objects.all()
+    return queryset.filter(status=RequestStatus.PENDING).order_by(*ORDEM_FILA)
+
+
+def _assumir_primeira(usuario, filtros):
+    fila = fila_pendente().filter(**filtros)
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pk = fila.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            # A linha está travada por esta transação: o UPDATE condicional não tem como perder
+            return assumir_requisicao(pk, usuario) if pk is not None else None
+
+    for _ in range(RODADAS):
+        candidatos = list(fila.values_list('pk', flat=True)[:CANDIDATOS_POR_RODADA])
+        if not candidatos:
+            return None
+        for pk in candidatos:
+            requisicao = assumir_requisicao(pk, usuario)
+            if requisicao is not None:
+                return requisicao
+    return None
+
+
+def proxima_requisicao(usuario, setor_id=None):
+    """
+    Assume para o usuário a próxima requisição da fila e a retorna, ou None se
+    não houver nenhuma pendente. Com `setor_id`, uma requisição desse setor passa
+    na frente das de outros setores com a mesma urgência.
+    """
+    if setor_id:
+        urgencia = fila_pendente().values_list('urgency', flat=True).first()
+        if urgencia is None:
+            return None
+        requisicao = _assumir_primeira(usuario, {'sector_id': setor_id, 'urgency': urgencia})
+        if requisicao is not None:
+            return requisicao
+    return _assumir_primeira(usuario, {})
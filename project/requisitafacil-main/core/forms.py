@@ -61,6 +61,9 @@ class RequestItemForm(forms.ModelForm):
             
             if field_name == 'item_requested':
                 field.widget.attrs['placeholder'] = 'Nome do item'
+                # Sugestões do catálogo (autocompletar em criar_requisicao.html)
+                field.widget.attrs['list'] = 'catalogo-itens'
+                field.widget.attrs['autocomplete'] = 'off'
             elif field_name == 'quantify':
                 field.widget.attrs['placeholder'] = 'Qtd.'
 
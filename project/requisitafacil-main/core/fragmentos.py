@@ -0,0 +1,52 @@
+"""
+Fragmentos de tabela (só as linhas do <tbody>) usados pelas atualizações em tempo real.
+
+Cada fragmento leva um ETag forte calculado a partir de uma "impressão digital"
+barata do queryset filtrado: o maior updated_at e a contagem de linhas, obtidos
+em uma única consulta agregada. Se o navegador mandar o mesmo ETag em
+If-None-Match, a resposta é um 304 sem renderizar template nenhum.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+PARAMETRO = 'fragmento'
+
+
+def pede_fragmento(request):
+    return bool(request.GET.get(PARAMETRO))
+
+
+def impressao_digital(queryset):
+    """(maior updated_at, total de linhas) do queryset, em uma consulta."""
+    dados = queryset.order_by().aggregate(ultima=Max('updated_at'), total=Count('id'))
+    return dados['ultima'], dados['total']
+
+
+def etag_fragmento(request, queryset):
+    ultima, total = impressao_digital(queryset)
+    # O conteúdo também depende de quem vê (botões de ação) e dos filtros/cursor da URL
+    filtros = request.GET.copy()
+    filtros.pop(PARAMETRO, None)
+    chave = '|'.join([
+        str(request.user.pk), request.user.role or '', request.path, filtros.urlencode(),
+        ultima.isoformat() if ultima else '', str(total),
+    ])
+    return '"%s"' % hashlib.sha1(chave.encode()).hexdigest()
+
+
+def responder_fragmento(request, queryset, template_name, contexto):
+    """
+    Responde 304 se o fragmento não mudou; senão renderiza `template_name` com
+    o contexto devolvido por `contexto()` (chamado só quando precisa renderizar).
+    """
+    etag = etag_fragmento(request, queryset)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(request, template_name, contexto())
+    response['ETag'] = etag
+    # O navegador sempre revalida; o conteúdo depende da sessão
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
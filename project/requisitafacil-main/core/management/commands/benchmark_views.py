@@ -0,0 +1,163 @@
+import json
+import platform
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core import benchmark
+from core.models import Request
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula um banco de benchmark em cada escala (padrão: 10 mil, 100 mil e 1 milhão de requisições), '
+        'mede as views principais como cada papel e grava um relatório JSON, comparando com uma baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escalas',
+            nargs='+',
+            type=int,
+            default=[10_000, 100_000, 1_000_000],
+            help='Quantidades de requisições a medir, em ordem crescente (padrão: 10000 100000 1000000)'
+        )
+        parser.add_argument('--repeticoes', type=int, default=5, help='Repetições medidas por cenário (padrão: 5)')
+        parser.add_argument('--aquecimento', type=int, default=1, help='Execuções descartadas antes de medir (padrão: 1)')
+        parser.add_argument('--saida', default='benchmark.json', help='Arquivo do relatório (padrão: benchmark.json)')
+        parser.add_argument('--baseline', help='Relatório anterior para comparação; regressões encerram com erro')
+        parser.add_argument(
+            '--tolerancia',
+            type=float,
+            default=0.25,
+            help='Aumento aceito no tempo mediano em relação à baseline (padrão: 0.25 = 25%%)'
+        )
+        parser.add_argument(
+            '--cache-quente',
+            action='store_true',
+            help='Não invalida o cache dos dashboards entre as repetições'
+        )
+        parser.add_argument(
+            '--banco-atual',
+            action='store_true',
+            help='Popula e mede o banco configurado em vez de criar um banco de benchmark separado'
+        )
+        parser.add_argument(
+            '--manter-banco',
+            action='store_true',
+            help='Não apaga o banco de benchmark ao final; a próxima execução só completa o que faltar'
+        )
+        parser.add_argument('--semente', type=int, default=42, help='Semente da geração de dados (padrão: 42)')
+        parser.add_argument('--processos', type=int, default=1, help='Processos usados para popular o banco (padrão: 1)')
+
+    def handle(self, *args, **options):
+        escalas = sorted(set(options['escalas']))
+        if not escalas or escalas[0] < 1:
+            raise CommandError('As escalas devem ser maiores que zero')
+
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Não foi possível ler a baseline: {e}')
+
+        nome_original = None
+        if not options['banco_atual']:
+            nome_original = self._criar_banco_benchmark(options['manter_banco'])
+
+        try:
+            relatorio = self._medir_escalas(escalas, options)
+        finally:
+            if nome_original is not None:
+                connection.creation.destroy_test_db(nome_original, verbosity=0, keepdb=options['manter_banco'])
+
+        Path(options['saida']).write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'\n📄 Relatório gravado em {options["saida"]}'))
+
+        if baseline is not None:
+            self._comparar(relatorio, baseline, options['tolerancia'])
+
+    def _criar_banco_benchmark(self, manter):
+        # Banco próprio, ao lado do configurado, para não misturar a massa de testes com dados reais
+        nome_original = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite':
+            caminho = Path(str(nome_original))
+            nome_benchmark = str(caminho.with_name(f'{caminho.stem}_benchmark.sqlite3'))
+        else:
+            nome_benchmark = f'{nome_original}_benchmark'
+        connection.settings_dict['TEST']['NAME'] = nome_benchmark
+        self.stdout.write(f'🗄️ Banco de benchmark: {nome_benchmark}')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=manter)
+        return nome_original
+
+    def _medir_escalas(self, escalas, options):
+        relatorio = {
+            'versao': benchmark.VERSAO_RELATORIO,
+            'gerado_em': timezone.now().isoformat(),
+            'banco': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'repeticoes': options['repeticoes'],
+            'cache_frio': not options['cache_quente'],
+            'escalas': {},
+        }
+        for escala in escalas:
+            atual = self._popular(escala, options)
+            self.stdout.write(self.style.SUCCESS(f'\n📏 Escala {escala}: {atual} requisições no banco'))
+            cenarios = {}
+            for cenario in benchmark.CENARIOS:
+                resultado = benchmark.medir(
+                    cenario,
+                    repeticoes=options['repeticoes'],
+                    aquecimento=options['aquecimento'],
+                    cache_frio=not options['cache_quente'],
+                )
+                if resultado is None:
+                    self.stdout.write(self.style.WARNING(f'   ⚠ {cenario.chave}: sem usuário ou dados, ignorado'))
+                    continue
+                cenarios[cenario.chave] = resultado
+                estilo = self.style.SUCCESS if resultado['ok'] else self.style.ERROR
+                self.stdout.write(estilo(
+                    f'   {cenario.chave:<40} {resultado["tempo_mediano_ms"]:>9.1f} ms  '
+                    f'p95 {resultado["tempo_p95_ms"]:>9.1f} ms  {resultado["consultas"]:>3} consultas  '
+                    f'SQL {resultado["tempo_sql_ms"]:>8.1f} ms  {resultado["pico_memoria_kb"]:>9.0f} KB  '
+                    f'HTTP {resultado["status_http"]}'
+                ))
+            relatorio['escalas'][str(escala)] = {'requisicoes': atual, 'cenarios': cenarios}
+        return relatorio
+
+    def _popular(self, escala, options):
+        existentes = Request.objects.count()
+        faltam = escala - existentes
+        if faltam > 0:
+            self.stdout.write(f'\n📝 Completando o banco com {faltam} requisições...')
+            # Semente diferente por escala: cada complemento gera ids novos
+            call_command(
+                'gerar_dados_teste', '--bulk',
+                '--num-requisicoes', str(faltam),
+                '--semente', str(options['semente'] + escala),
+                '--processos', str(options['processos']),
+                stdout=self.stdout if options['verbosity'] > 1 else StringIO(),
+            )
+        elif faltam < 0:
+            self.stdout.write(self.style.WARNING(f'⚠ O banco já tem {existentes} requisições, mais que {escala}'))
+        return Request.objects.count()
+
+    def _comparar(self, relatorio, baseline, tolerancia):
+        regressoes = benchmark.comparar(relatorio, baseline, tolerancia)
+        if not regressoes:
+            self.stdout.write(self.style.SUCCESS('✓ Nenhuma regressão em relação à baseline'))
+            return
+        self.stdout.write(self.style.ERROR(f'\n❌ {len(regressoes)} regressão(ões) em relação à baseline:'))
+        for regressao in regressoes:
+            self.stdout.write(
+                f'   [{regressao["escala"]}] {regressao["cenario"]} {regressao["metrica"]}: '
+                f'{regressao["baseline"]} → {regressao["atual"]}'
+            )
+        raise CommandError(f'{len(regressoes)} regressão(ões) de desempenho')
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from core.models import Request, Role, User
+
+# Views de leitura analisadas, com o papel usado para acessá-las
+VIEWS = [
+    ('core:listar_requisicoes', Role.Gestor),
+    ('core:listar_requisicoes', Role.Encarregado),
+    ('core:dashboard', Role.Encarregado),
+    ('core:dashboard', Role.Almoxarife),
+    ('core:almoxarife_dashboard', Role.Almoxarife),
+    ('core:gestor_dashboard', Role.Gestor),
+    ('core:detalhe_requisicao', Role.Gestor),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa as views principais contra o banco atual, roda EXPLAIN em cada SELECT '
+        'emitido e aponta as varreduras sequenciais (full scans)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--plano',
+            action='store_true',
+            help='Mostra o plano completo de cada consulta'
+        )
+        parser.add_argument(
+            '--estrito',
+            action='store_true',
+            help='Termina com erro se alguma varredura sequencial for encontrada'
+        )
+
+    def handle(self, *args, **options):
+        client = Client(SERVER_NAME='localhost')
+        requisicao = Request.objects.order_by('-created_at').first()
+        total_scans = 0
+
+        for url_name, papel in VIEWS:
+            usuario = User.objects.filter(role=papel, is_active=True).first()
+            if usuario is None:
+                self.stdout.write(self.style.WARNING(f'⚠️ {url_name}: nenhum usuário {papel} cadastrado, ignorando'))
+                continue
+            if url_name == 'core:detalhe_requisicao':
+                if requisicao is None:
+                    continue
+                url = reverse(url_name, args=[requisicao.pk])
+            else:
+                url = reverse(url_name)
+
+            consultas = self._capturar(client, usuario, url)
+            self.stdout.write(self.style.SUCCESS(f'\n🔎 {url_name} ({papel}) - {len(consultas)} SELECTs'))
+            for sql in consultas:
+                plano = self._explain(sql)
+                scans = [linha for linha in plano if self._eh_scan_sequencial(linha)]
+                total_scans += len(scans)
+                for linha in scans:
+                    self.stdout.write(self.style.WARNING(f'   ❌ {linha.strip()}'))
+                    self.stdout.write(f'      em: {sql[:200]}')
+                if options['plano']:
+                    self.stdout.write(f'   {sql}')
+                    for linha in plano:
+                        self.stdout.write(f'      {linha}')
+
+        self.stdout.write(f'\n📊 Varreduras sequenciais encontradas: {total_scans}')
+        if total_scans and options['estrito']:
+            raise CommandError(f'{total_scans} varreduras sequenciais encontradas')
+
+    def _capturar(self, client, usuario, url):
+        # Tudo é desfeito ao final: sessões de login e qualquer efeito colateral das views
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'localhost']):
+            client.force_login(usuario)
+            with CaptureQueriesContext(connection) as capturadas:
+                client.get(url)
+            transaction.set_rollback(True)
+        return [
+            q['sql'] for q in capturadas.captured_queries
+            if q['sql'].lstrip().upper().startswith('SELECT') and 'django_session' not in q['sql']
+        ]
+
+    def _explain(self, sql):
+        prefixo = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefixo + sql)
+            return [' '.join(str(coluna) for coluna in linha) for linha in cursor.fetchall()]
+
+    def _eh_scan_sequencial(self, linha):
+        if connection.vendor == 'postgresql':
+            return 'Seq Scan' in linha
+        if connection.vendor == 'sqlite':
+            # "SCAN tabela" sem índice; "SEARCH ... USING INDEX" é busca por índice
+            return ' SCAN ' in f' {linha} ' and 'USING' not in linha and 'CONSTANT ROW' not in linha
+        return 'ALL' in linha.split()
@@ -1,10 +1,13 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
 from django.utils import timezone
 from datetime import timedelta
 import random
+import time
+from core import carga_massa
 from core.models import (
     User, Sector, Request, RequestItem, Role, 
-    RequestStatus, Urgency, ItemCategory
+    RequestStatus, Urgency, ItemCategory, reservar_codigos, abreviacao_setor
 )
 
 class Command(BaseCommand):
@@ -29,6 +32,40 @@ class Command(BaseCommand):
             default=30,
             help='Número de dias para trás para criar requisições (padrão: 30)'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Modo de alto volume: gera em memória e grava em lotes (COPY no PostgreSQL, bulk_create nos demais)'
+        )
+        parser.add_argument(
+            '--semente',
+            type=int,
+            default=42,
+            help='Semente do gerador aleatório no modo --bulk; a mesma semente gera a mesma distribuição (padrão: 42)'
+        )
+        parser.add_argument(
+            '--tamanho-lote',
+            type=int,
+            default=10000,
+            help='Requisições por lote/transação no modo --bulk (padrão: 10000)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Linhas por INSERT/COPY no modo --bulk (padrão: 2000)'
+        )
+        parser.add_argument(
+            '--processos',
+            type=int,
+            default=1,
+            help='Processos gravando lotes em paralelo no modo --bulk (padrão: 1)'
+        )
+        parser.add_argument(
+            '--sem-copy',
+            action='store_true',
+            help='No PostgreSQL, usa bulk_create em vez de COPY'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(
@@ -104,25 +141,82 @@ class Command(BaseCommand):
                 self.stdout.write(f"✓ Encarregado criado para {nome_setor}")
             users[f'encarregado_{nome_setor.lower()}'] = encarregado
         
-        # Itens disponíveis para requisições
-        itens_disponiveis = [
-            "Papel A4", "Caneta", "Lápis", "Borracha", "Régua", "Tesoura",
-            "Cola", "Fita adesiva", "Post-it", "Grampeador", "Clips",
-            "Envelope", "Cartolina", "EVA", "Tinta", "Pincel", "Pano",
-            "Detergente", "Desinfetante", "Papel higiênico", "Sabão",
-            "Luvas", "Máscaras", "Álcool", "Lixeira", "Vassoura",
-            "Rodo", "Balde", "Esponja", "Saco de lixo", "Fita crepe"
-        ]
-        
+        if options['bulk']:
+            self.gerar_em_massa(options, setores, users)
+        else:
+            self.gerar_uma_a_uma(num_requisicoes, setores, users, dias_atras)
+
+        self.mostrar_resumo(setores, users)
+
+    def gerar_em_massa(self, options, setores, users):
+        num_requisicoes = options['num_requisicoes']
+        if num_requisicoes < 1 or options['tamanho_lote'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--num-requisicoes, --tamanho-lote e --batch-size devem ser maiores que zero')
+
+        processos = max(1, options['processos'])
+        if processos > 1 and connection.vendor == 'sqlite':
+            # O SQLite aceita um único escritor por vez: processos paralelos só disputariam a trava
+            self.stdout.write(self.style.WARNING('⚠ SQLite não suporta gravação paralela; usando 1 processo'))
+            processos = 1
+
+        plano = carga_massa.PlanoCarga(
+            total=num_requisicoes,
+            setores=[
+                carga_massa.SetorCarga(
+                    id=setor.pk,
+                    nome=nome,
+                    abreviacao=abreviacao_setor(setor),
+                    requester_id=users[f'encarregado_{nome.lower()}'].pk,
+                    peso=carga_massa.PESOS_SETORES.get(nome, 1),
+                )
+                for nome, setor in setores.items()
+            ],
+            almoxarife_id=users['almoxarife'].pk,
+            semente=options['semente'],
+            dias_atras=options['dias_atras'],
+            tamanho_lote=options['tamanho_lote'],
+            batch_size=options['batch_size'],
+            usar_copy=not options['sem_copy'],
+        )
+        metodo = 'COPY' if plano.usar_copy and connection.vendor == 'postgresql' else 'bulk_create'
+        self.stdout.write(
+            f"📝 Gerando {num_requisicoes} requisições em {plano.num_lotes} lote(s) "
+            f"com {processos} processo(s), via {metodo} (semente {plano.semente})..."
+        )
+
+        inicio = time.perf_counter()
+
+        def progresso(indice, requisicoes, itens):
+            decorrido = time.perf_counter() - inicio
+            self.stdout.write(
+                f"✓ Lote {indice + 1}/{plano.num_lotes}: {requisicoes} requisições, {itens} itens "
+                f"({requisicoes / decorrido:.0f} req/s)"
+            )
+
+        requisicoes, itens = carga_massa.executar(plano, processos, ao_concluir_lote=progresso)
+        self.stdout.write(
+            f"✓ {requisicoes} requisições e {itens} itens gravados em {time.perf_counter() - inicio:.1f}s; "
+            f"consolidado diário reconstruído"
+        )
+
+    def gerar_uma_a_uma(self, num_requisicoes, setores, users, dias_atras):
+        setores_nomes = list(setores)
+        itens_disponiveis = carga_massa.ITENS
+
         # Criar requisições
         self.stdout.write(f"📝 Criando {num_requisicoes} requisições...")
         
         hoje = timezone.now()
         requisicoes_criadas = 0
+
+        # Sorteia os setores antes e reserva um bloco de códigos por setor de uma vez
+        setores_sorteados = [random.choice(setores_nomes) for _ in range(num_requisicoes)]
+        codigos_por_setor = {
+            nome: reservar_codigos(setores[nome], setores_sorteados.count(nome))
+            for nome in set(setores_sorteados)
+        }
         
-        for i in range(num_requisicoes):
-            # Escolher setor aleatório
-            setor_nome = random.choice(setores_nomes)
+        for i, setor_nome in enumerate(setores_sorteados):
             setor = setores[setor_nome]
             encarregado = users[f'encarregado_{setor_nome.lower()}']
             
@@ -151,7 +245,8 @@ class Command(BaseCommand):
                 urgency=urgency,
                 observations=f"Observação teste {i+1} para {setor_nome}",
                 status=status,
-                created_at=data_criacao
+                created_at=data_criacao,
+                request_code=codigos_por_setor[setor_nome].pop(0)
             )
             
             # Definir data de atualização baseada no status
@@ -191,7 +286,8 @@ class Command(BaseCommand):
             
             if requisicoes_criadas % 10 == 0:
                 self.stdout.write(f"✓ {requisicoes_criadas} requisições criadas...")
-        
+
+    def mostrar_resumo(self, setores, users):
         # Estatísticas finais
         total_requisicoes = Request.objects.count()
         pendentes = Request.objects.filter(status=RequestStatus.PENDING).count()
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core import catalogo
+
+
+class Command(BaseCommand):
+    help = (
+        'Cria o catálogo de itens a partir dos itens já requisitados, agrupando os textos '
+        'pelo nome normalizado ("Papel A4", "papel a4" e "PAPEL A-4" viram um só item), '
+        'e vincula os itens das requisições ao catálogo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--revincular', action='store_true',
+            help='Refaz também os vínculos já existentes (por padrão, só itens ainda sem vínculo)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('📚 Agrupando itens requisitados...')
+        grupos, criados, vinculados = catalogo.popular_catalogo(revincular=options['revincular'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {grupos} itens distintos, {criados} novos no catálogo, {vinculados} itens de requisição vinculados'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core import daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero o consolidado diário de requisições (DailyRequestStats)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('📊 Recalculando consolidado diário...')
+        total = daily_stats.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'✓ Consolidado reconstruído com {total} linhas'))
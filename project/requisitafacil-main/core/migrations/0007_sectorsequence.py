@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:23
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_request_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectorSequence',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('prefix', models.CharField(max_length=10, unique=True, verbose_name='Prefixo')),
+                ('last_number', models.PositiveBigIntegerField(default=0, verbose_name='Último Número')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Sequência de Setor',
+                'verbose_name_plural': 'Sequências de Setor',
+                'ordering': ['prefix'],
+            },
+        ),
+    ]
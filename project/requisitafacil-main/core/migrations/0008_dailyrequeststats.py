@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:29
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_sectorsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRequestStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField(verbose_name='Data')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendente'), ('EM_ATENDIMENTO', 'Em Atendimento'), ('APPROVED', 'Atendida')], max_length=15, verbose_name='Status')),
+                ('urgency', models.CharField(choices=[('NORMAL', 'Normal'), ('URGENTE', 'Urgente')], max_length=10, verbose_name='Urgência')),
+                ('category', models.CharField(blank=True, choices=[('INSUMO_PRODUCAO', 'Insumo(Produção)'), ('EMBALAGENS', 'Embalagens'), ('LIMPEZA', 'Limpeza'), ('AREA_DE_VENDA', 'Area de venda'), ('ADIMINISTRATIVO', 'Administrativo')], default='', max_length=50, verbose_name='Categoria')),
+                ('request_count', models.IntegerField(default=0, verbose_name='Requisições')),
+                ('item_count', models.IntegerField(default=0, verbose_name='Itens')),
+                ('sector', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.sector', verbose_name='Setor')),
+            ],
+            options={
+                'verbose_name': 'Estatística Diária',
+                'verbose_name_plural': 'Estatísticas Diárias',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'sector', 'status', 'urgency', 'category'), name='unique_daily_request_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def popular_consolidado(apps, schema_editor):
+    Request = apps.get_model('core', 'Request')
+    RequestItem = apps.get_model('core', 'RequestItem')
+    DailyRequestStats = apps.get_model('core', 'DailyRequestStats')
+
+    requisicoes = Request.objects.annotate(dia=TruncDate('created_at')) \
+        .values('dia', 'sector_id', 'status', 'urgency') \
+        .annotate(total=Count('id')).order_by()
+    itens = RequestItem.objects.annotate(dia=TruncDate('request__created_at')) \
+        .values('dia', 'request__sector_id', 'request__status', 'request__urgency', 'category') \
+        .annotate(total=Count('id')).order_by()
+
+    linhas = [
+        DailyRequestStats(date=r['dia'], sector_id=r['sector_id'], status=r['status'],
+                          urgency=r['urgency'], request_count=r['total'])
+        for r in requisicoes
+    ]
+    linhas += [
+        DailyRequestStats(date=i['dia'], sector_id=i['request__sector_id'], status=i['request__status'],
+                          urgency=i['request__urgency'], category=i['category'], item_count=i['total'])
+        for i in itens
+    ]
+    DailyRequestStats.objects.bulk_create(linhas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_dailyrequeststats'),
+    ]
+
+    operations = [
+        migrations.RunPython(popular_consolidado, migrations.RunPython.noop),
+    ]
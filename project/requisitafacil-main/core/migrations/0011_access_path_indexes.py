@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_request_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['status', 'urgency'], name='request_status_urgency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['requester', 'status'], name='request_requester_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['status', 'updated_at'], name='request_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['sector', 'created_at'], name='request_sector_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(condition=models.Q(('status__in', ['PENDING', 'EM_ATENDIMENTO'])), fields=['-updated_at'], name='request_active_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestitem',
+            index=models.Index(fields=['request', 'created_at'], name='item_request_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestitem',
+            index=models.Index(fields=['created_at', 'category'], name='item_created_category_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['updated_at', 'id'], name='request_updated_id_idx'),
+        ),
+    ]
@@ -0,0 +1,233 @@
+"""
+Estruturas da busca textual (core/busca.py), mantidas por triggers no próprio banco,
+para que gravações em massa (bulk_create, COPY, update()) também fiquem indexadas.
+
+- PostgreSQL: tabela core_request_busca com um tsvector (código, itens e observações,
+  com pesos A/B/C) em índice GIN, e o texto sem acentos em índice GIN de trigramas
+  (pg_trgm) para buscas aproximadas;
+- SQLite: tabela virtual FTS5 core_busca_fts, com rowid estável vindo de
+  core_busca_chave (o rowid de core_request pode mudar num VACUUM).
+
+Em outros bancos, ou num SQLite compilado sem FTS5, nada é criado e a busca
+usa icontains.
+"""
+from django.db import migrations
+
+POSTGRES_CRIAR = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    """
+    CREATE TABLE core_request_busca (
+        -- Sem chave estrangeira: um TRUNCATE em core_request (flush) não pode depender desta tabela
+        request_id uuid PRIMARY KEY,
+        documento tsvector NOT NULL,
+        texto text NOT NULL
+    )
+    """,
+    'CREATE INDEX core_request_busca_documento_idx ON core_request_busca USING gin (documento)',
+    'CREATE INDEX core_request_busca_texto_trgm_idx ON core_request_busca USING gin (texto gin_trgm_ops)',
+    """
+    CREATE FUNCTION core_atualizar_busca(alvo uuid) RETURNS void AS $$
+    BEGIN
+        INSERT INTO core_request_busca (request_id, documento, texto)
+        SELECT r.id,
+               setweight(to_tsvector('portuguese', unaccent(coalesce(r.request_code, ''))), 'A') ||
+               setweight(to_tsvector('portuguese', unaccent(coalesce(i.itens, ''))), 'B') ||
+               setweight(to_tsvector('portuguese', unaccent(coalesce(r.observations, ''))), 'C'),
+               unaccent(lower(concat_ws(' ', r.request_code, i.itens, r.observations)))
+        FROM core_request r
+        LEFT JOIN LATERAL (
+            SELECT string_agg(concat_ws(' ', item_requested, observacao_item), ' ') AS itens
+            FROM core_requestitem WHERE request_id = r.id
+        ) i ON true
+        WHERE r.id = alvo
+        ON CONFLICT (request_id) DO UPDATE SET documento = EXCLUDED.documento, texto = EXCLUDED.texto;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE FUNCTION core_busca_requisicao() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM core_request_busca WHERE request_id = OLD.id;
+        ELSE
+            PERFORM core_atualizar_busca(NEW.id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE FUNCTION core_busca_item() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM core_atualizar_busca(OLD.request_id);
+        END IF;
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.request_id <> OLD.request_id) THEN
+            PERFORM core_atualizar_busca(NEW.request_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER core_request_busca_trg
+    AFTER INSERT OR DELETE OR UPDATE OF request_code, observations ON core_request
+    FOR EACH ROW EXECUTE FUNCTION core_busca_requisicao()
+    """,
+    """
+    CREATE TRIGGER core_requestitem_busca_trg
+    AFTER INSERT OR DELETE OR UPDATE OF request_id, item_requested, observacao_item ON core_requestitem
+    FOR EACH ROW EXECUTE FUNCTION core_busca_item()
+    """,
+    # Dados já existentes, de uma vez
+    """
+    INSERT INTO core_request_busca (request_id, documento, texto)
+    SELECT r.id,
+           setweight(to_tsvector('portuguese', unaccent(coalesce(r.request_code, ''))), 'A') ||
+           setweight(to_tsvector('portuguese', unaccent(coalesce(i.itens, ''))), 'B') ||
+           setweight(to_tsvector('portuguese', unaccent(coalesce(r.observations, ''))), 'C'),
+           unaccent(lower(concat_ws(' ', r.request_code, i.itens, r.observations)))
+    FROM core_request r
+    LEFT JOIN (
+        SELECT request_id, string_agg(concat_ws(' ', item_requested, observacao_item), ' ') AS itens
+        FROM core_requestitem GROUP BY request_id
+    ) i ON i.request_id = r.id
+    """,
+]
+
+POSTGRES_REMOVER = [
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_trg ON core_requestitem',
+    'DROP TRIGGER IF EXISTS core_request_busca_trg ON core_request',
+    'DROP FUNCTION IF EXISTS core_busca_item()',
+    'DROP FUNCTION IF EXISTS core_busca_requisicao()',
+    'DROP FUNCTION IF EXISTS core_atualizar_busca(uuid)',
+    'DROP TABLE IF EXISTS core_request_busca',
+]
+
+# Recalcula a linha da busca de uma requisição (:alvo é substituído pela expressão do id)
+SQLITE_ATUALIZAR = """
+    INSERT OR REPLACE INTO core_busca_fts (rowid, request_code, observations, itens)
+    SELECT c.id, r.request_code, r.observations,
+           (SELECT group_concat(coalesce(i.item_requested, '') || ' ' || coalesce(i.observacao_item, ''), ' ')
+            FROM core_requestitem i WHERE i.request_id = r.id)
+    FROM core_request r JOIN core_busca_chave c ON c.request_id = r.id
+    WHERE r.id = :alvo;
+"""
+
+SQLITE_CRIAR = [
+    """
+    CREATE TABLE core_busca_chave (
+        id integer PRIMARY KEY AUTOINCREMENT,
+        request_id char(32) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE core_busca_fts USING fts5(
+        request_code, observations, itens,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER core_request_busca_ins AFTER INSERT ON core_request BEGIN
+        INSERT INTO core_busca_chave (request_id) VALUES (NEW.id);
+        {SQLITE_ATUALIZAR.replace(':alvo', 'NEW.id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER core_request_busca_upd AFTER UPDATE OF request_code, observations ON core_request BEGIN
+        {SQLITE_ATUALIZAR.replace(':alvo', 'NEW.id')}
+    END
+    """,
+    """
+    CREATE TRIGGER core_request_busca_del AFTER DELETE ON core_request BEGIN
+        DELETE FROM core_busca_fts WHERE rowid = (SELECT id FROM core_busca_chave WHERE request_id = OLD.id);
+        DELETE FROM core_busca_chave WHERE request_id = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER core_requestitem_busca_ins AFTER INSERT ON core_requestitem BEGIN
+        {SQLITE_ATUALIZAR.replace(':alvo', 'NEW.request_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER core_requestitem_busca_upd
+    AFTER UPDATE OF request_id, item_requested, observacao_item ON core_requestitem BEGIN
+        {SQLITE_ATUALIZAR.replace(':alvo', 'OLD.request_id')}
+        {SQLITE_ATUALIZAR.replace(':alvo', 'NEW.request_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER core_requestitem_busca_del AFTER DELETE ON core_requestitem BEGIN
+        {SQLITE_ATUALIZAR.replace(':alvo', 'OLD.request_id')}
+    END
+    """,
+    # Dados já existentes, de uma vez
+    'INSERT INTO core_busca_chave (request_id) SELECT id FROM core_request',
+    """
+    INSERT INTO core_busca_fts (rowid, request_code, observations, itens)
+    SELECT c.id, r.request_code, r.observations, i.itens
+    FROM core_request r
+    JOIN core_busca_chave c ON c.request_id = r.id
+    LEFT JOIN (
+        SELECT request_id,
+               group_concat(coalesce(item_requested, '') || ' ' || coalesce(observacao_item, ''), ' ') AS itens
+        FROM core_requestitem GROUP BY request_id
+    ) i ON i.request_id = r.id
+    """,
+]
+
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_del',
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_upd',
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_ins',
+    'DROP TRIGGER IF EXISTS core_request_busca_del',
+    'DROP TRIGGER IF EXISTS core_request_busca_upd',
+    'DROP TRIGGER IF EXISTS core_request_busca_ins',
+    'DROP TABLE IF EXISTS core_busca_fts',
+    'DROP TABLE IF EXISTS core_busca_chave',
+]
+
+
+def _sqlite_tem_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Alguns builds trazem o FTS5 sem a opção de compilação registrada
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.core_teste_fts5 USING fts5(x)')
+            cursor.execute('DROP TABLE temp.core_teste_fts5')
+            return True
+        except Exception:
+            return False
+
+
+def criar_busca(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        comandos = POSTGRES_CRIAR
+    elif vendor == 'sqlite' and _sqlite_tem_fts5(schema_editor):
+        comandos = SQLITE_CRIAR
+    else:
+        return
+    for sql in comandos:
+        schema_editor.execute(sql, params=None)
+
+
+def remover_busca(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    comandos = {'postgresql': POSTGRES_REMOVER, 'sqlite': SQLITE_REMOVER}.get(vendor, [])
+    for sql in comandos:
+        schema_editor.execute(sql, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_request_updated_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_busca, remover_busca),
+    ]
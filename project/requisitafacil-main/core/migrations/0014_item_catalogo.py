@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:41
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_busca_textual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Item',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, verbose_name='Nome')),
+                ('normalized_name', models.CharField(editable=False, max_length=255, unique=True, verbose_name='Nome Normalizado')),
+                ('category', models.CharField(blank=True, choices=[('INSUMO_PRODUCAO', 'Insumo(Produção)'), ('EMBALAGENS', 'Embalagens'), ('LIMPEZA', 'Limpeza'), ('AREA_DE_VENDA', 'Area de venda'), ('ADIMINISTRATIVO', 'Administrativo')], default='', max_length=50, verbose_name='Categoria')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Item do Catálogo',
+                'verbose_name_plural': 'Itens do Catálogo',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='requestitem',
+            name='item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='request_items', to='core.item', verbose_name='Item do Catálogo'),
+        ),
+    ]
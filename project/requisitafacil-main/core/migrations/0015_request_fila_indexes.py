@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_item_catalogo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['-urgency', 'created_at', 'id'], name='request_fila_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['sector', '-urgency', 'created_at', 'id'], name='request_fila_setor_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:55
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_request_fila_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestStatusEvent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('created', 'Criada'), ('claimed', 'Atendimento iniciado'), ('finalized', 'Finalizada'), ('changed', 'Status alterado')], max_length=15, verbose_name='Ação')),
+                ('from_status', models.CharField(blank=True, choices=[('PENDING', 'Pendente'), ('EM_ATENDIMENTO', 'Em Atendimento'), ('APPROVED', 'Atendida')], default='', max_length=15, verbose_name='Status Anterior')),
+                ('to_status', models.CharField(choices=[('PENDING', 'Pendente'), ('EM_ATENDIMENTO', 'Em Atendimento'), ('APPROVED', 'Atendida')], max_length=15, verbose_name='Novo Status')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Data')),
+            ],
+            options={
+                'verbose_name': 'Evento de Status',
+                'verbose_name_plural': 'Eventos de Status',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fim do Atendimento'),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='service_seconds',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Atendimento (s)'),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Início do Atendimento'),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='wait_seconds',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Espera (s)'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['finished_at', 'wait_seconds', 'service_seconds'], name='request_sla_idx'),
+        ),
+        migrations.AddField(
+            model_name='requeststatusevent',
+            name='request',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='core.request', verbose_name='Requisição'),
+        ),
+        migrations.AddField(
+            model_name='requeststatusevent',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='status_events', to=settings.AUTH_USER_MODEL, verbose_name='Usuário'),
+        ),
+        migrations.AddIndex(
+            model_name='requeststatusevent',
+            index=models.Index(fields=['request', 'created_at'], name='status_event_request_idx'),
+        ),
+    ]
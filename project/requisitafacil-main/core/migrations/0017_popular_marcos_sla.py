@@ -0,0 +1,47 @@
+"""
+Preenche os marcos do atendimento das requisições já existentes.
+
+O histórico não guarda quando cada atendimento começou, então o melhor dado
+disponível é updated_at: em atendimento, começou em updated_at; atendida,
+começou e terminou em updated_at (toda a duração conta como espera). Assim o
+tempo total (espera + atendimento) é o mesmo que o painel mostrava antes.
+Não são criados eventos de status para o passado.
+"""
+from django.db import migrations
+
+LOTE = 1000
+
+
+def duracao(inicio, fim):
+    return max(0, int((fim - inicio).total_seconds()))
+
+
+def popular_marcos(apps, schema_editor):
+    Request = apps.get_model('core', 'Request')
+    pendentes = Request.objects.exclude(status='PENDING').filter(started_at__isnull=True) \
+        .only('id', 'status', 'created_at', 'updated_at').order_by()
+
+    lote = []
+    for requisicao in pendentes.iterator(chunk_size=LOTE):
+        requisicao.started_at = requisicao.updated_at
+        requisicao.wait_seconds = duracao(requisicao.created_at, requisicao.updated_at)
+        if requisicao.status == 'APPROVED':
+            requisicao.finished_at = requisicao.updated_at
+            requisicao.service_seconds = 0
+        lote.append(requisicao)
+        if len(lote) >= LOTE:
+            Request.objects.bulk_update(lote, ['started_at', 'finished_at', 'wait_seconds', 'service_seconds'])
+            lote = []
+    if lote:
+        Request.objects.bulk_update(lote, ['started_at', 'finished_at', 'wait_seconds', 'service_seconds'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_request_status_event_sla'),
+    ]
+
+    operations = [
+        migrations.RunPython(popular_marcos, migrations.RunPython.noop),
+    ]
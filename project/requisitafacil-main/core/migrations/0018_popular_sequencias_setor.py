@@ -0,0 +1,41 @@
+"""
+Cria as linhas de SectorSequence de todos os prefixos de uma vez.
+
+Assim a reserva de códigos não precisa mais criar a linha (e procurar o maior
+código já gravado) durante uma requisição: cada prefixo parte do maior número
+existente nos códigos das requisições.
+"""
+from django.db import migrations
+
+# Valores de SETOR_ABREVIACOES, mais o genérico, na data desta migração
+PREFIXOS = ('F', 'FR', 'PD', 'AC', 'ADM', 'DP', 'LP', 'CM', 'LJ', 'GEN')
+
+
+def popular_sequencias(apps, schema_editor):
+    Request = apps.get_model('core', 'Request')
+    SectorSequence = apps.get_model('core', 'SectorSequence')
+
+    maiores = dict.fromkeys(PREFIXOS, 0)
+    codigos = Request.objects.filter(request_code__contains='-').values_list('request_code', flat=True).order_by()
+    for codigo in codigos.iterator(chunk_size=2000):
+        prefixo, _, numero = codigo.rpartition('-')
+        if prefixo and len(prefixo) <= 10 and numero.isdigit():
+            maiores[prefixo] = max(maiores.get(prefixo, 0), int(numero))
+
+    existentes = dict(SectorSequence.objects.values_list('prefix', 'last_number'))
+    for prefixo, maior in maiores.items():
+        if prefixo not in existentes:
+            SectorSequence.objects.create(prefix=prefixo, last_number=maior)
+        elif existentes[prefixo] < maior:
+            SectorSequence.objects.filter(prefix=prefixo).update(last_number=maior)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_popular_marcos_sla'),
+    ]
+
+    operations = [
+        migrations.RunPython(popular_sequencias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,185 @@
+"""
+Atualização da busca textual por comando, e não por item gravado.
+
+Os triggers de core_requestitem criados na 0013 recalculavam a linha da busca
+da requisição (juntando todos os itens dela) a cada item inserido, alterado ou
+removido: n itens de uma requisição custavam O(n²), e isso em bulk_create, no
+COPY da carga em massa e no bulk_update da finalização.
+
+- PostgreSQL: triggers FOR EACH STATEMENT com tabelas de transição (REFERENCING
+  NEW TABLE / OLD TABLE) recalculam uma vez cada requisição afetada pelo comando;
+- SQLite (sem triggers por comando): os triggers só marcam a requisição em
+  core_busca_pendente, e core/busca.py recalcula as pendentes, de uma vez,
+  antes de cada busca.
+"""
+import importlib
+
+from django.db import migrations
+
+POSTGRES_CRIAR = [
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_trg ON core_requestitem',
+    'DROP FUNCTION IF EXISTS core_busca_item()',
+    """
+    CREATE FUNCTION core_atualizar_buscas(alvos uuid[]) RETURNS void AS $$
+    BEGIN
+        INSERT INTO core_request_busca (request_id, documento, texto)
+        SELECT r.id,
+               setweight(to_tsvector('portuguese', unaccent(coalesce(r.request_code, ''))), 'A') ||
+               setweight(to_tsvector('portuguese', unaccent(coalesce(i.itens, ''))), 'B') ||
+               setweight(to_tsvector('portuguese', unaccent(coalesce(r.observations, ''))), 'C'),
+               unaccent(lower(concat_ws(' ', r.request_code, i.itens, r.observations)))
+        FROM core_request r
+        LEFT JOIN (
+            SELECT request_id, string_agg(concat_ws(' ', item_requested, observacao_item), ' ') AS itens
+            FROM core_requestitem WHERE request_id = ANY(alvos) GROUP BY request_id
+        ) i ON i.request_id = r.id
+        WHERE r.id = ANY(alvos)
+        ON CONFLICT (request_id) DO UPDATE SET documento = EXCLUDED.documento, texto = EXCLUDED.texto;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE FUNCTION core_busca_itens_inseridos() RETURNS trigger AS $$
+    BEGIN
+        PERFORM core_atualizar_buscas(ARRAY(SELECT DISTINCT request_id FROM novos));
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE FUNCTION core_busca_itens_alterados() RETURNS trigger AS $$
+    BEGIN
+        -- Só as requisições cujos itens mudaram em algo que entra na busca
+        PERFORM core_atualizar_buscas(ARRAY(
+            SELECT unnest(ARRAY[o.request_id, n.request_id])
+            FROM antigos o JOIN novos n ON n.id = o.id
+            WHERE n.request_id <> o.request_id
+               OR n.item_requested IS DISTINCT FROM o.item_requested
+               OR n.observacao_item IS DISTINCT FROM o.observacao_item
+        ));
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE FUNCTION core_busca_itens_removidos() RETURNS trigger AS $$
+    BEGIN
+        PERFORM core_atualizar_buscas(ARRAY(SELECT DISTINCT request_id FROM antigos));
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # Tabelas de transição exigem um trigger por evento e, no UPDATE, sem lista de colunas
+    """
+    CREATE TRIGGER core_requestitem_busca_ins_trg
+    AFTER INSERT ON core_requestitem REFERENCING NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION core_busca_itens_inseridos()
+    """,
+    """
+    CREATE TRIGGER core_requestitem_busca_upd_trg
+    AFTER UPDATE ON core_requestitem REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+    FOR EACH STATEMENT EXECUTE FUNCTION core_busca_itens_alterados()
+    """,
+    """
+    CREATE TRIGGER core_requestitem_busca_del_trg
+    AFTER DELETE ON core_requestitem REFERENCING OLD TABLE AS antigos
+    FOR EACH STATEMENT EXECUTE FUNCTION core_busca_itens_removidos()
+    """,
+]
+
+POSTGRES_REMOVER = [
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_del_trg ON core_requestitem',
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_upd_trg ON core_requestitem',
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_ins_trg ON core_requestitem',
+    'DROP FUNCTION IF EXISTS core_busca_itens_removidos()',
+    'DROP FUNCTION IF EXISTS core_busca_itens_alterados()',
+    'DROP FUNCTION IF EXISTS core_busca_itens_inseridos()',
+    'DROP FUNCTION IF EXISTS core_atualizar_buscas(uuid[])',
+]
+
+SQLITE_CRIAR = [
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_ins',
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_upd',
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_del',
+    'CREATE TABLE core_busca_pendente (request_id char(32) PRIMARY KEY) WITHOUT ROWID',
+    """
+    CREATE TRIGGER core_requestitem_busca_ins AFTER INSERT ON core_requestitem BEGIN
+        INSERT OR IGNORE INTO core_busca_pendente (request_id) VALUES (NEW.request_id);
+    END
+    """,
+    """
+    CREATE TRIGGER core_requestitem_busca_upd
+    AFTER UPDATE OF request_id, item_requested, observacao_item ON core_requestitem BEGIN
+        INSERT OR IGNORE INTO core_busca_pendente (request_id) VALUES (OLD.request_id);
+        INSERT OR IGNORE INTO core_busca_pendente (request_id) VALUES (NEW.request_id);
+    END
+    """,
+    """
+    CREATE TRIGGER core_requestitem_busca_del AFTER DELETE ON core_requestitem BEGIN
+        INSERT OR IGNORE INTO core_busca_pendente (request_id) VALUES (OLD.request_id);
+    END
+    """,
+]
+
+SQLITE_REMOVER = [
+    # Antes de voltar aos triggers por item, recalcula as requisições ainda pendentes
+    """
+    INSERT OR REPLACE INTO core_busca_fts (rowid, request_code, observations, itens)
+    SELECT c.id, r.request_code, r.observations,
+           (SELECT group_concat(coalesce(i.item_requested, '') || ' ' || coalesce(i.observacao_item, ''), ' ')
+            FROM core_requestitem i WHERE i.request_id = r.id)
+    FROM core_busca_pendente p
+    JOIN core_request r ON r.id = p.request_id
+    JOIN core_busca_chave c ON c.request_id = r.id
+    """,
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_ins',
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_upd',
+    'DROP TRIGGER IF EXISTS core_requestitem_busca_del',
+    'DROP TABLE IF EXISTS core_busca_pendente',
+]
+
+
+def _busca_textual():
+    return importlib.import_module('core.migrations.0013_busca_textual')
+
+
+def _triggers_da_0013(comandos):
+    # Comandos da 0013 que recriam os triggers por item (e, no PostgreSQL, a função deles)
+    return [sql for sql in comandos
+            if ('TRIGGER' in sql and 'ON core_requestitem' in sql) or 'FUNCTION core_busca_item()' in sql]
+
+
+def _tem_busca(schema_editor):
+    tabela = {'postgresql': 'core_request_busca', 'sqlite': 'core_busca_fts'}.get(schema_editor.connection.vendor)
+    return tabela is not None and tabela in schema_editor.connection.introspection.table_names()
+
+
+def atualizar_por_comando(apps, schema_editor):
+    if not _tem_busca(schema_editor):
+        return
+    comandos = POSTGRES_CRIAR if schema_editor.connection.vendor == 'postgresql' else SQLITE_CRIAR
+    for sql in comandos:
+        schema_editor.execute(sql, params=None)
+
+
+def atualizar_por_item(apps, schema_editor):
+    if not _tem_busca(schema_editor):
+        return
+    anterior = _busca_textual()
+    if schema_editor.connection.vendor == 'postgresql':
+        comandos = POSTGRES_REMOVER + _triggers_da_0013(anterior.POSTGRES_CRIAR)
+    else:
+        comandos = SQLITE_REMOVER + _triggers_da_0013(anterior.SQLITE_CRIAR)
+    for sql in comandos:
+        schema_editor.execute(sql, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_popular_sequencias_setor'),
+    ]
+
+    operations = [
+        migrations.RunPython(atualizar_por_comando, atualizar_por_item),
+    ]
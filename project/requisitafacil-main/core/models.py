@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+import re
+import unicodedata
 import uuid
 
 # Create your models here.
@@ -63,7 +67,120 @@ class RequestStatus(models.TextChoices):
     PENDING = 'PENDING', 'Pendente'
     EM_ATENDIMENTO = 'EM_ATENDIMENTO', 'Em Atendimento'
     APPROVED = 'APPROVED', 'Atendida'
+
+class StatusEventAction(models.TextChoices):
+    CREATED = 'created', 'Criada'
+    CLAIMED = 'claimed', 'Atendimento iniciado'
+    FINALIZED = 'finalized', 'Finalizada'
+    CHANGED = 'changed', 'Status alterado'
+
+def acao_da_transicao(status_anterior, status_novo):
+    if status_anterior is None:
+        return StatusEventAction.CREATED
+    if status_novo == RequestStatus.APPROVED:
+        return StatusEventAction.FINALIZED
+    if status_anterior == RequestStatus.PENDING and status_novo == RequestStatus.EM_ATENDIMENTO:
+        return StatusEventAction.CLAIMED
+    return StatusEventAction.CHANGED
+
+def duracao_em_segundos(inicio, fim):
+    if inicio is None or fim is None:
+        return None
+    return max(0, int((fim - inicio).total_seconds()))
     
+# Mapeamento de setores para abreviações usadas no código da requisição
+SETOR_ABREVIACOES = {
+    "FLV": "F",
+    "Frios": "FR",
+    "Padaria": "PD",
+    "Açougue": "AC",
+    "ADM": "ADM",
+    "Deposito": "DP",
+    "Limpeza": "LP",
+    "Comercial": "CM",
+    "Loja": "LJ",
+}
+
+def abreviacao_setor(sector):
+    return SETOR_ABREVIACOES.get(sector.name, "GEN") # GEN para genérico se não mapeado
+
+class SectorSequence(models.Model):
+    """
+    Contador por prefixo de setor usado para gerar os códigos das requisições.
+    Cada reserva incrementa o contador com um UPDATE atômico, então duas
+    requisições simultâneas nunca recebem o mesmo número.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    prefix = models.CharField(max_length=10, unique=True, verbose_name="Prefixo")
+    last_number = models.PositiveBigIntegerField(default=0, verbose_name="Último Número")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Sequência de Setor'
+        verbose_name_plural = 'Sequências de Setor'
+        ordering = ['prefix']
+
+    def __str__(self):
+        return f'{self.prefix}-{self.last_number}'
+
+    @classmethod
+    def reserve(cls, prefix, count=1):
+        """Reserva `count` números consecutivos para o prefixo e retorna o range reservado."""
+        if count < 1:
+            raise ValueError('count deve ser maior que zero')
+        last_number = cls._incrementar(prefix, count)
+        if last_number is None:
+            # Prefixo ainda sem linha (a migração 0018 cria as dos prefixos conhecidos)
+            with transaction.atomic():
+                cls.objects.get_or_create(prefix=prefix, defaults={'last_number': cls._maior_numero_existente(prefix)})
+                last_number = cls._incrementar(prefix, count)
+        return range(last_number - count + 1, last_number + 1)
+
+    @classmethod
+    def _incrementar(cls, prefix, count):
+        """Soma `count` ao contador e devolve o novo valor, ou None se o prefixo não tem linha."""
+        if not _update_returning_suportado():
+            with transaction.atomic():
+                # O UPDATE trava a linha até o commit, serializando reservas concorrentes
+                if not cls.objects.filter(prefix=prefix).update(last_number=F('last_number') + count):
+                    return None
+                return cls.objects.filter(prefix=prefix).values_list('last_number', flat=True).get()
+        # Uma única ida ao banco: o UPDATE trava a linha e devolve o valor já incrementado
+        sql = (
+            f'UPDATE {connection.ops.quote_name(cls._meta.db_table)} '
+            'SET last_number = last_number + %s, updated_at = %s WHERE prefix = %s RETURNING last_number'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [count, connection.ops.adapt_datetimefield_value(timezone.now()), prefix])
+            linha = cursor.fetchone()
+        return linha[0] if linha else None
+
+    @staticmethod
+    def _maior_numero_existente(prefix):
+        # Executado uma única vez por prefixo, para continuar a numeração de códigos já existentes
+        maior = 0
+        codigos = Request.objects.filter(request_code__startswith=f'{prefix}-').values_list('request_code', flat=True)
+        for codigo in codigos.iterator():
+            try:
+                maior = max(maior, int(codigo.split('-')[-1]))
+            except (ValueError, IndexError):
+                continue
+        return maior
+
+def _update_returning_suportado():
+    # PostgreSQL e SQLite a partir da 3.35 aceitam UPDATE ... RETURNING
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35, 0)
+
+def reservar_codigos(sector, quantidade=1):
+    """Retorna `quantidade` códigos de requisição novos para o setor, alocados em uma única ida ao banco."""
+    abreviacao = abreviacao_setor(sector)
+    return [f'{abreviacao}-{numero}' for numero in SectorSequence.reserve(abreviacao, quantidade)]
+
+# Marcos e durações do atendimento, recalculados em Request.save()
+CAMPOS_SLA = ('started_at', 'finished_at', 'wait_seconds', 'service_seconds')
+
 class Request(models.Model):
     id = models.UUIDField(primary_key=True, default = uuid.uuid4, editable=False)
     
@@ -109,48 +226,168 @@ class Request(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Data da Requisição")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Ultima Atualização")
 
+    # Marcos do atendimento e durações (SLA), preenchidos a cada troca de status.
+    # wait_seconds: da criação ao início do atendimento; service_seconds: do início à finalização
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Início do Atendimento")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Fim do Atendimento")
+    wait_seconds = models.PositiveIntegerField(null=True, blank=True, verbose_name="Espera (s)")
+    service_seconds = models.PositiveIntegerField(null=True, blank=True, verbose_name="Atendimento (s)")
+
     class Meta:
         verbose_name = 'Requisição'
         verbose_name_plural = 'Requisições'
         ordering = ['-created_at']
+        indexes = [
+            # Paginação por cursor da listagem, com e sem os filtros mais usados
+            models.Index(fields=['-created_at', '-id'], name='request_created_id_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='request_status_created_idx'),
+            models.Index(fields=['requester', '-created_at', '-id'], name='request_requester_created_idx'),
+            # Cards e alertas dos dashboards
+            models.Index(fields=['status', 'urgency'], name='request_status_urgency_idx'),
+            models.Index(fields=['requester', 'status'], name='request_requester_status_idx'),
+            models.Index(fields=['status', 'updated_at'], name='request_status_updated_idx'),
+            models.Index(fields=['sector', 'created_at'], name='request_sector_created_idx'),
+            # Sincronização incremental da API (updated_since + cursor)
+            models.Index(fields=['updated_at', 'id'], name='request_updated_id_idx'),
+            # Fila de atendimento (core/fila.py): pendentes por urgência e idade, geral e por setor
+            models.Index(
+                fields=['-urgency', 'created_at', 'id'],
+                name='request_fila_idx',
+                condition=models.Q(status=RequestStatus.PENDING),
+            ),
+            models.Index(
+                fields=['sector', '-urgency', 'created_at', 'id'],
+                name='request_fila_setor_idx',
+                condition=models.Q(status=RequestStatus.PENDING),
+            ),
+            # SLA do painel do gestor: finalizadas por período, com as durações no próprio índice
+            models.Index(fields=['finished_at', 'wait_seconds', 'service_seconds'], name='request_sla_idx'),
+            # Tabela de requisições ativas: índice parcial, só com PENDING e EM_ATENDIMENTO
+            models.Index(
+                fields=['-updated_at'],
+                name='request_active_updated_idx',
+                condition=models.Q(status__in=[RequestStatus.PENDING, RequestStatus.EM_ATENDIMENTO]),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.request_code or self.id} - {self.requester.get_full_name() or self.requester.username}'
 
+    def atualizar_marcos(self, agora=None):
+        """Preenche started_at/finished_at de acordo com o status e recalcula as durações."""
+        agora = agora or timezone.now()
+        if self.status == RequestStatus.PENDING:
+            self.started_at = self.finished_at = None
+        else:
+            self.started_at = self.started_at or agora
+            if self.status == RequestStatus.APPROVED:
+                self.finished_at = self.finished_at or agora
+            else:
+                self.finished_at = None
+        self.wait_seconds = duracao_em_segundos(self.created_at or agora, self.started_at)
+        self.service_seconds = duracao_em_segundos(self.started_at, self.finished_at)
+
     def save(self, *args, **kwargs):
+        alterados = []
         if not self.request_code and self.sector:
-            # Mapeamento de setores para abreviações
-            setor_abreviacoes = {
-                "FLV": "F",
-                "Frios": "FR",
-                "Padaria": "PD",
-                "Açougue": "AC",
-                "ADM": "ADM",
-                "Deposito": "DP",
-                "Limpeza": "LP",
-                "Comercial": "CM",
-                "Loja": "LJ",
-            }
-            abreviacao = setor_abreviacoes.get(self.sector.name, "GEN") # GEN para genérico se não mapeado
-            
-            # Encontra o próximo número sequencial para o setor
-            last_request = Request.objects.filter(request_code__startswith=abreviacao).order_by('-created_at').first()
-            if last_request and last_request.request_code:
-                try:
-                    last_number = int(last_request.request_code.split('-')[-1])
-                    next_number = last_number + 1
-                except (ValueError, IndexError):
-                    next_number = 1
-            else:
-                next_number = 1
-            
-            self.request_code = f'{abreviacao}-{next_number}'
+            self.request_code = reservar_codigos(self.sector)[0]
+            alterados.append('request_code')
+
+        antes = [getattr(self, campo) for campo in CAMPOS_SLA]
+        self.atualizar_marcos()
+        alterados += [campo for campo, valor in zip(CAMPOS_SLA, antes) if getattr(self, campo) != valor]
+        # save(update_fields=[...]) gravaria só os campos pedidos e perderia os calculados aqui
+        if kwargs.get('update_fields') is not None and alterados:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *alterados}
+        super().save(*args, **kwargs)
+
+def normalizar_nome_item(nome):
+    """
+    Forma canônica do nome de um item, usada para agrupar variações do mesmo texto:
+    sem acentos, minúsculas, sem pontuação e com espaços simples.
+    "Papel A4", "papel a4" e "PAPEL A-4" viram todos "papel a4".
+    """
+    texto = unicodedata.normalize('NFKD', nome or '').encode('ascii', 'ignore').decode().lower()
+    # Hífen, ponto e barra entre letras/números juntam as partes ("a-4" -> "a4"); o resto separa palavras
+    texto = re.sub(r'(?<=[a-z0-9])[-./](?=[a-z0-9])', '', texto)
+    return ' '.join(re.findall(r'[a-z0-9]+', texto))
+
+class Item(models.Model):
+    """Item do catálogo. Cada RequestItem pode apontar para o item do catálogo que descreve."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255, verbose_name="Nome")
+    normalized_name = models.CharField(max_length=255, unique=True, editable=False, verbose_name="Nome Normalizado")
+    category = models.CharField(max_length=50, choices=ItemCategory.choices, blank=True, default='', verbose_name="Categoria")
+    is_active = models.BooleanField(default=True, verbose_name="Ativo")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Item do Catálogo'
+        verbose_name_plural = 'Itens do Catálogo'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalizar_nome_item(self.name)
+        super().save(*args, **kwargs)
+
+class RequestStatusEvent(models.Model):
+    """
+    Histórico das trocas de status de uma requisição (criação, início e fim do
+    atendimento). Só recebe inserções: um evento gravado nunca é alterado.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='status_events', verbose_name="Requisição")
+    action = models.CharField(max_length=15, choices=StatusEventAction.choices, verbose_name="Ação")
+    from_status = models.CharField(max_length=15, choices=RequestStatus.choices, blank=True, default='', verbose_name="Status Anterior")
+    to_status = models.CharField(max_length=15, choices=RequestStatus.choices, verbose_name="Novo Status")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='status_events',
+        verbose_name="Usuário", null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Data")
+
+    class Meta:
+        verbose_name = 'Evento de Status'
+        verbose_name_plural = 'Eventos de Status'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['request', 'created_at'], name='status_event_request_idx'),
+        ]
 
+    def __str__(self):
+        return f'{self.get_action_display()}: {self.from_status or "-"} -> {self.to_status}'
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Eventos de status não podem ser alterados')
         super().save(*args, **kwargs)
 
+    @classmethod
+    def registrar(cls, requisicao, status_anterior, usuario=None, momento=None):
+        """Grava a troca de status_anterior (None na criação) para o status atual da requisição."""
+        acao = acao_da_transicao(status_anterior, requisicao.status)
+        if usuario is None:
+            usuario_id = requisicao.requester_id if acao == StatusEventAction.CREATED else requisicao.atendido_por_id
+        else:
+            usuario_id = usuario.pk
+        if momento is None:
+            momento = {
+                StatusEventAction.CREATED: requisicao.created_at,
+                StatusEventAction.CLAIMED: requisicao.started_at,
+                StatusEventAction.FINALIZED: requisicao.finished_at,
+            }.get(acao) or timezone.now()
+        return cls.objects.create(
+            request=requisicao, action=acao, from_status=status_anterior or '',
+            to_status=requisicao.status, user_id=usuario_id, created_at=momento,
+        )
+
 class RequestItem(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     request = models.ForeignKey(Request, on_delete=models.CASCADE, related_name='items', verbose_name="Requisição")
+    item = models.ForeignKey(Item, on_delete=models.SET_NULL, related_name='request_items',
+        verbose_name="Item do Catálogo", null=True, blank=True)
     item_requested = models.CharField(max_length=255, verbose_name="Item Solicitado")
     quantify = models.PositiveIntegerField(verbose_name="Quantidade")
     category = models.CharField(
@@ -167,6 +404,39 @@ class RequestItem(models.Model):
         verbose_name = 'Item da Requisição'
         verbose_name_plural = 'Itens da Requisição'
         ordering = ['created_at']
+        indexes = [
+            # Primeiro item de cada requisição nas listagens
+            models.Index(fields=['request', 'created_at'], name='item_request_created_idx'),
+            models.Index(fields=['created_at', 'category'], name='item_created_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_requested} ({self.quantify}) - Req: {self.request.request_code or self.request.id}"
+class DailyRequestStats(models.Model):
+    """
+    Consolidado diário de requisições e itens por setor, status, urgência e categoria.
+    Linhas com categoria vazia contam requisições; as demais contam itens daquela categoria.
+    Mantido incrementalmente pelos sinais em core/signals.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    date = models.DateField(verbose_name="Data")
+    sector = models.ForeignKey(Sector, on_delete=models.CASCADE, related_name='daily_stats', verbose_name="Setor")
+    status = models.CharField(max_length=15, choices=RequestStatus.choices, verbose_name="Status")
+    urgency = models.CharField(max_length=10, choices=Urgency.choices, verbose_name="Urgência")
+    category = models.CharField(max_length=50, choices=ItemCategory.choices, blank=True, default='', verbose_name="Categoria")
+    request_count = models.IntegerField(default=0, verbose_name="Requisições")
+    item_count = models.IntegerField(default=0, verbose_name="Itens")
+
+    class Meta:
+        verbose_name = 'Estatística Diária'
+        verbose_name_plural = 'Estatísticas Diárias'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'sector', 'status', 'urgency', 'category'],
+                name='unique_daily_request_stats',
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.item_requested} ({self.quantify}) - Req: {self.request.request_code or self.request.id}"
\ No newline at end of file
+        return f'{self.date} {self.sector_id} {self.status} {self.urgency} {self.category or "-"}'
@@ -0,0 +1,171 @@
+"""
+Métricas por view no formato do Prometheus, expostas em /metrics.
+
+- MetricasMiddleware mede cada requisição: contagem por view/método/status,
+  histograma de latência, consultas e tempo no banco (via execute_wrapper) e
+  tempo de renderização de templates. Em respostas em streaming (exportação)
+  as consultas acontecem enquanto o corpo é enviado, então a medição só termina
+  quando o corpo é fechado;
+- DjangoTemplatesMedidos é o backend de templates que cronometra cada render;
+- a view `metricas` exporta tudo, protegida por token (METRICS_TOKEN, enviado
+  como "Authorization: Bearer <token>") ou para superusuários logados.
+
+O agrupamento é pelo nome da URL (ex.: core:listar_requisicoes), nunca pelo
+caminho, para que ids na URL não multipliquem as séries.
+"""
+import hmac
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.views.decorators.cache import never_cache
+
+from metricas_prometheus import CONTENT_TYPE, Registro
+
+registro = Registro()
+registro.contador('django_http_requests_total', 'Requisições HTTP atendidas, por view, método e status')
+registro.histograma('django_http_request_duration_seconds', 'Latência das requisições HTTP, por view')
+registro.contador('django_db_queries_total', 'Consultas ao banco, por view')
+registro.contador('django_db_duration_seconds_total', 'Tempo gasto em consultas ao banco, por view')
+registro.contador('django_template_render_seconds_total', 'Tempo gasto renderizando templates, por view')
+
+SEM_ROTA = '<sem_rota>'
+
+
+class Medicao:
+    __slots__ = ('consultas', 'tempo_db', 'tempo_template')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.tempo_template = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: conta e cronometra cada consulta da requisição
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.tempo_db += time.perf_counter() - inicio
+
+
+_medicao_atual = ContextVar('medicao_atual', default=None)
+
+
+def _medindo_consultas(medicao):
+    pilha = ExitStack()
+    for conexao in connections.all():
+        pilha.enter_context(conexao.execute_wrapper(medicao))
+    return pilha
+
+
+def _registrar(request, medicao, inicio, status):
+    duracao = time.perf_counter() - inicio
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else SEM_ROTA
+    registro.incrementar('django_http_requests_total', view=view, method=request.method, status=str(status))
+    registro.observar('django_http_request_duration_seconds', duracao, view=view)
+    if medicao.consultas:
+        registro.incrementar('django_db_queries_total', medicao.consultas, view=view)
+        registro.incrementar('django_db_duration_seconds_total', medicao.tempo_db, view=view)
+    if medicao.tempo_template:
+        registro.incrementar('django_template_render_seconds_total', medicao.tempo_template, view=view)
+
+
+class CorpoMedido:
+    """
+    Corpo de uma resposta em streaming que continua medindo as consultas a cada
+    pedaço gerado e registra a requisição quando é fechado (o servidor WSGI chama
+    close() ao terminar de enviar, tendo o corpo sido lido até o fim ou não).
+    """
+
+    def __init__(self, conteudo, medicao, ao_fechar):
+        self._iterador = iter(conteudo)
+        self._medicao = medicao
+        self._ao_fechar = ao_fechar
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with _medindo_consultas(self._medicao):
+            return next(self._iterador)
+
+    def close(self):
+        ao_fechar, self._ao_fechar = self._ao_fechar, None
+        if ao_fechar is not None:
+            ao_fechar()
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        status = 500
+        response = None
+        try:
+            with _medindo_consultas(medicao):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            _medicao_atual.reset(token)
+            if response is not None and response.streaming and not response.is_async:
+                # O registro fica para quando o corpo terminar de ser enviado
+                response.streaming_content = CorpoMedido(
+                    response.streaming_content, medicao, lambda: _registrar(request, medicao, inicio, status),
+                )
+            else:
+                _registrar(request, medicao, inicio, status)
+
+
+class TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        medicao = _medicao_atual.get()
+        if medicao is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicao.tempo_template += time.perf_counter() - inicio
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    """Backend DjangoTemplates que soma o tempo de cada render na medição da requisição atual."""
+
+    def from_string(self, template_code):
+        return TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TemplateMedido(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _autorizado(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    cabecalho = request.headers.get('Authorization', '')
+    if token and cabecalho.startswith('Bearer ') and hmac.compare_digest(cabecalho[7:].encode(), token.encode()):
+        return True
+    return request.user.is_authenticated and request.user.is_superuser
+
+
+@never_cache
+def metricas(request):
+    if not _autorizado(request):
+        response = HttpResponse('Não autorizado\n', status=401, content_type='text/plain; charset=utf-8')
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+    return HttpResponse(registro.exportar(), content_type=CONTENT_TYPE)
@@ -0,0 +1,225 @@
+"""
+Envio das notificações de tempo real para o servidor FastAPI (realtime_server.py).
+
+As views chamam `notificar(evento)`; o evento só entra na fila depois do commit
+da transação (assim nenhum cliente é avisado de dados não gravados) e é entregue
+por uma thread em segundo plano. A thread agrupa os eventos que chegam juntos em
+um único POST, descarta duplicados do mesmo lote e usa uma sessão HTTP com pool
+de conexões e timeouts curtos: se o servidor de tempo real estiver lento ou fora
+do ar, o worker do Django não fica esperando.
+
+Os eventos são dicionários JSON versionados (campo "v") com os dados da
+requisição afetada e a variação dos contadores dos cards; o navegador aplica
+a mudança na linha da tabela e nos cards sem recarregar a página. Como uma
+variação perdida deixaria o card errado, o navegador relê os valores absolutos
+dos cards ao reconectar e quando o servidor avisa que descartou mensagens
+(evento "resync", ver realtime_fanout.py).
+
+Cada evento leva os tópicos a que pertence (all, user:<id>, role:Almoxarife);
+o servidor de tempo real entrega o evento só às conexões que assinaram algum
+deles. Os tópicos de cada conexão vêm do token assinado gerado por
+`token_realtime` a partir do usuário logado. O POST ao /notify é assinado com o
+mesmo segredo (cabeçalhos de realtime_token.cabecalhos_notificacao), e o servidor
+recusa notificações sem assinatura válida.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from realtime_token import cabecalhos_notificacao, gerar_token
+
+from .models import RequestStatus, Role, Urgency
+
+logger = logging.getLogger(__name__)
+
+
+VERSAO_EVENTOS = 1
+
+
+def variacao_contadores(status_anterior, status_novo, urgente=False, no_mes=True):
+    """
+    Variação dos contadores dos cards (mesmos nomes do contexto dos dashboards)
+    causada por uma mudança de status. None representa requisição inexistente,
+    ou seja, criação (status_anterior) ou exclusão (status_novo).
+    """
+    def conta(alvo):
+        return (status_novo == alvo) - (status_anterior == alvo)
+
+    contadores = {
+        'pendentes': conta(RequestStatus.PENDING),
+        'em_atendimento': conta(RequestStatus.EM_ATENDIMENTO),
+        'aprovadas_hoje': conta(RequestStatus.APPROVED),
+        'total_mes': ((status_anterior is None) - (status_novo is None)) if no_mes else 0,
+    }
+    if urgente:
+        contadores['urgentes_pendentes'] = contadores['pendentes']
+    return {nome: valor for nome, valor in contadores.items() if valor}
+
+
+def topicos_do_usuario(user):
+    """Tópicos que o usuário pode assinar, seguindo as regras de visibilidade das listagens."""
+    if user.role == Role.Gestor:
+        return ['all']
+    if user.role == Role.Almoxarife:
+        return [f'role:{Role.Almoxarife}']
+    # Encarregado vê apenas as próprias requisições
+    return [f'user:{user.pk}']
+
+
+def topicos_da_requisicao(requisicao):
+    # Só tópicos que topicos_do_usuario concede a alguém
+    return ['all', f'role:{Role.Almoxarife}', f'user:{requisicao.requester_id}']
+
+
+def token_realtime(user):
+    return gerar_token(
+        settings.REALTIME_TOKEN_SECRET, user.pk, topicos_do_usuario(user),
+        validade=settings.REALTIME_TOKEN_VALIDADE,
+    )
+
+
+def evento_requisicao(action, requisicao, status_anterior=None, excluida=False):
+    """Monta o evento de tempo real de uma requisição criada, alterada ou excluída."""
+    criada_em = timezone.localtime(requisicao.created_at)
+    return {
+        'v': VERSAO_EVENTOS,
+        'action': action,
+        'request_id': str(requisicao.pk),
+        'request_code': requisicao.request_code,
+        'sector_id': str(requisicao.sector_id) if requisicao.sector_id else None,
+        'sector': requisicao.sector.name if requisicao.sector_id else '',
+        'requester_id': str(requisicao.requester_id),
+        'requester': requisicao.requester.get_full_name() or requisicao.requester.username,
+        'status': None if excluida else requisicao.status,
+        'status_display': '' if excluida else requisicao.get_status_display(),
+        'urgency': requisicao.urgency,
+        'urgency_display': requisicao.get_urgency_display(),
+        'observations': requisicao.observations or '',
+        'atendido_por': requisicao.atendido_por.username if requisicao.atendido_por_id else None,
+        'created_at': criada_em.isoformat(),
+        'updated_at': timezone.localtime(requisicao.updated_at).isoformat(),
+        'counters': variacao_contadores(
+            status_anterior,
+            None if excluida else requisicao.status,
+            urgente=requisicao.urgency == Urgency.URGENTE,
+            no_mes=criada_em.date().replace(day=1) == timezone.localdate().replace(day=1),
+        ),
+        'topics': topicos_da_requisicao(requisicao),
+    }
+
+
+def coalescer(eventos):
+    """
+    Remove eventos repetidos do lote, mantendo a última versão de cada um na ordem de chegada.
+    As variações dos contadores dos eventos descartados são somadas na versão mantida,
+    para os cards não perderem nenhuma mudança.
+    """
+    unicos = {}
+    for evento in eventos:
+        chave = (evento.get('action'), evento.get('request_id'))
+        anterior = unicos.pop(chave, None)
+        if anterior is not None and (anterior.get('counters') or evento.get('counters')):
+            contadores = dict(anterior.get('counters') or {})
+            for nome, variacao in (evento.get('counters') or {}).items():
+                contadores[nome] = contadores.get(nome, 0) + variacao
+            evento = {**evento, 'counters': {nome: valor for nome, valor in contadores.items() if valor}}
+        unicos[chave] = evento
+    return list(unicos.values())
+
+
+class NotificationDispatcher:
+    def __init__(self, url, segredo, max_fila=1000, max_lote=50, janela=0.05, timeout=(0.5, 2)):
+        self.url = url
+        self.segredo = segredo
+        self.max_lote = max_lote
+        self.janela = janela
+        self.timeout = timeout
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._session = None
+
+    def enfileirar(self, evento):
+        self._garantir_thread()
+        try:
+            self._fila.put_nowait(evento)
+        except queue.Full:
+            logger.warning('Fila de notificações cheia, evento descartado: %s', evento.get('action'))
+
+    def _garantir_thread(self):
+        # O pid é conferido porque o Gunicorn pode fazer fork depois da thread criada
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Conexões herdadas do processo pai não são reaproveitadas
+                self._session = None
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name='realtime-notifications', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            self.enviar(self._proximo_lote())
+
+    def _proximo_lote(self):
+        lote = [self._fila.get()]
+        prazo = time.monotonic() + self.janela
+        while len(lote) < self.max_lote:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    @property
+    def session(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def enviar(self, eventos):
+        eventos = coalescer(eventos)
+        corpo = json.dumps({'events': eventos}).encode()
+        cabecalhos = {'Content-Type': 'application/json', **cabecalhos_notificacao(self.segredo, corpo)}
+        try:
+            response = self.session.post(self.url, data=corpo, headers=cabecalhos, timeout=self.timeout)
+            logger.info('Notificação enviada (%s eventos): %s', len(eventos), response.status_code)
+        except requests.RequestException as e:
+            logger.warning('Erro ao enviar notificação: %s', e)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher(settings.REALTIME_NOTIFY_URL, settings.REALTIME_TOKEN_SECRET)
+    return _dispatcher
+
+
+def notificar(evento):
+    """Agenda o envio do evento para depois do commit da transação atual."""
+    transaction.on_commit(lambda: get_dispatcher().enfileirar(evento))
@@ -0,0 +1,87 @@
+"""
+Paginação por cursor (keyset) sobre (created_at, id).
+
+Em vez de OFFSET, cada página continua a partir da última linha da página
+anterior com `WHERE (created_at, id) < (cursor)`, então páginas profundas
+custam o mesmo que a primeira quando há índice na ordenação.
+"""
+import base64
+import binascii
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+
+TAMANHO_PAGINA = 50
+
+
+def codificar_posicao(momento, pk):
+    bruto = f'{momento.isoformat()}|{pk.hex}'
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def codificar_cursor(obj):
+    return codificar_posicao(obj.created_at, obj.pk)
+
+
+def decodificar_cursor(cursor):
+    """
+    Retorna (momento, id) do cursor, ou None se o cursor for inválido. O momento é o
+    created_at nos cursores da paginação e o updated_at nos de sincronização
+    incremental da API (ver api.py); quem decodifica sabe qual dos dois pediu.
+    """
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = bruto.split('|')
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+class PaginaCursor:
+    def __init__(self, itens, cursor_proximo=None, cursor_anterior=None):
+        self.itens = itens
+        self.cursor_proximo = cursor_proximo
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def __bool__(self):
+        return bool(self.itens)
+
+
+def paginar_por_cursor(queryset, depois=None, antes=None, tamanho=TAMANHO_PAGINA):
+    """
+    Pagina o queryset do mais recente para o mais antigo.
+    `depois` avança para linhas mais antigas que o cursor; `antes` volta para as mais recentes.
+    """
+    posicao_depois = decodificar_cursor(depois) if depois else None
+    posicao_antes = decodificar_cursor(antes) if antes and not posicao_depois else None
+
+    if posicao_antes:
+        created_at, pk = posicao_antes
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+        linhas = list(queryset.order_by('created_at', 'id')[:tamanho + 1])
+        tem_mais = len(linhas) > tamanho
+        itens = linhas[:tamanho][::-1]
+        return PaginaCursor(
+            itens,
+            cursor_proximo=codificar_cursor(itens[-1]) if itens else None,
+            cursor_anterior=codificar_cursor(itens[0]) if tem_mais else None,
+        )
+
+    if posicao_depois:
+        created_at, pk = posicao_depois
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    linhas = list(queryset.order_by('-created_at', '-id')[:tamanho + 1])
+    tem_mais = len(linhas) > tamanho
+    itens = linhas[:tamanho]
+    return PaginaCursor(
+        itens,
+        cursor_proximo=codificar_cursor(itens[-1]) if tem_mais else None,
+        cursor_anterior=codificar_cursor(itens[0]) if posicao_depois and itens else None,
+    )
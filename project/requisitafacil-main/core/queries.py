@@ -0,0 +1,95 @@
+"""
+Consultas compartilhadas pelas views.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Request, RequestItem, RequestStatus, Role, Urgency
+
+
+def requisicoes_para_listagem(queryset=None):
+    """
+    Aplica em um queryset de Request tudo o que as tabelas de requisições usam,
+    para que cada linha renderizada não dispare consultas extras:
+    requisitante, setor e atendente via JOIN, e `first_item`/`item_count` via subconsulta.
+    """
+    if queryset is None:
+        queryset = Request.objects.all()
+    itens = RequestItem.objects.filter(request=OuterRef('pk'))
+    return queryset.select_related('requester', 'sector', 'atendido_por').annotate(
+        first_item=Subquery(itens.order_by('created_at').values('item_requested')[:1]),
+        item_count=Coalesce(
+            Subquery(itens.order_by().values('request').annotate(total=Count('id')).values('total')),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+    )
+
+
+def requisicoes_visiveis(user, queryset=None):
+    """Requisições que o usuário pode ver: Gestor e Almoxarife veem todas; os demais, só as próprias."""
+    if queryset is None:
+        queryset = Request.objects.all()
+    if user.role in (Role.Gestor, Role.Almoxarife):
+        return queryset
+    return queryset.filter(requester=user)
+
+
+def filtrar_requisicoes(queryset, params):
+    """
+    Aplica os filtros da listagem (status, urgency e data) vindos de `params`
+    (request.GET). Valores inválidos são ignorados.
+    """
+    status = params.get('status')
+    if status and status in RequestStatus.values:
+        queryset = queryset.filter(status=status)
+
+    urgency = params.get('urgency')
+    if urgency and urgency in Urgency.values:
+        queryset = queryset.filter(urgency=urgency)
+
+    data = params.get('data')
+    if data:
+        try:
+            queryset = queryset.filter(no_dia('created_at', date.fromisoformat(data)))
+        except ValueError:
+            pass
+    return queryset
+
+
+# --- Filtros de data "sargáveis" ---
+# Lookups como created_at__date=hoje ou created_at__month=... envolvem a coluna em
+# uma função de conversão de fuso, o que impede o uso de índices B-tree. Aqui as
+# datas locais (America/Sao_Paulo) viram intervalos [início, fim) sobre a coluna.
+
+def inicio_do_dia(dia):
+    """Primeiro instante do dia local `dia`, como datetime com fuso."""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def intervalo_do_dia(dia):
+    return inicio_do_dia(dia), inicio_do_dia(dia + timedelta(days=1))
+
+
+def intervalo_do_mes(dia):
+    primeiro = dia.replace(day=1)
+    proximo = (primeiro + timedelta(days=32)).replace(day=1)
+    return inicio_do_dia(primeiro), inicio_do_dia(proximo)
+
+
+def no_intervalo(campo, inicio, fim):
+    return Q(**{f'{campo}__gte': inicio, f'{campo}__lt': fim})
+
+
+def no_dia(campo, dia):
+    """Equivalente sargável a `campo__date=dia`."""
+    return no_intervalo(campo, *intervalo_do_dia(dia))
+
+
+def no_mes(campo, dia):
+    """Equivalente sargável a `campo__month=dia.month, campo__year=dia.year`."""
+    return no_intervalo(campo, *intervalo_do_mes(dia))
+
@@ -0,0 +1,126 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import catalogo, daily_stats, dashboard_cache
+from .models import Item, Request, RequestItem, RequestStatusEvent
+
+def _chave_da_requisicao_do_item(item):
+    if RequestItem.request.is_cached(item):
+        return daily_stats.chave_requisicao(item.request)
+    return _chave_por_id(item.request_id)
+
+
+def _chave_por_id(request_id):
+    requisicao = Request.objects.filter(pk=request_id).only('created_at', 'sector', 'status', 'urgency').first()
+    return daily_stats.chave_requisicao(requisicao) if requisicao else None
+
+
+# --- Consolidado diário: requisições ---
+
+@receiver(post_init, sender=Request)
+def guardar_chave_requisicao(sender, instance, **kwargs):
+    # Estado carregado do banco, usado para saber de qual linha do consolidado descontar
+    instance._chave_estatistica = daily_stats.chave_requisicao(instance)
+
+
+@receiver(pre_save, sender=Request)
+def carregar_chave_requisicao(sender, instance, **kwargs):
+    # Instâncias carregadas com campos adiados não têm a chave completa em memória
+    if instance._chave_estatistica is None and not instance._state.adding:
+        instance._chave_estatistica = _chave_por_id(instance.pk)
+
+
+@receiver(post_save, sender=Request)
+def atualizar_estatistica_requisicao(sender, instance, created, **kwargs):
+    chave_nova = daily_stats.chave_requisicao(instance)
+    chave_antiga = None if created else instance._chave_estatistica
+    daily_stats.mover_requisicao(chave_antiga, chave_nova, instance.pk)
+    instance._chave_estatistica = chave_nova
+
+
+@receiver(pre_delete, sender=Request)
+def descontar_itens_da_requisicao(sender, instance, **kwargs):
+    # Desconta os itens de uma vez, em vez de um UPDATE por item apagado em cascata
+    if instance._chave_estatistica is None:
+        instance._chave_estatistica = _chave_por_id(instance.pk)
+    daily_stats.mover_itens(instance._chave_estatistica, None, instance.pk)
+
+
+@receiver(post_delete, sender=Request)
+def descontar_requisicao(sender, instance, **kwargs):
+    daily_stats.ajustar(instance._chave_estatistica, requests=-1)
+
+
+# --- Consolidado diário: itens ---
+
+@receiver(post_init, sender=RequestItem)
+def guardar_chave_item(sender, instance, **kwargs):
+    instance._chave_estatistica = (instance.__dict__.get('request_id'), instance.__dict__.get('category'))
+
+
+@receiver(post_save, sender=RequestItem)
+def atualizar_estatistica_item(sender, instance, created, **kwargs):
+    nova = (instance.request_id, instance.category)
+    if not created:
+        if instance._chave_estatistica == nova:
+            return
+        request_id, categoria = instance._chave_estatistica
+        daily_stats.ajustar(_chave_por_id(request_id), categoria, items=-1)
+    daily_stats.ajustar(_chave_da_requisicao_do_item(instance), instance.category, items=1)
+    instance._chave_estatistica = nova
+
+
+@receiver(post_delete, sender=RequestItem)
+def descontar_item(sender, instance, origin=None, **kwargs):
+    # Apagado em cascata com a requisição: já descontado em descontar_itens_da_requisicao
+    if isinstance(origin, Request) or getattr(origin, 'model', None) is Request:
+        return
+    request_id, categoria = instance._chave_estatistica
+    daily_stats.ajustar(_chave_por_id(request_id), categoria, items=-1)
+
+
+# --- Histórico de status ---
+
+@receiver(post_init, sender=Request)
+def guardar_status_registrado(sender, instance, **kwargs):
+    # Status carregado do banco (em instâncias novas não é usado: a gravação é uma criação)
+    instance._status_registrado = instance.__dict__.get('status')
+
+
+@receiver(pre_save, sender=Request)
+def carregar_status_registrado(sender, instance, **kwargs):
+    if instance._status_registrado is None and not instance._state.adding:
+        instance._status_registrado = Request.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Request)
+def registrar_troca_de_status(sender, instance, created, **kwargs):
+    anterior = None if created else instance._status_registrado
+    if created or anterior != instance.status:
+        RequestStatusEvent.registrar(instance, anterior, usuario=getattr(instance, '_usuario_transicao', None))
+    instance._status_registrado = instance.status
+
+
+# --- Cache dos dashboards ---
+
+@receiver(post_save, sender=Request)
+@receiver(post_delete, sender=Request)
+@receiver(post_save, sender=RequestItem)
+@receiver(post_delete, sender=RequestItem)
+def invalidar_cache_dashboards(sender, **kwargs):
+    dashboard_cache.invalidar_apos_commit()
+
+
+# --- Catálogo de itens ---
+
+@receiver(pre_save, sender=RequestItem)
+def vincular_item_do_catalogo(sender, instance, **kwargs):
+    # Itens novos apontam para o item do catálogo de mesmo nome normalizado, se houver
+    if instance._state.adding and instance.item_id is None:
+        instance.item = catalogo.item_do_catalogo(instance.item_requested)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidar_indice_catalogo(sender, **kwargs):
+    catalogo.invalidar_apos_commit()
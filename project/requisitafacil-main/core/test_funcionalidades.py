@@ -251,6 +251,7 @@ class TesteFuncionalidadesIsoladas(TestCase):
         user = get_user(self.client)
         print(f"🔍 Usuário autenticado: {user.username if user.is_authenticated else 'Não autenticado'}")
         
+        self.client.post(reverse('core:iniciar_atendimento_requisicao', args=[requisicao.pk]))
         response = self.client.get(reverse('core:almoxarife_atender_requisicao', args=[requisicao.pk]))
         
         print(f"🔍 Status da resposta: {response.status_code}")
@@ -1,16 +1,42 @@
-from django.test import TestCase, Client
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.apps import apps as django_apps
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.db.models import Count, Q, Sum
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+import importlib
 import uuid
 import random
 from decimal import Decimal
 
 from .models import (
     User, Sector, Request, RequestItem, Role, 
-    RequestStatus, Urgency, ItemCategory
+    RequestStatus, Urgency, ItemCategory, SectorSequence, reservar_codigos,
+    DailyRequestStats, Item, normalizar_nome_item, RequestStatusEvent, StatusEventAction
 )
+from . import catalogo, daily_stats
+from .atendimento import assumir_requisicao
+from .fila import proxima_requisicao
+from .queries import requisicoes_para_listagem, requisicoes_visiveis
+from .busca import buscar, filtrar_por_busca
+from django.core.management import call_command
+from io import StringIO
+import io
+import os
+import threading
+import time
+import asyncio
+
+def _banco_do_processo():
+    # Executada em um processo do pool da carga em massa: nome do banco conectado e um valor lido dele
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT valor FROM marcador')
+        return connection.settings_dict['NAME'], cursor.fetchone()[0]
+
 
 class RequisicaoFacilTestCase(TestCase):
     def setUp(self):
@@ -320,8 +346,8 @@ class RequisicaoFacilTestCase(TestCase):
         
         # 2. Almoxarife inicia atendimento
         almoxarife = self.login_user('almoxarife')
-        response = self.client.get(reverse('core:almoxarife_atender_requisicao', args=[requisicao.pk]))
-        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('core:iniciar_atendimento_requisicao', args=[requisicao.pk]))
+        self.assertRedirects(response, reverse('core:almoxarife_atender_requisicao', args=[requisicao.pk]))
         
         # Verificar se status mudou para EM_ATENDIMENTO
         requisicao.refresh_from_db()
@@ -670,3 +696,1976 @@ class RequisicaoFacilTestCase(TestCase):
         print("\n" + "=" * 60)
         print("🎉 Testes completos finalizados!")
         print("=" * 60)
+
+
+def criar_usuario(papel, sufixo, setor=None, nome=None, superusuario=False, **campos):
+    """
+    Usuário de teste com a senha padrão. O username (e o e-mail) é
+    '<papel em minúsculas>_<sufixo>', ou '<nome>_<sufixo>' quando `nome` é dado.
+    """
+    username = f'{nome or papel.lower()}_{sufixo}'
+    criar = User.objects.create_superuser if superusuario else User.objects.create_user
+    return criar(username=username, email=f'{username}@test.com', password='testpass123',
+                 role=papel, sector=setor, **campos)
+
+
+class SectorSequenceTestCase(TestCase):
+    """Testes do gerador de códigos por setor"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Padaria')
+        self.encarregado = criar_usuario(Role.Encarregado, 'seq', setor=self.setor)
+
+    def criar_requisicao(self, **kwargs):
+        return Request.objects.create(
+            requester=self.encarregado,
+            sector=self.setor,
+            observations='Teste de sequência',
+            **kwargs
+        )
+
+    def test_codigos_sequenciais_por_setor(self):
+        """Códigos consecutivos são gerados sem consultar as requisições existentes"""
+        primeira = self.criar_requisicao()
+        with CaptureQueriesContext(connection) as queries:
+            segunda = self.criar_requisicao()
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'core_request"' in q['sql']])
+        self.assertEqual(primeira.request_code, 'PD-1')
+        self.assertEqual(segunda.request_code, 'PD-2')
+
+    def test_reserva_em_uma_consulta(self):
+        """Com a linha do prefixo criada pela migração, reservar é um único UPDATE ... RETURNING"""
+        self.assertTrue(SectorSequence.objects.filter(prefix='PD').exists())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reservar_codigos(self.setor, 2), ['PD-1', 'PD-2'])
+        self.assertEqual(len(queries), 1)
+        self.assertIn('RETURNING', queries[0]['sql'])
+
+    def test_migracao_continua_numeracao_existente(self):
+        """A migração semeia cada prefixo com o maior código já gravado"""
+        self.criar_requisicao(request_code='PD-41')
+        self.criar_requisicao(request_code='PD-7')
+        self.criar_requisicao(request_code='XY-3')
+        SectorSequence.objects.all().delete()
+        migracao = importlib.import_module('core.migrations.0018_popular_sequencias_setor')
+        migracao.popular_sequencias(django_apps, None)
+        self.assertEqual(SectorSequence.objects.get(prefix='GEN').last_number, 0)
+        self.assertEqual(SectorSequence.objects.get(prefix='XY').last_number, 3)
+        self.assertEqual(self.criar_requisicao().request_code, 'PD-42')
+
+    def test_prefixo_sem_linha_continua_numeracao_existente(self):
+        """Sem a linha do prefixo, a primeira reserva a cria a partir do maior código gravado"""
+        self.criar_requisicao(request_code='PD-41')
+        SectorSequence.objects.filter(prefix='PD').delete()
+        self.assertEqual(self.criar_requisicao().request_code, 'PD-42')
+
+    def test_reservar_bloco_de_codigos(self):
+        """Uma reserva em bloco devolve códigos consecutivos e avança a sequência"""
+        codigos = reservar_codigos(self.setor, 3)
+        self.assertEqual(codigos, ['PD-1', 'PD-2', 'PD-3'])
+        self.assertEqual(self.criar_requisicao().request_code, 'PD-4')
+        self.assertEqual(SectorSequence.objects.get(prefix='PD').last_number, 4)
+
+    def test_prefixos_nao_se_misturam(self):
+        """Prefixos que começam com a mesma letra têm sequências independentes"""
+        flv = Sector.objects.create(name='FLV')
+        frios = Sector.objects.create(name='Frios')
+        self.assertEqual(reservar_codigos(frios), ['FR-1'])
+        self.assertEqual(reservar_codigos(flv), ['F-1'])
+
+    def test_reserva_invalida(self):
+        with self.assertRaises(ValueError):
+            SectorSequence.reserve('PD', 0)
+
+
+class GestorMetricsTestCase(TestCase):
+    """Testes do cálculo agregado das métricas do painel do gestor"""
+
+    def setUp(self):
+        self.flv = Sector.objects.create(name='FLV')
+        self.frios = Sector.objects.create(name='Frios')
+        self.gestor = criar_usuario(Role.Gestor, 'metricas')
+        self.encarregado = criar_usuario(Role.Encarregado, 'metricas', setor=self.flv)
+        agora = timezone.now()
+        for i in range(3):
+            Request.objects.create(requester=self.encarregado, sector=self.flv,
+                                   observations='Pendente', urgency=Urgency.URGENTE)
+        for horas in (2, 30):
+            req = Request.objects.create(requester=self.encarregado, sector=self.frios,
+                                         observations='Aprovada', status=RequestStatus.APPROVED)
+            # update() evita que o auto_now sobrescreva updated_at
+            Request.objects.filter(pk=req.pk).update(
+                created_at=agora - timedelta(hours=horas), updated_at=agora,
+                started_at=agora - timedelta(hours=1), finished_at=agora,
+                wait_seconds=(horas - 1) * 3600, service_seconds=3600,
+            )
+            RequestItem.objects.create(request=req, item_requested='Papel A4', quantify=2,
+                                       category=ItemCategory.LIMPEZA)
+
+    def test_kpis_em_consultas_fixas(self):
+        """Todas as métricas são calculadas com um número fixo de consultas"""
+        from .dashboard_metrics import calcular_metricas_gestor
+        with self.assertNumQueries(8):
+            metrics = calcular_metricas_gestor()
+        self.assertEqual(metrics.pendentes, 3)
+        self.assertEqual(metrics.urgentes_pendentes, 3)
+        self.assertEqual(metrics.aprovadas_hoje, 2)
+        self.assertEqual(metrics.total_aprovadas, 2)
+        self.assertEqual(metrics.atendidas_no_prazo, 1)
+        self.assertEqual(metrics.pct_no_prazo, 50.0)
+        self.assertEqual(metrics.departamentos_ativos, 2)
+        self.assertEqual(metrics.tempo_medio, timedelta(hours=16))
+        self.assertEqual(metrics.espera_media, timedelta(hours=15))
+        self.assertEqual(metrics.atendimento_medio, timedelta(hours=1))
+        self.assertEqual(metrics.tempo_p50, timedelta(hours=30))
+        self.assertEqual(metrics.tempo_p90, timedelta(hours=30))
+        self.assertEqual(metrics.setores_labels, ['FLV', 'Frios'])
+        self.assertEqual(metrics.setores_data, [3, 2])
+        self.assertEqual(metrics.user_top, 'encarregado_metricas')
+        self.assertEqual(metrics.categorias_labels, ['Limpeza'])
+
+    def test_dashboard_e_endpoint_json(self):
+        """A página e o endpoint JSON usam o mesmo resultado"""
+        self.client.force_login(self.gestor)
+        response = self.client.get(reverse('core:gestor_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['pendentes'], 3)
+        self.assertEqual(response.context['tempo_medio_str'], '16h 0min')
+
+        response = self.client.get(reverse('core:gestor_dashboard_dados'))
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados['pendentes'], 3)
+        self.assertEqual(dados['tempo_medio'], 16 * 3600)
+        self.assertEqual(dados['setor_top'], 'FLV')
+
+    def test_endpoint_json_restrito_ao_gestor(self):
+        self.client.force_login(self.encarregado)
+        response = self.client.get(reverse('core:gestor_dashboard_dados'))
+        self.assertEqual(response.status_code, 302)
+
+
+class DailyRequestStatsTestCase(TestCase):
+    """Testes da manutenção incremental do consolidado diário"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Frios')
+        self.encarregado = criar_usuario(Role.Encarregado, 'stats', setor=self.setor)
+
+    def criar_requisicao(self, categorias):
+        req = Request.objects.create(requester=self.encarregado, sector=self.setor, observations='Stats')
+        for categoria in categorias:
+            RequestItem.objects.create(request=req, item_requested='Luvas', quantify=1, category=categoria)
+        return req
+
+    def consolidado(self):
+        """Linhas não zeradas do consolidado, no mesmo formato produzido pela reconstrução"""
+        return sorted(
+            (linha.date, linha.status, linha.urgency, linha.category, linha.request_count, linha.item_count)
+            for linha in DailyRequestStats.objects.exclude(request_count=0, item_count=0)
+        )
+
+    def assertConsolidadoIgualReconstrucao(self):
+        incremental = self.consolidado()
+        daily_stats.reconstruir()
+        self.assertEqual(incremental, self.consolidado())
+
+    def test_criacao_e_mudanca_de_status(self):
+        req = self.criar_requisicao([ItemCategory.LIMPEZA, ItemCategory.LIMPEZA, ItemCategory.EMBALAGENS])
+        self.criar_requisicao([ItemCategory.LIMPEZA])
+        req.status = RequestStatus.APPROVED
+        req.urgency = Urgency.URGENTE
+        req.save()
+
+        aprovadas = DailyRequestStats.objects.get(status=RequestStatus.APPROVED, category='')
+        self.assertEqual(aprovadas.request_count, 1)
+        limpeza = DailyRequestStats.objects.get(status=RequestStatus.APPROVED, category=ItemCategory.LIMPEZA)
+        self.assertEqual(limpeza.item_count, 2)
+        self.assertConsolidadoIgualReconstrucao()
+
+    def test_alteracao_de_item_e_exclusoes(self):
+        req = self.criar_requisicao([ItemCategory.LIMPEZA, ItemCategory.EMBALAGENS])
+        outra = self.criar_requisicao([ItemCategory.LIMPEZA])
+        item = req.items.get(category=ItemCategory.LIMPEZA)
+        item.category = ItemCategory.ADMINISTRATIVO
+        item.save()
+        req.items.get(category=ItemCategory.EMBALAGENS).delete()
+        self.assertConsolidadoIgualReconstrucao()
+
+        outra.delete()
+        self.assertConsolidadoIgualReconstrucao()
+        totais = DailyRequestStats.objects.aggregate(requisicoes=Sum('request_count'), itens=Sum('item_count'))
+        self.assertEqual(totais, {'requisicoes': 1, 'itens': 1})
+
+    def test_comando_reconstruir(self):
+        self.criar_requisicao([ItemCategory.LIMPEZA])
+        DailyRequestStats.objects.all().delete()
+        call_command('reconstruir_estatisticas', stdout=StringIO())
+        self.assertEqual(DailyRequestStats.objects.get(category='').request_count, 1)
+        self.assertEqual(DailyRequestStats.objects.get(category=ItemCategory.LIMPEZA).item_count, 1)
+
+    def test_exclusao_que_falha_nao_afeta_ajustes_seguintes(self):
+        """Uma exclusão desfeita no meio não faz as exclusões seguintes de itens serem ignoradas"""
+        req = self.criar_requisicao([ItemCategory.LIMPEZA, ItemCategory.EMBALAGENS])
+
+        def falhar(sender, **kwargs):
+            raise RuntimeError('falha no meio da exclusão')
+
+        post_delete.connect(falhar, sender=RequestItem)
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Request.objects.get(pk=req.pk).delete()
+        finally:
+            post_delete.disconnect(falhar, sender=RequestItem)
+
+        req.items.get(category=ItemCategory.EMBALAGENS).delete()
+        self.assertConsolidadoIgualReconstrucao()
+
+    def test_criacao_agrupada_grava_consolidado_uma_vez(self):
+        """Dentro de agrupar_ajustes, a requisição e todos os itens geram uma única gravação no consolidado"""
+        with CaptureQueriesContext(connection) as queries, transaction.atomic(), daily_stats.agrupar_ajustes():
+            self.criar_requisicao([ItemCategory.LIMPEZA] * 3 + [ItemCategory.EMBALAGENS] * 2)
+        gravacoes = [q for q in queries if 'core_dailyrequeststats' in q['sql']]
+        self.assertEqual(len(gravacoes), 1)
+        self.assertEqual(DailyRequestStats.objects.get(category=ItemCategory.LIMPEZA).item_count, 3)
+        self.assertConsolidadoIgualReconstrucao()
+
+
+class ListagemQueryCountTestCase(TestCase):
+    """Garante que as listagens de requisições fazem um número fixo de consultas"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Loja')
+        self.gestor = criar_usuario(Role.Gestor, 'lista')
+        self.almoxarife = criar_usuario(Role.Almoxarife, 'lista')
+        self.encarregado = criar_usuario(Role.Encarregado, 'lista', setor=self.setor)
+
+    def criar_requisicoes(self, quantidade):
+        for i in range(quantidade):
+            status = [RequestStatus.PENDING, RequestStatus.EM_ATENDIMENTO][i % 2]
+            req = Request.objects.create(
+                requester=self.encarregado, sector=self.setor, observations='Lista', status=status,
+                atendido_por=self.almoxarife if status == RequestStatus.EM_ATENDIMENTO else None,
+            )
+            RequestItem.objects.create(request=req, item_requested='Caneta', quantify=1, category=ItemCategory.ADMINISTRATIVO)
+            RequestItem.objects.create(request=req, item_requested='Papel', quantify=1, category=ItemCategory.ADMINISTRATIVO)
+
+    def assertConsultasConstantes(self, usuario, url_name):
+        self.client.force_login(usuario)
+        url = reverse(url_name)
+        self.criar_requisicoes(2)
+        with CaptureQueriesContext(connection) as poucas:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.criar_requisicoes(8)
+        with self.assertNumQueries(len(poucas)):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_listar_requisicoes_gestor(self):
+        self.assertConsultasConstantes(self.gestor, 'core:listar_requisicoes')
+
+    def test_listar_requisicoes_almoxarife(self):
+        self.assertConsultasConstantes(self.almoxarife, 'core:listar_requisicoes')
+
+    def test_listar_requisicoes_encarregado(self):
+        self.assertConsultasConstantes(self.encarregado, 'core:listar_requisicoes')
+
+    def test_dashboard_encarregado(self):
+        self.assertConsultasConstantes(self.encarregado, 'core:dashboard')
+
+    def test_dashboard_almoxarife(self):
+        self.assertConsultasConstantes(self.almoxarife, 'core:dashboard')
+
+    def test_almoxarife_dashboard(self):
+        self.assertConsultasConstantes(self.almoxarife, 'core:almoxarife_dashboard')
+
+    def test_gestor_dashboard(self):
+        self.assertConsultasConstantes(self.gestor, 'core:gestor_dashboard')
+
+    def test_anotacoes_da_listagem(self):
+        self.criar_requisicoes(1)
+        req = requisicoes_para_listagem().get()
+        self.assertEqual(req.first_item, 'Caneta')
+        self.assertEqual(req.item_count, 2)
+
+
+class FragmentosTestCase(TestCase):
+    """Testes dos fragmentos de tabela com ETag/304 usados pelo tempo real"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Hortifruti')
+        self.almoxarife = criar_usuario(Role.Almoxarife, 'frag')
+        self.encarregado = criar_usuario(Role.Encarregado, 'frag', setor=self.setor)
+        self.requisicoes = [
+            Request.objects.create(requester=self.encarregado, sector=self.setor, observations=f'Frag {i}')
+            for i in range(3)
+        ]
+
+    def buscar(self, url_name, etag=None, **params):
+        cabecalhos = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse(url_name), {'fragmento': '1', **params}, **cabecalhos)
+
+    def test_fragmento_tem_so_as_linhas_e_responde_304(self):
+        self.client.force_login(self.almoxarife)
+        for url_name in ['core:listar_requisicoes', 'core:dashboard', 'core:almoxarife_dashboard']:
+            with self.subTest(url_name=url_name):
+                response = self.buscar(url_name)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, '<html')
+                self.assertContains(response, self.requisicoes[0].request_code)
+                self.assertIn('no-cache', response['Cache-Control'])
+                etag = response['ETag']
+
+                with CaptureQueriesContext(connection) as consultas:
+                    response = self.buscar(url_name, etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                # Uma única consulta agregada nas requisições, nada de itens
+                sql_requisicoes = [q['sql'] for q in consultas.captured_queries if 'core_request' in q['sql']]
+                self.assertEqual(len(sql_requisicoes), 1)
+                self.assertIn('MAX', sql_requisicoes[0].upper())
+                self.assertNotIn('core_requestitem', sql_requisicoes[0])
+
+    def test_etag_muda_com_alteracao_exclusao_e_filtros(self):
+        self.client.force_login(self.almoxarife)
+        etag = self.buscar('core:almoxarife_dashboard')['ETag']
+
+        req = self.requisicoes[0]
+        req.status = RequestStatus.EM_ATENDIMENTO
+        req.atendido_por = self.almoxarife
+        req.save()
+        response = self.buscar('core:almoxarife_dashboard', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, req.request_code)
+
+        etag = response['ETag']
+        self.requisicoes[1].delete()
+        self.assertEqual(self.buscar('core:almoxarife_dashboard', etag).status_code, 200)
+
+        etag = self.buscar('core:listar_requisicoes')['ETag']
+        self.assertEqual(self.buscar('core:listar_requisicoes', etag, status=RequestStatus.PENDING).status_code, 200)
+
+    def test_etag_depende_do_usuario(self):
+        self.client.force_login(self.almoxarife)
+        etag = self.buscar('core:listar_requisicoes')['ETag']
+        self.client.force_login(self.encarregado)
+        self.assertEqual(self.buscar('core:listar_requisicoes', etag).status_code, 200)
+
+
+class DashboardCacheTestCase(TestCase):
+    """Testes do cache dos dashboards com invalidação por versão"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.setor = Sector.objects.create(name='Açougue')
+        self.gestor = criar_usuario(Role.Gestor, 'cache')
+        self.encarregado = criar_usuario(Role.Encarregado, 'cache', setor=self.setor)
+        self.outro = criar_usuario(Role.Encarregado, 'cache', setor=self.setor, nome='outro')
+        Request.objects.create(requester=self.encarregado, sector=self.setor, observations='Cache')
+
+    def consultas_em_requisicoes(self, url_name):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return response, len([q for q in consultas.captured_queries if 'core_request' in q['sql']])
+
+    def test_segunda_visita_vem_do_cache_ate_a_proxima_gravacao(self):
+        self.client.force_login(self.gestor)
+        for url_name in ['core:gestor_dashboard', 'core:dashboard']:
+            with self.subTest(url_name=url_name):
+                response, consultas = self.consultas_em_requisicoes(url_name)
+                self.assertGreater(consultas, 0)
+                self.assertEqual(response.context['pendentes'], Request.objects.filter(status=RequestStatus.PENDING).count())
+                response, consultas = self.consultas_em_requisicoes(url_name)
+                self.assertEqual(consultas, 0)
+
+        Request.objects.create(requester=self.encarregado, sector=self.setor, observations='Nova')
+        response, consultas = self.consultas_em_requisicoes('core:gestor_dashboard')
+        self.assertGreater(consultas, 0)
+        self.assertEqual(response.context['pendentes'], 2)
+
+    def test_encarregados_tem_entradas_separadas(self):
+        self.client.force_login(self.encarregado)
+        self.assertEqual(self.client.get(reverse('core:dashboard')).context['pendentes'], 1)
+        self.client.force_login(self.outro)
+        self.assertEqual(self.client.get(reverse('core:dashboard')).context['pendentes'], 0)
+
+    def test_cards_em_json_para_ressincronizar(self):
+        """Os valores absolutos dos cards são relidos quando a página pode ter perdido eventos"""
+        self.client.force_login(self.encarregado)
+        response = self.client.get(reverse('core:dashboard'), {'cards': '1'})
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertEqual(response.json(), {'pendentes': 1, 'aprovadas_hoje': 0, 'total_mes': 1})
+        self.client.force_login(self.gestor)
+        self.assertEqual(self.client.get(reverse('core:dashboard'), {'cards': '1'}).json()['pendentes'], 1)
+
+    def test_funciona_com_cache_em_arquivo(self):
+        import tempfile
+        from django.test import override_settings
+        with tempfile.TemporaryDirectory() as pasta, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': pasta,
+        }}):
+            self.client.force_login(self.gestor)
+            self.consultas_em_requisicoes('core:gestor_dashboard')
+            self.assertEqual(self.consultas_em_requisicoes('core:gestor_dashboard')[1], 0)
+            item = RequestItem.objects.create(
+                request=Request.objects.get(), item_requested='Faca', quantify=1, category=ItemCategory.LIMPEZA
+            )
+            self.assertGreater(self.consultas_em_requisicoes('core:gestor_dashboard')[1], 0)
+            item.delete()
+            self.assertGreater(self.consultas_em_requisicoes('core:gestor_dashboard')[1], 0)
+
+
+class ApiRequisicoesTestCase(TestCase):
+    """Testes da API JSON somente leitura de requisições"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Mercearia')
+        self.gestor = criar_usuario(Role.Gestor, 'api')
+        self.encarregado = criar_usuario(Role.Encarregado, 'api', setor=self.setor)
+        self.outro = criar_usuario(Role.Encarregado, 'api', setor=self.setor, nome='outro')
+        self.minhas = [
+            Request.objects.create(requester=self.encarregado, sector=self.setor, observations=f'Minha {i}')
+            for i in range(5)
+        ]
+        self.alheia = Request.objects.create(requester=self.outro, sector=self.setor, observations='Alheia')
+        RequestItem.objects.create(request=self.minhas[0], item_requested='Arroz', quantify=3, category=ItemCategory.LIMPEZA)
+
+    def listar(self, **params):
+        response = self.client.get(reverse('core:api_requisicoes'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sincronizar(self, cursor=None, **params):
+        ids = []
+        while True:
+            pagina = self.listar(limit=2, **({'cursor': cursor} if cursor else {}), **params)
+            ids += [linha['id'] for linha in pagina['resultados']]
+            cursor = pagina['cursor']
+            if not pagina['tem_mais']:
+                return ids, cursor
+
+    def test_regras_de_acesso_e_autenticacao(self):
+        self.assertEqual(self.client.get(reverse('core:api_requisicoes')).status_code, 401)
+        self.client.force_login(self.encarregado)
+        self.assertEqual(len(self.listar()['resultados']), 5)
+        alheia = reverse('core:api_requisicao', args=[self.alheia.pk])
+        self.assertEqual(self.client.get(alheia).status_code, 404)
+        self.assertEqual(self.client.get(reverse('core:api_itens_requisicao', args=[self.alheia.pk])).status_code, 404)
+        self.client.force_login(self.gestor)
+        self.assertEqual(len(self.listar()['resultados']), 6)
+        self.assertEqual(self.client.get(alheia).json()['request_code'], self.alheia.request_code)
+
+    def test_fields_projeta_apenas_as_colunas_pedidas(self):
+        self.client.force_login(self.gestor)
+        with CaptureQueriesContext(connection) as consultas:
+            pagina = self.listar(fields='request_code,status')
+        self.assertEqual(set(pagina['resultados'][0]), {'request_code', 'status'})
+        sql = [q['sql'] for q in consultas.captured_queries if 'core_request' in q['sql']][-1]
+        self.assertNotIn('core_sector', sql)
+        self.assertNotIn('observations', sql)
+
+        self.assertEqual(set(self.listar(fields='sector')['resultados'][0]), {'sector'})
+        self.assertEqual(self.listar(fields='sector')['resultados'][0]['sector'], 'Mercearia')
+        response = self.client.get(reverse('core:api_requisicoes'), {'fields': 'request_code,senha'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('senha', response.json()['erro'])
+
+        itens = self.client.get(reverse('core:api_itens_requisicao', args=[self.minhas[0].pk]),
+                                {'fields': 'item_requested,quantify'}).json()
+        self.assertEqual(itens['resultados'], [{'item_requested': 'Arroz', 'quantify': 3}])
+
+    def test_cursor_percorre_tudo_e_sincroniza_so_o_que_mudou(self):
+        self.client.force_login(self.gestor)
+        ids, cursor = self.sincronizar()
+        self.assertEqual(sorted(ids), sorted(str(r.pk) for r in [*self.minhas, self.alheia]))
+
+        # Nada mudou: continuar do cursor não traz nada
+        pagina = self.listar(cursor=cursor)
+        self.assertEqual(pagina['resultados'], [])
+        self.assertEqual(pagina['cursor'], cursor)
+
+        alterada = self.minhas[2]
+        alterada.status = RequestStatus.APPROVED
+        alterada.save()
+        ids, _ = self.sincronizar(cursor=cursor)
+        self.assertEqual(ids, [str(alterada.pk)])
+
+        desde = self.listar(updated_since=alterada.updated_at.isoformat(), fields='id,status')['resultados']
+        self.assertEqual(desde, [{'id': str(alterada.pk), 'status': RequestStatus.APPROVED}])
+        self.assertEqual(self.client.get(reverse('core:api_requisicoes'), {'cursor': 'xx'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('core:api_requisicoes'), {'updated_since': 'ontem'}).status_code, 400)
+
+    def test_resposta_comprimida_com_gzip(self):
+        self.client.force_login(self.gestor)
+        response = self.client.get(reverse('core:api_requisicoes'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class PaginacaoCursorTestCase(TestCase):
+    """Testes da paginação por cursor em listar_requisicoes"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='ADM')
+        self.gestor = criar_usuario(Role.Gestor, 'pagina')
+        self.encarregado = criar_usuario(Role.Encarregado, 'pagina', setor=self.setor)
+        agora = timezone.now()
+        self.requisicoes = []
+        for i in range(7):
+            req = Request.objects.create(
+                requester=self.encarregado, sector=self.setor, observations='Página',
+                urgency=Urgency.URGENTE if i % 2 else Urgency.NORMAL,
+            )
+            # Dois pares com o mesmo created_at para exercitar o desempate por id
+            Request.objects.filter(pk=req.pk).update(created_at=agora - timedelta(minutes=i // 2))
+            self.requisicoes.append(req.pk)
+        self.client.force_login(self.gestor)
+
+    def test_percorre_todas_as_paginas_sem_repetir(self):
+        from .pagination import paginar_por_cursor
+        paginas = []
+        pagina = paginar_por_cursor(Request.objects.all(), tamanho=3)
+        paginas.append([r.pk for r in pagina])
+        while pagina.cursor_proximo:
+            pagina = paginar_por_cursor(Request.objects.all(), depois=pagina.cursor_proximo, tamanho=3)
+            paginas.append([r.pk for r in pagina])
+        self.assertEqual([len(p) for p in paginas], [3, 3, 1])
+        todos = [pk for p in paginas for pk in p]
+        esperado = list(Request.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(todos, esperado)
+
+        # Voltando a partir da última página chega-se à página anterior
+        anterior = paginar_por_cursor(Request.objects.all(), antes=pagina.cursor_anterior, tamanho=3)
+        self.assertEqual([r.pk for r in anterior], paginas[1])
+
+    def test_filtro_de_urgencia_e_links(self):
+        response = self.client.get(reverse('core:listar_requisicoes'), {'status': 'PENDING', 'urgency': 'URGENTE'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['requisicoes']), 3)
+        self.assertTrue(all(r.urgency == Urgency.URGENTE for r in response.context['requisicoes']))
+        self.assertEqual(response.context['filtros_querystring'], 'status=PENDING&urgency=URGENTE')
+
+    def test_cursor_invalido_volta_para_primeira_pagina(self):
+        response = self.client.get(reverse('core:listar_requisicoes'), {'depois': 'invalido!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['requisicoes']), 7)
+
+
+class IndicesConsultasTestCase(TestCase):
+    """Testes dos índices e do comando explicar_consultas"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Deposito')
+        for papel in (Role.Gestor, Role.Almoxarife, Role.Encarregado):
+            criar_usuario(papel, 'explain', setor=self.setor)
+        encarregado = User.objects.get(role=Role.Encarregado)
+        req = Request.objects.create(requester=encarregado, sector=self.setor, observations='Explain')
+        RequestItem.objects.create(request=req, item_requested='Fita', quantify=1, category=ItemCategory.EMBALAGENS)
+
+    def test_alerta_de_urgentes_usa_indice(self):
+        plano = Request.objects.filter(status=RequestStatus.PENDING, urgency=Urgency.URGENTE).explain()
+        self.assertIn('USING INDEX', plano)
+
+    def test_comando_explicar_consultas(self):
+        saida = StringIO()
+        call_command('explicar_consultas', stdout=saida)
+        texto = saida.getvalue()
+        for url_name in ('core:listar_requisicoes', 'core:dashboard', 'core:almoxarife_dashboard',
+                         'core:gestor_dashboard', 'core:detalhe_requisicao'):
+            self.assertIn(url_name, texto)
+        self.assertIn('Varreduras sequenciais encontradas', texto)
+        # As views não deixam efeitos colaterais no banco
+        self.assertEqual(Request.objects.get().status, RequestStatus.PENDING)
+
+
+class FiltrosDeDataTestCase(TestCase):
+    """Testes dos filtros de data por intervalo (sem funções sobre a coluna)"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Comercial')
+        self.encarregado = criar_usuario(Role.Encarregado, 'datas', setor=self.setor)
+
+    def criar_em(self, momento):
+        req = Request.objects.create(requester=self.encarregado, sector=self.setor, observations='Datas')
+        Request.objects.filter(pk=req.pk).update(created_at=momento, updated_at=momento)
+        return req
+
+    def test_limites_do_dia_local(self):
+        from datetime import date, datetime
+        from zoneinfo import ZoneInfo
+        from .queries import no_dia, no_mes
+        sp = ZoneInfo('America/Sao_Paulo')
+        dentro = self.criar_em(datetime(2025, 3, 10, 23, 30, tzinfo=sp))
+        self.criar_em(datetime(2025, 3, 11, 0, 30, tzinfo=sp))
+        self.criar_em(datetime(2025, 3, 9, 23, 59, tzinfo=sp))
+
+        do_dia = Request.objects.filter(no_dia('created_at', date(2025, 3, 10)))
+        self.assertEqual(list(do_dia), [dentro])
+        self.assertEqual(do_dia.count(), Request.objects.filter(created_at__date=date(2025, 3, 10)).count())
+        self.assertEqual(Request.objects.filter(no_mes('created_at', date(2025, 3, 1))).count(), 3)
+        self.assertEqual(Request.objects.filter(no_mes('created_at', date(2025, 2, 1))).count(), 0)
+
+    def test_consultas_sem_funcao_na_coluna(self):
+        """Os cards do dashboard não usam conversão de data sobre a coluna"""
+        self.criar_em(timezone.now())
+        self.client.force_login(self.encarregado)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('core:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_mes'], 1)
+        self.assertEqual(len(response.context['requisicoes_do_dia']), 1)
+        for query in queries:
+            self.assertNotIn('django_datetime_cast_date', query['sql'])
+            self.assertNotIn('django_datetime_extract', query['sql'])
+
+    def test_filtro_de_data_na_listagem(self):
+        self.criar_em(timezone.now())
+        self.client.force_login(self.encarregado)
+        hoje = timezone.localdate().isoformat()
+        response = self.client.get(reverse('core:listar_requisicoes'), {'data': hoje})
+        self.assertEqual(len(response.context['requisicoes']), 1)
+        response = self.client.get(reverse('core:listar_requisicoes'), {'data': 'data-invalida'})
+        self.assertEqual(response.status_code, 200)
+
+
+class AtendimentoEmLoteTestCase(TestCase):
+    """Testes da finalização do atendimento com atualização em lote dos itens"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Limpeza')
+        self.almoxarife = criar_usuario(Role.Almoxarife, 'lote')
+        self.encarregado = criar_usuario(Role.Encarregado, 'lote', setor=self.setor)
+        self.client.force_login(self.almoxarife)
+
+    def criar_requisicao(self, num_itens):
+        req = Request.objects.create(
+            requester=self.encarregado, sector=self.setor, observations='Lote',
+            status=RequestStatus.EM_ATENDIMENTO, atendido_por=self.almoxarife,
+        )
+        for i in range(num_itens):
+            RequestItem.objects.create(request=req, item_requested=f'Item {i}', quantify=10, category=ItemCategory.LIMPEZA)
+        return req
+
+    def finalizar(self, req, item_ids, quantidades):
+        return self.client.post(reverse('core:almoxarife_atender_requisicao', args=[req.pk]), {
+            'item_id': item_ids,
+            'quantidade_atendida': quantidades,
+            'observacao_item': [f'obs {i}' for i in range(len(item_ids))],
+            'observacoes_atendimento': 'Finalizado em lote',
+        })
+
+    def consultas_para_finalizar(self, num_itens):
+        req = self.criar_requisicao(num_itens)
+        itens = [str(pk) for pk in req.items.values_list('pk', flat=True)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.finalizar(req, itens, ['7'] * num_itens)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_numero_de_consultas_nao_depende_dos_itens(self):
+        # A primeira finalização cria as linhas do consolidado diário
+        self.consultas_para_finalizar(1)
+        self.assertEqual(self.consultas_para_finalizar(3), self.consultas_para_finalizar(60))
+
+    def test_itens_atualizados_e_desconhecidos_ignorados(self):
+        req = self.criar_requisicao(2)
+        outra = self.criar_requisicao(1)
+        item_a, item_b = req.items.all()
+        intruso = outra.items.get()
+        response = self.finalizar(
+            req,
+            [str(item_a.pk), str(intruso.pk), 'nao-e-um-uuid', str(item_b.pk)],
+            ['4', '9', '1', 'x'],
+        )
+        self.assertEqual(response.status_code, 302)
+
+        req.refresh_from_db()
+        item_a.refresh_from_db()
+        item_b.refresh_from_db()
+        intruso.refresh_from_db()
+        self.assertEqual(req.status, RequestStatus.APPROVED)
+        self.assertIn('Finalizado em lote', req.observations)
+        self.assertEqual((item_a.quantidade_atendida, item_a.observacao_item), (4, 'obs 0'))
+        self.assertEqual((item_b.quantidade_atendida, item_b.observacao_item), (0, 'obs 3'))
+        self.assertGreater(item_a.updated_at, item_a.created_at)
+        self.assertEqual(intruso.quantidade_atendida, 0)
+
+
+class NotificacoesTestCase(TestCase):
+    """Testes do envio de notificações em segundo plano"""
+
+    class SessaoFalsa:
+        def __init__(self):
+            self.envios = []
+            self.enviado = threading.Event()
+
+        def post(self, url, data=None, headers=None, timeout=None):
+            import json
+            self.envios.append((url, json.loads(data), timeout))
+            self.cabecalhos = headers
+            self.enviado.set()
+            return type('Resposta', (), {'status_code': 200})()
+
+    def test_coalescer_mantem_ultimo_evento(self):
+        from .notifications import coalescer
+        eventos = [
+            {'action': 'created', 'request_id': 1, 'v': 1},
+            {'action': 'finalized', 'request_id': 2},
+            {'action': 'created', 'request_id': 1, 'v': 2},
+        ]
+        self.assertEqual(coalescer(eventos), [{'action': 'finalized', 'request_id': 2},
+                                              {'action': 'created', 'request_id': 1, 'v': 2}])
+
+    def test_coalescer_soma_variacao_dos_contadores(self):
+        from .notifications import coalescer
+        eventos = [
+            {'action': 'updated', 'request_id': 1, 'counters': {'pendentes': -1, 'em_atendimento': 1}},
+            {'action': 'updated', 'request_id': 1, 'counters': {'em_atendimento': -1, 'aprovadas_hoje': 1}},
+        ]
+        self.assertEqual(coalescer(eventos), [
+            {'action': 'updated', 'request_id': 1, 'counters': {'pendentes': -1, 'aprovadas_hoje': 1}},
+        ])
+
+    def test_eventos_em_rajada_saem_em_um_unico_post(self):
+        from .notifications import NotificationDispatcher
+        dispatcher = NotificationDispatcher('http://realtime.test/notify', 'segredo', janela=0.2)
+        sessao = self.SessaoFalsa()
+        dispatcher._session = sessao
+        dispatcher._pid = os.getpid()
+        for _ in range(5):
+            dispatcher._fila.put_nowait({'action': 'created'})
+        dispatcher.enviar(dispatcher._proximo_lote())
+
+        self.assertEqual(len(sessao.envios), 1)
+        url, corpo, timeout = sessao.envios[0]
+        self.assertEqual(corpo, {'events': [{'action': 'created'}]})
+        self.assertEqual(timeout, dispatcher.timeout)
+        # O corpo vai assinado com o segredo compartilhado
+        from realtime_token import CABECALHO_ASSINATURA, CABECALHO_MOMENTO, validar_notificacao
+        self.assertTrue(validar_notificacao(
+            'segredo', b'{"events": [{"action": "created"}]}',
+            sessao.cabecalhos[CABECALHO_MOMENTO], sessao.cabecalhos[CABECALHO_ASSINATURA],
+        ))
+
+    def test_thread_entrega_eventos(self):
+        from .notifications import NotificationDispatcher
+        dispatcher = NotificationDispatcher('http://realtime.test/notify', 'segredo', janela=0.01)
+        sessao = self.SessaoFalsa()
+        dispatcher._session = sessao
+        dispatcher._pid = os.getpid()
+        dispatcher.enfileirar({'action': 'finalized'})
+        self.assertTrue(sessao.enviado.wait(2))
+        self.assertEqual(sessao.envios[0][1], {'events': [{'action': 'finalized'}]})
+
+    def test_notificacao_apenas_apos_commit(self):
+        from . import notifications
+        recebidos = []
+        falso = type('DispatcherFalso', (), {'enfileirar': lambda self, evento: recebidos.append(evento)})()
+        original = notifications._dispatcher
+        notifications._dispatcher = falso
+        try:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                notifications.notificar({'action': 'created'})
+                self.assertEqual(recebidos, [])
+        finally:
+            notifications._dispatcher = original
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(recebidos, [{'action': 'created'}])
+
+    def test_variacao_contadores_por_transicao(self):
+        from .notifications import variacao_contadores
+        self.assertEqual(variacao_contadores(None, RequestStatus.PENDING, urgente=True),
+                         {'pendentes': 1, 'total_mes': 1, 'urgentes_pendentes': 1})
+        self.assertEqual(variacao_contadores(RequestStatus.PENDING, RequestStatus.EM_ATENDIMENTO),
+                         {'pendentes': -1, 'em_atendimento': 1})
+        self.assertEqual(variacao_contadores(RequestStatus.EM_ATENDIMENTO, RequestStatus.APPROVED),
+                         {'em_atendimento': -1, 'aprovadas_hoje': 1})
+        self.assertEqual(variacao_contadores(RequestStatus.PENDING, None, no_mes=False), {'pendentes': -1})
+
+    def test_views_emitem_eventos_estruturados(self):
+        from . import notifications
+        setor = Sector.objects.create(name='Frios')
+        encarregado = criar_usuario(Role.Encarregado, 'evento', setor=setor)
+        almoxarife = criar_usuario(Role.Almoxarife, 'evento')
+        recebidos = []
+        falso = type('DispatcherFalso', (), {'enfileirar': lambda self, evento: recebidos.append(evento)})()
+        original = notifications._dispatcher
+        notifications._dispatcher = falso
+        try:
+            self.client.force_login(encarregado)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('core:criar_requisicao'), {
+                    'urgency': Urgency.URGENTE,
+                    'observations': 'Evento',
+                    'items-TOTAL_FORMS': '1',
+                    'items-INITIAL_FORMS': '0',
+                    'items-MIN_NUM_FORMS': '0',
+                    'items-MAX_NUM_FORMS': '1000',
+                    'items-0-item_requested': 'Luvas',
+                    'items-0-quantify': '2',
+                    'items-0-category': ItemCategory.LIMPEZA,
+                })
+            req = Request.objects.get(requester=encarregado)
+
+            self.client.force_login(almoxarife)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('core:iniciar_atendimento_requisicao', args=[req.pk]))
+        finally:
+            notifications._dispatcher = original
+
+        criado, iniciado = recebidos
+        self.assertEqual(criado['v'], notifications.VERSAO_EVENTOS)
+        self.assertEqual(criado['action'], 'created')
+        self.assertEqual(criado['request_id'], str(req.pk))
+        self.assertEqual(criado['request_code'], req.request_code)
+        self.assertEqual((criado['sector_id'], criado['sector']), (str(setor.pk), 'Frios'))
+        self.assertEqual((criado['status'], criado['urgency']), (RequestStatus.PENDING, Urgency.URGENTE))
+        self.assertEqual(criado['counters'], {'pendentes': 1, 'total_mes': 1, 'urgentes_pendentes': 1})
+        self.assertEqual(criado['observations'], 'Evento')
+        self.assertEqual(iniciado['action'], 'claimed')
+        self.assertEqual(iniciado['atendido_por'], almoxarife.username)
+        self.assertEqual(iniciado['counters'], {'pendentes': -1, 'em_atendimento': 1, 'urgentes_pendentes': -1})
+        self.assertEqual(set(criado['topics']), {'all', 'role:Almoxarife', f'user:{encarregado.pk}'})
+
+    def test_token_realtime_define_topicos_pelo_papel(self):
+        from django.conf import settings
+        from realtime_token import validar_token
+        setor = Sector.objects.create(name='Padaria')
+        esperados = {
+            Role.Gestor: lambda u: ['all'],
+            Role.Almoxarife: lambda u: ['role:Almoxarife'],
+            Role.Encarregado: lambda u: [f'user:{u.pk}'],
+        }
+        for papel, topicos in esperados.items():
+            usuario = criar_usuario(papel, 'token', setor=setor)
+            self.client.force_login(usuario)
+            response = self.client.get(reverse('core:realtime_token'))
+            self.assertEqual(response['Cache-Control'], 'no-store')
+            dados = validar_token(settings.REALTIME_TOKEN_SECRET, response.json()['token'])
+            self.assertEqual(dados['u'], str(usuario.pk))
+            self.assertEqual(dados['t'], topicos(usuario))
+
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('core:realtime_token')).status_code, 302)
+
+
+class FanoutEngineTestCase(SimpleTestCase):
+    """Testes do fan-out com fila por cliente do servidor de tempo real"""
+
+    class SocketFalso:
+        def __init__(self, bloqueado=False):
+            self.recebidas = []
+            self.fechado = False
+            self.liberar = asyncio.Event()
+            if not bloqueado:
+                self.liberar.set()
+
+        async def send_text(self, mensagem):
+            await self.liberar.wait()
+            self.recebidas.append(mensagem)
+
+        async def close(self):
+            self.fechado = True
+
+    def test_cliente_lento_nao_atrasa_os_demais(self):
+        from realtime_fanout import AVISO_RESSINCRONIZAR, FanoutEngine
+
+        async def cenario():
+            engine = FanoutEngine(tamanho_fila=2, politica='coalesce')
+            lento, rapido = self.SocketFalso(bloqueado=True), self.SocketFalso()
+            engine.conectar(lento)
+            engine.conectar(rapido)
+            for i in range(5):
+                self.assertEqual(engine.broadcast(str(i)), 2)
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+            self.assertEqual(rapido.recebidas, ['0', '1', '2', '3', '4'])
+            # O lento fica com a primeira mensagem em envio e as duas mais novas na fila,
+            # precedidas do aviso de que houve descarte
+            lento.liberar.set()
+            await asyncio.sleep(0.01)
+            self.assertEqual(lento.recebidas, ['0', AVISO_RESSINCRONIZAR, '3', '4'])
+            self.assertEqual(rapido.recebidas.count(AVISO_RESSINCRONIZAR), 0)
+            for websocket in list(engine.clientes):
+                engine.desconectar(websocket)
+
+        asyncio.run(cenario())
+
+    def test_politica_drop_desconecta_cliente_lento(self):
+        from realtime_fanout import FanoutEngine
+
+        async def cenario():
+            engine = FanoutEngine(tamanho_fila=1, politica='drop')
+            lento, rapido = self.SocketFalso(bloqueado=True), self.SocketFalso()
+            engine.conectar(lento)
+            engine.conectar(rapido)
+            for i in range(3):
+                engine.broadcast(str(i))
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+            self.assertNotIn(lento, engine.clientes)
+            self.assertTrue(lento.fechado)
+            self.assertEqual(rapido.recebidas, ['0', '1', '2'])
+            engine.desconectar(rapido)
+
+        asyncio.run(cenario())
+
+    def test_pong_com_fila_cheia_derruba_na_politica_drop(self):
+        from realtime_fanout import FanoutEngine
+
+        async def cenario():
+            engine = FanoutEngine(tamanho_fila=1, politica='drop')
+            lento = self.SocketFalso(bloqueado=True)
+            cliente = engine.conectar(lento)
+            self.assertTrue(engine.enviar(cliente, 'pong'))
+            await asyncio.sleep(0)
+            self.assertTrue(engine.enviar(cliente, 'pong'))
+            self.assertFalse(engine.enviar(cliente, 'pong'))
+            await asyncio.sleep(0.01)
+            self.assertNotIn(lento, engine.clientes)
+            self.assertTrue(lento.fechado)
+            self.assertEqual(engine.derrubados, 1)
+
+        asyncio.run(cenario())
+
+    def test_eventos_roteados_por_topico(self):
+        from realtime_fanout import FanoutEngine
+
+        async def cenario():
+            engine = FanoutEngine()
+            gestor, almoxarife = self.SocketFalso(), self.SocketFalso()
+            dono, outro = self.SocketFalso(), self.SocketFalso()
+            engine.conectar(gestor, ['all'])
+            engine.conectar(almoxarife, ['role:Almoxarife'])
+            engine.conectar(dono, ['user:1'])
+            engine.conectar(outro, ['user:2'])
+            self.assertEqual(engine.broadcast('evento', ['all', 'role:Almoxarife', 'user:1', 'sector:9']), 3)
+            self.assertEqual(engine.broadcast('geral'), 4)
+            await asyncio.sleep(0.01)
+            self.assertEqual(gestor.recebidas, ['evento', 'geral'])
+            self.assertEqual(almoxarife.recebidas, ['evento', 'geral'])
+            self.assertEqual(dono.recebidas, ['evento', 'geral'])
+            self.assertEqual(outro.recebidas, ['geral'])
+            for websocket in list(engine.clientes):
+                engine.desconectar(websocket)
+            self.assertEqual(engine.topicos, {})
+
+        asyncio.run(cenario())
+
+    def test_latencia_de_envio_e_contadores(self):
+        from realtime_fanout import FanoutEngine
+
+        latencias = []
+
+        async def cenario():
+            engine = FanoutEngine(tamanho_fila=1, politica='coalesce', ao_enviar=latencias.append)
+            lento, rapido = self.SocketFalso(bloqueado=True), self.SocketFalso()
+            engine.conectar(lento)
+            engine.conectar(rapido)
+            for i in range(4):
+                engine.broadcast(str(i))
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+            # O lento ficou com "0" em envio e só a mais nova na fila: duas descartadas
+            self.assertEqual(engine.descartadas, 2)
+            engine.desconectar(lento)
+            self.assertEqual(engine.descartadas, 2)
+            engine.desconectar(rapido)
+
+        asyncio.run(cenario())
+        self.assertEqual(len(latencias), 4)
+        self.assertTrue(all(latencia >= 0 for latencia in latencias))
+
+    def test_politica_invalida(self):
+        from realtime_fanout import FanoutEngine
+        with self.assertRaises(ValueError):
+            FanoutEngine(politica='ignorar')
+
+
+class BarramentoRealtimeTestCase(SimpleTestCase):
+    """Testes do barramento entre workers do servidor de tempo real"""
+
+    def test_barramento_sqlite_entrega_para_todos_os_workers(self):
+        import tempfile
+        from realtime_bus import criar_barramento
+
+        async def cenario(caminho):
+            recebidas_a, recebidas_b = [], []
+            worker_a = criar_barramento(recebidas_a.append, backend='sqlite', url=caminho)
+            worker_b = criar_barramento(recebidas_b.append, backend='sqlite', url=caminho)
+            await worker_a.iniciar()
+            await worker_a.publicar('antiga')
+            await asyncio.sleep(0.1)
+            # Um worker que sobe depois não recebe o que já foi publicado
+            await worker_b.iniciar()
+            try:
+                await worker_a.publicar('um')
+                await worker_b.publicar('dois')
+                await asyncio.sleep(0.2)
+            finally:
+                await worker_a.parar()
+                await worker_b.parar()
+            return recebidas_a, recebidas_b
+
+        with tempfile.TemporaryDirectory() as pasta:
+            recebidas_a, recebidas_b = asyncio.run(cenario(os.path.join(pasta, 'bus.sqlite3')))
+        self.assertEqual(recebidas_a, ['antiga', 'um', 'dois'])
+        self.assertEqual(recebidas_b, ['um', 'dois'])
+
+    def test_barramento_em_memoria_e_backend_invalido(self):
+        from realtime_bus import criar_barramento
+        recebidas = []
+        barramento = criar_barramento(recebidas.append, backend='memoria')
+        asyncio.run(barramento.publicar('local'))
+        self.assertEqual(recebidas, ['local'])
+        with self.assertRaises(ValueError):
+            criar_barramento(recebidas.append, backend='redis')
+
+
+class RealtimeTokenTestCase(SimpleTestCase):
+    """Testes do token assinado das conexões WebSocket"""
+
+    def test_token_valido(self):
+        from realtime_token import gerar_token, validar_token
+        token = gerar_token('segredo', 'abc', ['user:abc'], validade=60, agora=1000)
+        self.assertEqual(validar_token('segredo', token, agora=1059), {'u': 'abc', 't': ['user:abc'], 'exp': 1060})
+
+    def test_token_expirado_adulterado_ou_de_outro_segredo(self):
+        from realtime_token import gerar_token, validar_token
+        token = gerar_token('segredo', 'abc', ['user:abc'], validade=60, agora=1000)
+        carga, assinatura = token.split('.')
+        outra_carga = gerar_token('segredo', 'abc', ['all'], validade=60, agora=1000).split('.')[0]
+        self.assertIsNone(validar_token('segredo', token, agora=1061))
+        self.assertIsNone(validar_token('outro', token, agora=1000))
+        self.assertIsNone(validar_token('segredo', f'{outra_carga}.{assinatura}', agora=1000))
+        self.assertIsNone(validar_token('segredo', 'lixo', agora=1000))
+        self.assertIsNone(validar_token('segredo', '', agora=1000))
+
+
+class SegredoRealtimeTestCase(SimpleTestCase):
+    """Testes do segredo compartilhado entre o Django e o servidor de tempo real"""
+
+    def test_segredo_vem_do_ambiente_ou_do_secret_key(self):
+        from unittest import mock
+        from realtime_token import derivar_segredo, segredo_configurado
+        with mock.patch.dict(os.environ, {'REALTIME_TOKEN_SECRET': 'explicito', 'SECRET_KEY': 'chave'}):
+            self.assertEqual(segredo_configurado(), 'explicito')
+        with mock.patch.dict(os.environ, {'SECRET_KEY': 'chave'}, clear=True):
+            self.assertEqual(segredo_configurado(), derivar_segredo('chave'))
+            self.assertNotEqual(segredo_configurado(), 'chave')
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(segredo_configurado('chave'), derivar_segredo('chave'))
+            with self.assertRaises(RuntimeError):
+                segredo_configurado()
+
+    def test_assinatura_da_notificacao(self):
+        from realtime_token import (
+            CABECALHO_ASSINATURA, CABECALHO_MOMENTO, cabecalhos_notificacao, validar_notificacao,
+        )
+        cabecalhos = cabecalhos_notificacao('segredo', b'{}', agora=1000)
+        momento, assinatura = cabecalhos[CABECALHO_MOMENTO], cabecalhos[CABECALHO_ASSINATURA]
+        self.assertTrue(validar_notificacao('segredo', b'{}', momento, assinatura, agora=1100))
+        self.assertFalse(validar_notificacao('segredo', b'{"x": 1}', momento, assinatura, agora=1100))
+        self.assertFalse(validar_notificacao('outro', b'{}', momento, assinatura, agora=1100))
+        self.assertFalse(validar_notificacao('segredo', b'{}', momento, assinatura, agora=2000))
+        self.assertFalse(validar_notificacao('segredo', b'{}', None, None))
+
+
+class ExportacaoTestCase(TestCase):
+    """Testes da exportação em streaming (CSV e XLSX)"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Hortifruti')
+        self.gestor = criar_usuario(Role.Gestor, 'exp')
+        self.encarregado = criar_usuario(Role.Encarregado, 'exp', setor=self.setor, first_name='Ana', last_name='Souza')
+        self.outro = criar_usuario(Role.Encarregado, 'exp', setor=self.setor, nome='outro')
+        self.minha = Request.objects.create(requester=self.encarregado, sector=self.setor, urgency=Urgency.URGENTE)
+        RequestItem.objects.create(request=self.minha, item_requested='Banana; prata', quantify=4, category=ItemCategory.LIMPEZA)
+        RequestItem.objects.create(request=self.minha, item_requested='Maçã', quantify=2, category=ItemCategory.LIMPEZA)
+        self.alheia = Request.objects.create(requester=self.outro, sector=self.setor)
+
+    def baixar(self, **params):
+        response = self.client.get(reverse('core:exportar_requisicoes'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def linhas_csv(self, conteudo):
+        import csv
+        texto = conteudo.decode('utf-8')
+        self.assertTrue(texto.startswith('\ufeff'))
+        return list(csv.reader(StringIO(texto[1:]), delimiter=';'))
+
+    def test_csv_uma_linha_por_item_e_regras_de_acesso(self):
+        self.client.force_login(self.gestor)
+        response, conteudo = self.baixar()
+        self.assertIn('attachment;', response['Content-Disposition'])
+        linhas = self.linhas_csv(conteudo)
+        # Cabeçalho, dois itens da primeira requisição e a requisição sem itens
+        self.assertEqual(len(linhas), 4)
+        self.assertEqual(linhas[1][0], self.minha.request_code)
+        self.assertEqual(linhas[1][2], 'Ana Souza')
+        self.assertEqual(linhas[1][7], 'Banana; prata')
+        self.assertEqual(linhas[3][7], '')
+
+        self.client.force_login(self.encarregado)
+        linhas = self.linhas_csv(self.baixar()[1])
+        self.assertEqual({linha[0] for linha in linhas[1:]}, {self.minha.request_code})
+
+    def test_filtros_e_periodo(self):
+        self.client.force_login(self.gestor)
+        linhas = self.linhas_csv(self.baixar(urgency=Urgency.URGENTE)[1])
+        self.assertEqual(len(linhas), 3)
+
+        hoje = timezone.localdate()
+        self.assertEqual(len(self.linhas_csv(self.baixar(data_inicio=hoje.isoformat(), data_fim=hoje.isoformat())[1])), 4)
+        ontem = (hoje - timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.linhas_csv(self.baixar(data_fim=ontem)[1])), 1)
+
+        response = self.client.get(reverse('core:exportar_requisicoes'), {'data_inicio': '31/01/2025'})
+        self.assertRedirects(response, reverse('core:listar_requisicoes'), fetch_redirect_response=False)
+
+    def test_xlsx_valido(self):
+        import zipfile
+        from xml.etree import ElementTree
+
+        self.client.force_login(self.gestor)
+        response, conteudo = self.baixar(formato='xlsx')
+        self.assertTrue(response['Content-Disposition'].endswith('.xlsx"'))
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as arquivo:
+            self.assertIsNone(arquivo.testzip())
+            self.assertIn('[Content_Types].xml', arquivo.namelist())
+            planilha = ElementTree.fromstring(arquivo.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        linhas = planilha.findall('s:sheetData/s:row', ns)
+        self.assertEqual(len(linhas), 4)
+        textos = [t.text for t in linhas[1].iter('{%s}t' % ns['s'])]
+        self.assertIn('Banana; prata', textos)
+
+    def test_xlsx_em_blocos(self):
+        from .exportacao import gerar_xlsx
+
+        linhas = [(f'REQ-{i}', i) for i in range(25)]
+        partes = list(gerar_xlsx(iter(linhas), linhas_por_bloco=10))
+        # Um pedaço por bloco completo, mais o final com o fechamento do zip
+        self.assertEqual(len(partes), 3)
+
+    def test_xlsx_divide_em_abas_no_limite_de_linhas(self):
+        import zipfile
+        from xml.etree import ElementTree
+        from .exportacao import gerar_xlsx
+
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        conteudo = b''.join(gerar_xlsx(iter([(f'REQ-{i}', i) for i in range(25)]), linhas_por_aba=10))
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as arquivo:
+            self.assertIsNone(arquivo.testzip())
+            abas = ElementTree.fromstring(arquivo.read('xl/workbook.xml')).findall('s:sheets/s:sheet', ns)
+            self.assertEqual([aba.get('name') for aba in abas], ['Requisições', 'Requisições 2', 'Requisições 3'])
+            # Cabeçalho repetido em cada aba
+            tamanhos = [
+                len(ElementTree.fromstring(arquivo.read(f'xl/worksheets/sheet{n}.xml')).findall('s:sheetData/s:row', ns))
+                for n in (1, 2, 3)
+            ]
+            self.assertIn('sheet3.xml', arquivo.read('[Content_Types].xml').decode())
+        self.assertEqual(tamanhos, [11, 11, 6])
+
+    def test_csv_neutraliza_formulas(self):
+        RequestItem.objects.create(request=self.minha, item_requested='=HYPERLINK("http://x")', quantify=1,
+                                   category=ItemCategory.LIMPEZA, observacao_item='@SUM(A1)')
+        self.client.force_login(self.gestor)
+        linha = next(l for l in self.linhas_csv(self.baixar()[1]) if 'HYPERLINK' in l[7])
+        self.assertEqual(linha[7], '\'=HYPERLINK("http://x")')
+        self.assertEqual(linha[10], "'@SUM(A1)")
+        self.assertEqual(linha[8], '1')
+
+    def test_comando_grava_arquivo(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'requisicoes.csv')
+            call_command('exportar_requisicoes', '--saida', caminho, '--status', RequestStatus.PENDING, stderr=StringIO())
+            with open(caminho, 'rb') as arquivo:
+                linhas = self.linhas_csv(arquivo.read())
+        self.assertEqual(len(linhas), 4)
+
+    def test_comando_aceita_os_filtros_da_listagem_e_a_saida_do_call_command(self):
+        import zipfile
+        from django.core.management.base import CommandError
+
+        saida = StringIO()
+        call_command('exportar_requisicoes', '--q', 'banana', '--data', timezone.localdate().isoformat(), stdout=saida)
+        linhas = self.linhas_csv(saida.getvalue().encode('utf-8'))
+        self.assertEqual([linha[7] for linha in linhas[1:]], ['Banana; prata', 'Maçã'])
+
+        saida = StringIO()
+        call_command('exportar_requisicoes', '--data', '2000-01-01', stdout=saida)
+        self.assertEqual(len(self.linhas_csv(saida.getvalue().encode('utf-8'))), 1)
+        with self.assertRaises(CommandError):
+            call_command('exportar_requisicoes', '--data', '31/01/2025', stdout=StringIO())
+
+        binario = io.BytesIO()
+        call_command('exportar_requisicoes', '--formato', 'xlsx', '--urgency', Urgency.URGENTE, stdout=binario)
+        with zipfile.ZipFile(io.BytesIO(binario.getvalue())) as arquivo:
+            self.assertIn('xl/worksheets/sheet1.xml', arquivo.namelist())
+
+
+class CargaMassaTestCase(TestCase):
+    """Testes do modo --bulk do gerar_dados_teste"""
+
+    def gerar(self, *args):
+        saida = StringIO()
+        call_command('gerar_dados_teste', '--bulk', '--setores', 'FLV', 'Padaria', 'Loja',
+                     '--dias-atras', '10', *args, stdout=saida)
+        return saida.getvalue()
+
+    def test_gera_lotes_com_codigos_unicos_e_consolidado(self):
+        from . import dashboard_cache
+
+        versao = dashboard_cache.versao_atual()
+        saida = self.gerar('--num-requisicoes', '250', '--tamanho-lote', '100', '--batch-size', '40')
+        self.assertIn('Lote 3/3', saida)
+
+        self.assertEqual(Request.objects.count(), 250)
+        codigos = list(Request.objects.values_list('request_code', flat=True))
+        self.assertNotIn(None, codigos)
+        self.assertEqual(len(set(codigos)), 250)
+        self.assertTrue(RequestItem.objects.exists())
+
+        # Datas geradas preservadas (não sobrescritas por auto_now_add) e dentro do período
+        agora = timezone.now()
+        self.assertFalse(Request.objects.filter(created_at__gt=agora).exists())
+        self.assertFalse(Request.objects.filter(created_at__lt=agora - timedelta(days=11)).exists())
+        self.assertGreater(Request.objects.filter(created_at__lt=agora - timedelta(days=2)).count(), 100)
+
+        # A gravação em massa não passa pelos sinais: o consolidado é reconstruído ao final
+        totais = DailyRequestStats.objects.aggregate(requisicoes=Sum('request_count'), itens=Sum('item_count'))
+        self.assertEqual(totais['requisicoes'], 250)
+        self.assertEqual(totais['itens'], RequestItem.objects.count())
+        self.assertNotEqual(dashboard_cache.versao_atual(), versao)
+
+        # Histórico de status gravado junto, como nas outras formas de gravação
+        eventos = dict(RequestStatusEvent.objects.values_list('action').annotate(total=Count('id')))
+        self.assertEqual(eventos[StatusEventAction.CREATED], 250)
+        self.assertEqual(eventos.get(StatusEventAction.CLAIMED, 0), Request.objects.filter(started_at__isnull=False).count())
+        self.assertEqual(eventos.get(StatusEventAction.FINALIZED, 0), Request.objects.filter(status=RequestStatus.APPROVED).count())
+        self.assertFalse(RequestStatusEvent.objects.filter(action=StatusEventAction.CLAIMED, user__isnull=True).exists())
+
+        # Uma nova requisição continua a numeração do setor
+        setor = Sector.objects.get(name='FLV')
+        nova = Request.objects.create(requester=User.objects.get(username='encarregado_flv_teste'), sector=setor)
+        self.assertNotIn(nova.request_code, codigos)
+
+    def test_rodar_de_novo_com_a_mesma_semente_acrescenta_dados(self):
+        self.gerar('--num-requisicoes', '30', '--tamanho-lote', '20')
+        self.gerar('--num-requisicoes', '30', '--tamanho-lote', '20')
+        self.assertEqual(Request.objects.count(), 60)
+        self.assertEqual(Request.objects.values('request_code').distinct().count(), 60)
+
+    def test_mesma_semente_gera_a_mesma_distribuicao(self):
+        from .carga_massa import PlanoCarga, SetorCarga, gerar_lote
+
+        setores = [SetorCarga(id=uuid.uuid4(), nome=nome, abreviacao=nome[:2], requester_id=uuid.uuid4())
+                   for nome in ('FLV', 'Padaria')]
+        plano = PlanoCarga(total=50, setores=setores, almoxarife_id=uuid.uuid4(), semente=7, tamanho_lote=30)
+        self.assertEqual(plano.num_lotes, 2)
+        self.assertEqual(plano.tamanho(1), 20)
+
+        def resumo(lote):
+            requisicoes, itens = lote
+            return ([(r.sector_id, r.status, r.created_at) for r in requisicoes],
+                    [(i.item_requested, i.quantify) for i in itens])
+
+        self.assertEqual(resumo(gerar_lote(plano, 1)), resumo(gerar_lote(plano, 1)))
+        self.assertNotEqual(resumo(gerar_lote(plano, 0)), resumo(gerar_lote(plano, 1)))
+        # As chaves primárias são novas a cada geração
+        primeiro, segundo = gerar_lote(plano, 1)[0], gerar_lote(plano, 1)[0]
+        self.assertFalse({r.id for r in primeiro} & {r.id for r in segundo})
+
+    def test_processos_usam_o_banco_em_uso_no_processo_principal(self):
+        """Os processos do pool (spawn) gravam no banco atual, não no configurado nas settings"""
+        import sqlite3
+        import tempfile
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+        from unittest import mock
+        from . import carga_massa
+        from .carga_processo import iniciar_processo
+
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'benchmark.sqlite3')
+            with sqlite3.connect(caminho) as banco:
+                banco.execute('CREATE TABLE marcador (valor TEXT)')
+                banco.execute("INSERT INTO marcador VALUES ('banco de benchmark')")
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn'), initializer=iniciar_processo,
+                                     initargs=(caminho,)) as executor:
+                nome, valor = executor.submit(_banco_do_processo).result()
+        self.assertEqual(nome, caminho)
+        self.assertEqual(valor, 'banco de benchmark')
+
+        # executar() repassa aos processos o nome do banco em uso agora
+        plano = carga_massa.PlanoCarga(total=10, setores=[], almoxarife_id=None)
+        with mock.patch.object(carga_massa, 'ProcessPoolExecutor', side_effect=RuntimeError) as pool:
+            with self.assertRaises(RuntimeError):
+                carga_massa.executar(plano, processos=2)
+        self.assertEqual(pool.call_args.kwargs['initargs'], (connection.settings_dict['NAME'],))
+
+
+class BenchmarkViewsTestCase(TestCase):
+    """Testes do comando benchmark_views"""
+
+    def test_relatorio_e_comparacao_com_baseline(self):
+        import json
+        import tempfile
+        from django.core.management.base import CommandError
+
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'benchmark.json')
+            call_command('benchmark_views', '--banco-atual', '--escalas', '30', '--repeticoes', '1',
+                         '--aquecimento', '0', '--saida', saida, stdout=StringIO())
+            with open(saida, encoding='utf-8') as arquivo:
+                relatorio = json.load(arquivo)
+
+            escala = relatorio['escalas']['30']
+            self.assertEqual(escala['requisicoes'], 30)
+            self.assertEqual(Request.objects.count(), 30)
+            for chave in ['listar_requisicoes:Gestor', 'gestor_dashboard:Gestor', 'almoxarife_dashboard:Almoxarife',
+                          'detalhe_requisicao:Encarregado', 'criar_requisicao:Encarregado',
+                          'finalizar_atendimento:Almoxarife', 'proxima_requisicao:Almoxarife']:
+                resultado = escala['cenarios'][chave]
+                self.assertTrue(resultado['ok'], chave)
+                self.assertGreater(resultado['consultas'], 0)
+                self.assertGreater(resultado['pico_memoria_kb'], 0)
+            # Os POSTs medidos são desfeitos
+            self.assertEqual(Request.objects.count(), 30)
+
+            # Baseline com uma consulta a menos em um cenário: regressão e erro
+            cenario = escala['cenarios']['listar_requisicoes:Gestor']
+            cenario['consultas'] -= 1
+            cenario['tempo_mediano_ms'] = cenario['tempo_min_ms'] = cenario['tempo_p95_ms'] = 10 ** 6
+            baseline = os.path.join(pasta, 'baseline.json')
+            with open(baseline, 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo)
+            with self.assertRaises(CommandError):
+                call_command('benchmark_views', '--banco-atual', '--escalas', '30', '--repeticoes', '1',
+                             '--aquecimento', '0', '--saida', saida, '--baseline', baseline, stdout=StringIO())
+
+    def test_comparar_tempo_consultas_e_falhas(self):
+        from .benchmark import comparar
+
+        def relatorio(tempo, consultas, ok=True):
+            return {'escalas': {'100': {'cenarios': {'dashboard:Gestor': {
+                'tempo_mediano_ms': tempo, 'consultas': consultas, 'ok': ok,
+            }}}}}
+
+        base = relatorio(100, 5)
+        self.assertEqual(comparar(relatorio(120, 5), base), [])
+        self.assertEqual([r['metrica'] for r in comparar(relatorio(130, 5), base)], ['tempo_mediano_ms'])
+        self.assertEqual([r['metrica'] for r in comparar(relatorio(100, 6), base)], ['consultas'])
+        self.assertEqual([r['metrica'] for r in comparar(relatorio(100, 5, ok=False), base)], ['ok'])
+        # Variação pequena em view rápida é ruído
+        self.assertEqual(comparar(relatorio(4, 1), relatorio(2, 1)), [])
+
+
+class MetricasTestCase(TestCase):
+    """Testes das métricas no formato do Prometheus (Django e servidor de tempo real)"""
+
+    def setUp(self):
+        self.gestor = criar_usuario(Role.Gestor, 'metricas')
+
+    def test_registro_soma_threads_e_exporta_histograma(self):
+        from metricas_prometheus import Registro
+
+        registro = Registro()
+        registro.contador('eventos_total', 'Eventos')
+        registro.histograma('latencia_segundos', 'Latência', buckets=(0.1, 1))
+
+        def trabalhar():
+            for _ in range(1000):
+                registro.incrementar('eventos_total', view='a"b')
+        threads = [threading.Thread(target=trabalhar) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for valor in (0.05, 0.1, 0.5, 3):
+            registro.observar('latencia_segundos', valor, view='x')
+        registro.medidor('conectados', 'Conexões', lambda: 7)
+
+        texto = registro.exportar()
+        self.assertIn('# TYPE eventos_total counter', texto)
+        self.assertIn('eventos_total{view="a\\"b"} 4000', texto)
+        self.assertIn('latencia_segundos_bucket{view="x",le="0.1"} 2', texto)
+        self.assertIn('latencia_segundos_bucket{view="x",le="1"} 3', texto)
+        self.assertIn('latencia_segundos_bucket{view="x",le="+Inf"} 4', texto)
+        self.assertIn('latencia_segundos_count{view="x"} 4', texto)
+        self.assertIn('latencia_segundos_sum{view="x"} 3.65', texto)
+        self.assertIn('# TYPE conectados gauge\nconectados 7', texto)
+
+    def test_endpoint_protegido_com_metricas_por_view(self):
+        from django.test import override_settings
+
+        self.client.force_login(self.gestor)
+        self.assertEqual(self.client.get(reverse('core:listar_requisicoes')).status_code, 200)
+        self.client.logout()
+
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        with override_settings(METRICS_TOKEN='segredo'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer errado').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer segredo')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        texto = response.content.decode()
+        self.assertIn('django_http_requests_total{method="GET",status="200",view="core:listar_requisicoes"}', texto)
+        self.assertIn('django_http_request_duration_seconds_count{view="core:listar_requisicoes"}', texto)
+        self.assertIn('django_db_queries_total{view="core:listar_requisicoes"}', texto)
+        self.assertIn('django_template_render_seconds_total{view="core:listar_requisicoes"}', texto)
+        # Caminhos sem rota não criam uma série por URL
+        self.client.get('/nao-existe/123/')
+        self.client.get('/nao-existe/456/')
+        with override_settings(METRICS_TOKEN='segredo'):
+            texto = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer segredo').content.decode()
+        self.assertNotIn('nao-existe', texto)
+        self.assertIn('view="<sem_rota>"', texto)
+
+        superusuario = User.objects.create_superuser(username='admin_metricas', email='admin@test.com', password='x')
+        self.client.force_login(superusuario)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_registro_descarta_fragmentos_de_threads_encerradas(self):
+        from metricas_prometheus import Registro
+
+        registro = Registro()
+        registro.contador('eventos_total', 'Eventos')
+        for _ in range(20):
+            thread = threading.Thread(target=registro.incrementar, args=('eventos_total',))
+            thread.start()
+            thread.join()
+        registro.incrementar('eventos_total')
+        self.assertEqual(registro.valores(), {('eventos_total', ()): 21})
+        # Só o fragmento da thread atual continua na lista
+        self.assertEqual(len(registro._fragmentos), 1)
+
+    def test_streaming_medido_ate_o_fim_do_corpo(self):
+        from .monitoramento import registro
+
+        def consultas_da_exportacao():
+            return registro.valores().get(('django_db_queries_total', (('view', 'core:exportar_requisicoes'),)), 0)
+
+        def atendidas():
+            chave = ('django_http_request_duration_seconds', (('view', 'core:exportar_requisicoes'),))
+            return registro.valores().get(chave, [0])[-1]
+
+        antes, atendidas_antes = consultas_da_exportacao(), atendidas()
+        self.client.force_login(self.gestor)
+        response = self.client.get(reverse('core:exportar_requisicoes'))
+        self.assertEqual(atendidas(), atendidas_antes)
+        b''.join(response.streaming_content)
+        # As consultas feitas enquanto o corpo era gerado entram na conta da view
+        self.assertGreater(consultas_da_exportacao(), antes)
+        self.assertEqual(atendidas(), atendidas_antes + 1)
+
+    def test_metricas_do_servidor_de_tempo_real(self):
+        from unittest import mock
+        from fastapi.testclient import TestClient
+        from realtime_token import cabecalhos_notificacao
+        with mock.patch.dict(os.environ, {'REALTIME_TOKEN_SECRET': 'segredo-teste'}):
+            import realtime_server
+
+        corpo = b'{"events": [{"action": "created", "topics": ["all"]}]}'
+        with TestClient(realtime_server.app) as client, \
+                mock.patch.object(realtime_server, 'SEGREDO_TOKEN', 'segredo-teste'):
+            self.assertEqual(client.get('/metrics').status_code, 401)
+            # Sem assinatura, ou assinado com outro segredo, o /notify recusa o evento
+            self.assertEqual(client.post('/notify', content=corpo).status_code, 401)
+            self.assertEqual(client.post('/notify', content=corpo,
+                                         headers=cabecalhos_notificacao('outro', corpo)).status_code, 401)
+            response = client.post('/notify', content=corpo, headers=cabecalhos_notificacao('segredo-teste', corpo))
+            self.assertEqual(response.json()['events'], 1)
+            # Lote vazio: nada é distribuído (o envelope não vira um evento)
+            vazio = b'{"events": []}'
+            with mock.patch.object(realtime_server, 'broadcast_update') as broadcast:
+                response = client.post('/notify', content=vazio, headers=cabecalhos_notificacao('segredo-teste', vazio))
+            self.assertEqual(response.json()['events'], 0)
+            broadcast.assert_not_called()
+            with mock.patch.object(realtime_server, 'METRICS_TOKEN', 'segredo'):
+                response = client.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+        self.assertEqual(response.status_code, 200)
+        texto = response.text
+        self.assertIn('realtime_notificacoes_total', texto)
+        self.assertIn('realtime_broadcasts_total', texto)
+        self.assertIn('realtime_clientes_conectados 0', texto)
+        self.assertIn('# TYPE realtime_envio_segundos histogram', texto)
+
+
+class BuscaTestCase(TestCase):
+    """Testes da busca textual (FTS5 no SQLite, tsvector/pg_trgm no PostgreSQL)"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Laboratório')
+        self.gestor = criar_usuario(Role.Gestor, 'busca', superusuario=True)
+        self.encarregado = criar_usuario(Role.Encarregado, 'busca', setor=self.setor)
+        self.outro = criar_usuario(Role.Encarregado, 'busca', setor=self.setor, nome='outro')
+        self.luvas = Request.objects.create(requester=self.encarregado, sector=self.setor, observations='Reposição semanal')
+        self.item_luvas = RequestItem.objects.create(
+            request=self.luvas, item_requested='Luvas nitrílicas', quantify=10,
+            category=ItemCategory.LIMPEZA, observacao_item='tamanho médio'
+        )
+        self.papel = Request.objects.create(requester=self.outro, sector=self.setor, observations='Para a secretaria')
+        RequestItem.objects.create(request=self.papel, item_requested='Papel A4', quantify=5, category=ItemCategory.ADMINISTRATIVO)
+
+    def ids(self, texto, usuario=None):
+        queryset = requisicoes_visiveis(usuario or self.gestor)
+        return {requisicao.pk for requisicao in buscar(queryset, texto)}
+
+    def test_sem_acentos_por_prefixo_e_em_todos_os_campos(self):
+        self.assertEqual(self.ids('luvas nitr'), {self.luvas.pk})
+        self.assertEqual(self.ids('NITRILICAS'), {self.luvas.pk})
+        self.assertEqual(self.ids('reposicao'), {self.luvas.pk})
+        self.assertEqual(self.ids('medio'), {self.luvas.pk})
+        self.assertEqual(self.ids(self.papel.request_code), {self.papel.pk})
+        self.assertEqual(self.ids('luvas papel'), set())
+        self.assertEqual(buscar(Request.objects.all(), '  '), [])
+
+    def test_respeita_visibilidade_e_filtros(self):
+        self.assertEqual(self.ids('papel', self.encarregado), set())
+        self.assertEqual(self.ids('luvas', self.encarregado), {self.luvas.pk})
+        filtrado = filtrar_por_busca(Request.objects.filter(status=RequestStatus.APPROVED), 'luvas')
+        self.assertFalse(filtrado.exists())
+
+    def test_indice_acompanha_edicoes_e_gravacoes_em_massa(self):
+        self.item_luvas.item_requested = 'Máscaras descartáveis'
+        self.item_luvas.save()
+        self.assertEqual(self.ids('luvas'), set())
+        self.assertEqual(self.ids('mascaras'), {self.luvas.pk})
+
+        self.item_luvas.delete()
+        self.assertEqual(self.ids('mascaras'), set())
+
+        Request.objects.filter(pk=self.papel.pk).update(observations='Urgente para o almoxarifado')
+        self.assertEqual(self.ids('almoxarifado'), {self.papel.pk})
+
+        nova = Request.objects.create(requester=self.outro, sector=self.setor)
+        RequestItem.objects.bulk_create([
+            RequestItem(request=nova, item_requested='Álcool em gel', quantify=3, category=ItemCategory.LIMPEZA),
+        ])
+        self.assertEqual(self.ids('alcool gel'), {nova.pk})
+
+        nova.delete()
+        self.assertEqual(self.ids('alcool'), set())
+
+    def test_itens_em_massa_recalculam_a_requisicao_uma_vez(self):
+        """Gravar n itens não recalcula a linha da busca n vezes"""
+        from .busca import backend
+
+        if backend() != 'sqlite':
+            self.skipTest('Triggers por comando só no PostgreSQL; aqui os itens marcam a requisição como pendente')
+        nova = Request.objects.create(requester=self.outro, sector=self.setor)
+        RequestItem.objects.bulk_create([
+            RequestItem(request=nova, item_requested=f'Ponteira {i}', quantify=1, category=ItemCategory.LIMPEZA)
+            for i in range(50)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM core_busca_pendente WHERE request_id = %s', [nova.pk.hex])
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(self.ids('ponteira 49'), {nova.pk})
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM core_busca_pendente')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_listagem_e_admin(self):
+        self.client.force_login(self.gestor)
+        response = self.client.get(reverse('core:listar_requisicoes'), {'q': 'nitrilicas'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r.pk for r in response.context['requisicoes']], [self.luvas.pk])
+        self.assertNotContains(response, 'data-inserir')
+
+        response = self.client.get(reverse('core:listar_requisicoes'), {'q': 'nitrilicas', 'fragmento': '1'})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(reverse('admin:core_request_changelist'), {'q': 'nitrilicas'})
+        self.assertEqual(list(response.context['cl'].queryset), [self.luvas])
+
+        # O admin não soma icontains à busca indexada
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:core_request_changelist'), {'q': self.luvas.request_code})
+        self.assertEqual(list(response.context['cl'].queryset), [self.luvas])
+        self.assertFalse([q for q in queries if 'LIKE' in q['sql'] and 'core_request' in q['sql']])
+
+
+class CatalogoItensTestCase(TestCase):
+    """Testes do catálogo de itens: normalização, carga a partir dos textos livres e autocompletar"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='ADM')
+        self.encarregado = criar_usuario(Role.Encarregado, 'cat', setor=self.setor)
+        self.requisicao = Request.objects.create(requester=self.encarregado, sector=self.setor)
+        for nome in ('Papel A4', 'Papel A4', 'papel a4', 'PAPEL A-4', 'Caneta azul'):
+            RequestItem.objects.create(request=self.requisicao, item_requested=nome, quantify=1, category=ItemCategory.ADMINISTRATIVO)
+
+    def test_normalizacao(self):
+        self.assertEqual(normalizar_nome_item('PAPEL A-4'), 'papel a4')
+        self.assertEqual(normalizar_nome_item('  Sabão   em pó; 1kg '), 'sabao em po 1kg')
+        self.assertEqual(normalizar_nome_item('Fita 3.5 cm'), 'fita 35 cm')
+        self.assertEqual(normalizar_nome_item('!!'), '')
+
+    def test_carga_agrupa_variacoes_e_vincula(self):
+        saida = StringIO()
+        call_command('popular_catalogo_itens', stdout=saida)
+        self.assertEqual(Item.objects.count(), 2)
+        papel = Item.objects.get(normalized_name='papel a4')
+        # Nome exibido: a variação mais usada
+        self.assertEqual(papel.name, 'Papel A4')
+        self.assertEqual(papel.category, ItemCategory.ADMINISTRATIVO)
+        self.assertEqual(papel.request_items.count(), 4)
+        self.assertFalse(RequestItem.objects.filter(item__isnull=True).exists())
+
+        # Rodar de novo não cria nada
+        self.assertEqual(catalogo.popular_catalogo(), (2, 0, 0))
+
+        # Itens novos já entram vinculados ao catálogo
+        novo = RequestItem.objects.create(request=self.requisicao, item_requested='papel  A4', quantify=2, category=ItemCategory.ADMINISTRATIVO)
+        self.assertEqual(novo.item, papel)
+
+    def test_autocompletar_por_prefixo_e_indice_atualizado(self):
+        catalogo.popular_catalogo()
+        self.client.force_login(self.encarregado)
+        url = reverse('core:autocompletar_itens')
+
+        response = self.client.get(url, {'q': 'pap'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['nome'] for item in response.json()['itens']], ['Papel A4'])
+        # Também pelo começo de uma palavra do meio
+        self.assertEqual([item['nome'] for item in self.client.get(url, {'q': 'azu'}).json()['itens']], ['Caneta azul'])
+
+        # Consultas seguintes vêm do índice em memória
+        with self.assertNumQueries(0):
+            catalogo.sugerir('can')
+
+        # O navegador revalida pelo ETag: 304 até o catálogo mudar
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, {'q': 'pap'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Item.objects.create(name='Caneta preta', category=ItemCategory.ADMINISTRATIVO)
+        response = self.client.get(url, {'q': 'pap'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        nomes = [item['nome'] for item in catalogo.sugerir('caneta')]
+        # Mais usada primeiro
+        self.assertEqual(nomes, ['Caneta azul', 'Caneta preta'])
+
+        Item.objects.filter(name='Caneta preta').update(is_active=False)
+        catalogo.invalidar()
+        self.assertEqual([item['nome'] for item in catalogo.sugerir('caneta')], ['Caneta azul'])
+
+
+class AssumirRequisicaoTestCase(TestCase):
+    """Testes da troca PENDING -> EM_ATENDIMENTO por UPDATE condicional"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Padaria')
+        self.encarregado = criar_usuario(Role.Encarregado, 'claim', setor=self.setor)
+        self.almoxarife = criar_usuario(Role.Almoxarife, 'claim', first_name='Rui')
+        self.colega = criar_usuario(Role.Almoxarife, 'claim', nome='colega')
+        self.requisicao = Request.objects.create(requester=self.encarregado, sector=self.setor, urgency=Urgency.URGENTE)
+        RequestItem.objects.create(request=self.requisicao, item_requested='Farinha', quantify=2, category=ItemCategory.INSUMO_PRODUCAO)
+
+    def test_so_o_primeiro_assume_e_so_as_colunas_alteradas_sao_gravadas(self):
+        with CaptureQueriesContext(connection) as queries:
+            assumida = assumir_requisicao(self.requisicao.pk, self.almoxarife)
+        self.assertEqual(assumida.status, RequestStatus.EM_ATENDIMENTO)
+        self.assertEqual(assumida.atendido_por, self.almoxarife)
+        update = next(q['sql'] for q in queries if q['sql'].startswith('UPDATE "core_request"'))
+        self.assertNotIn('"observations"', update)
+        self.assertIn('"status" =', update.split('WHERE')[1])
+
+        self.assertIsNone(assumir_requisicao(self.requisicao.pk, self.colega))
+        self.assertIsNone(assumir_requisicao(uuid.uuid4(), self.colega))
+        self.requisicao.refresh_from_db()
+        self.assertEqual(self.requisicao.atendido_por, self.almoxarife)
+
+        # Consolidado movido sem passar pelos sinais
+        contagens = DailyRequestStats.objects.values('status').annotate(
+            requisicoes=Sum('request_count'), itens=Sum('item_count')
+        ).filter(Q(requisicoes__gt=0) | Q(itens__gt=0))
+        self.assertEqual(
+            [(linha['status'], linha['requisicoes'], linha['itens']) for linha in contagens],
+            [(RequestStatus.EM_ATENDIMENTO, 1, 1)],
+        )
+
+    def test_get_nao_assume_e_post_assume(self):
+        url_atender = reverse('core:almoxarife_atender_requisicao', args=[self.requisicao.pk])
+        url_iniciar = reverse('core:iniciar_atendimento_requisicao', args=[self.requisicao.pk])
+
+        self.client.force_login(self.almoxarife)
+        response = self.client.get(url_atender)
+        self.assertContains(response, url_iniciar)
+        self.assertNotContains(response, 'Finalizar Atendimento')
+        self.requisicao.refresh_from_db()
+        self.assertEqual(self.requisicao.status, RequestStatus.PENDING)
+
+        self.assertRedirects(self.client.post(url_iniciar), url_atender)
+        self.assertContains(self.client.get(url_atender), 'Finalizar Atendimento')
+        # Repetir o POST (ex.: duplo clique) só leva de volta ao atendimento
+        self.assertRedirects(self.client.post(url_iniciar), url_atender)
+
+        self.client.force_login(self.colega)
+        response = self.client.post(url_iniciar, follow=True)
+        self.assertRedirects(response, reverse('core:listar_requisicoes'))
+        self.assertContains(response, 'já está sendo atendida por Rui')
+
+
+class AssumirRequisicaoConcorrenteTestCase(TransactionTestCase):
+    """Vários almoxarifes tentando assumir a mesma requisição ao mesmo tempo, em threads com conexões próprias"""
+
+    THREADS = 8
+
+    def test_apenas_um_vence(self):
+        from django.db import OperationalError, connections
+        from . import notifications
+
+        setor = Sector.objects.create(name='Frios')
+        encarregado = criar_usuario(Role.Encarregado, 'corrida', setor=setor)
+        almoxarifes = [
+            criar_usuario(Role.Almoxarife, f'corrida_{i}')
+            for i in range(self.THREADS)
+        ]
+        requisicao = Request.objects.create(requester=encarregado, sector=setor)
+
+        recebidos = []
+        falso = type('DispatcherFalso', (), {'enfileirar': lambda self, evento: recebidos.append(evento)})()
+        original = notifications._dispatcher
+        notifications._dispatcher = falso
+
+        largada = threading.Barrier(self.THREADS)
+        vencedores = []
+        erros = []
+
+        def tentar(usuario):
+            try:
+                largada.wait()
+                for _ in range(50):
+                    try:
+                        if assumir_requisicao(requisicao.pk, usuario) is not None:
+                            vencedores.append(usuario)
+                        return
+                    except OperationalError:
+                        # SQLite trava o banco inteiro na escrita; o PostgreSQL espera pela linha
+                        time.sleep(0.01)
+                erros.append('banco travado')
+            except Exception as exc:
+                erros.append(exc)
+            finally:
+                connections.close_all()
+
+        try:
+            threads = [threading.Thread(target=tentar, args=(usuario,)) for usuario in almoxarifes]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            notifications._dispatcher = original
+
+        self.assertEqual(erros, [])
+        self.assertEqual(len(vencedores), 1)
+        requisicao.refresh_from_db()
+        self.assertEqual(requisicao.status, RequestStatus.EM_ATENDIMENTO)
+        self.assertEqual(requisicao.atendido_por, vencedores[0])
+        self.assertEqual([evento['action'] for evento in recebidos], ['claimed'])
+        self.assertEqual(
+            list(DailyRequestStats.objects.filter(request_count__gt=0).values_list('status', 'request_count')),
+            [(RequestStatus.EM_ATENDIMENTO, 1)],
+        )
+
+
+class FilaAtendimentoTestCase(TestCase):
+    """Testes da fila de atendimento (próxima requisição por urgência, idade e setor)"""
+
+    def setUp(self):
+        self.frios = Sector.objects.create(name='Frios')
+        self.padaria = Sector.objects.create(name='Padaria')
+        self.encarregado = criar_usuario(Role.Encarregado, 'fila', setor=self.frios)
+        self.almoxarife = criar_usuario(Role.Almoxarife, 'fila')
+
+    def criar(self, setor, urgencia, horas_atras):
+        requisicao = Request.objects.create(requester=self.encarregado, sector=setor, urgency=urgencia)
+        Request.objects.filter(pk=requisicao.pk).update(created_at=timezone.now() - timedelta(hours=horas_atras))
+        return requisicao
+
+    def test_urgentes_primeiro_depois_as_mais_antigas(self):
+        normal_antiga = self.criar(self.frios, Urgency.NORMAL, 10)
+        urgente_nova = self.criar(self.frios, Urgency.URGENTE, 1)
+        urgente_antiga = self.criar(self.padaria, Urgency.URGENTE, 5)
+        normal_nova = self.criar(self.padaria, Urgency.NORMAL, 2)
+
+        ordem = [proxima_requisicao(self.almoxarife) for _ in range(4)]
+        self.assertEqual([r.pk for r in ordem], [urgente_antiga.pk, urgente_nova.pk, normal_antiga.pk, normal_nova.pk])
+        self.assertTrue(all(r.status == RequestStatus.EM_ATENDIMENTO for r in ordem))
+        self.assertIsNone(proxima_requisicao(self.almoxarife))
+
+    def test_afinidade_de_setor_so_dentro_da_mesma_urgencia(self):
+        urgente_frios = self.criar(self.frios, Urgency.URGENTE, 5)
+        urgente_padaria = self.criar(self.padaria, Urgency.URGENTE, 1)
+        normal_padaria = self.criar(self.padaria, Urgency.NORMAL, 10)
+
+        self.assertEqual(proxima_requisicao(self.almoxarife, setor_id=self.padaria.pk), urgente_padaria)
+        # A urgente de outro setor ainda passa na frente da normal do setor preferido
+        self.assertEqual(proxima_requisicao(self.almoxarife, setor_id=self.padaria.pk), urgente_frios)
+        self.assertEqual(proxima_requisicao(self.almoxarife, setor_id=self.padaria.pk), normal_padaria)
+
+    def test_consultas_nao_crescem_com_a_fila(self):
+        def consultas_para_despachar():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertIsNotNone(proxima_requisicao(self.almoxarife, setor_id=self.padaria.pk))
+            return len(queries)
+
+        def criar_pendentes(quantidade):
+            for _ in range(quantidade):
+                Request.objects.create(requester=self.encarregado, sector=self.frios)
+
+        # A primeira cria as linhas do consolidado; mede a partir da segunda
+        criar_pendentes(2)
+        consultas_para_despachar()
+        poucas = consultas_para_despachar()
+        criar_pendentes(30)
+        self.assertEqual(consultas_para_despachar(), poucas)
+
+    def test_endpoint_e_dashboard_na_ordem_da_fila(self):
+        normal = self.criar(self.frios, Urgency.NORMAL, 10)
+        urgente = self.criar(self.frios, Urgency.URGENTE, 1)
+        self.client.force_login(self.almoxarife)
+
+        response = self.client.get(reverse('core:almoxarife_dashboard'))
+        self.assertEqual([r.pk for r in response.context['requisicoes_pendentes']], [urgente.pk, normal.pk])
+
+        url = reverse('core:almoxarife_proxima_requisicao')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertRedirects(self.client.post(url, {'setor': 'invalido'}),
+                             reverse('core:almoxarife_atender_requisicao', args=[urgente.pk]))
+        self.assertRedirects(self.client.post(url), reverse('core:almoxarife_atender_requisicao', args=[normal.pk]))
+        self.assertRedirects(self.client.post(url), reverse('core:almoxarife_dashboard'))
+
+
+class FilaAtendimentoConcorrenteTestCase(TransactionTestCase):
+    """Vários almoxarifes puxando a próxima da fila ao mesmo tempo"""
+
+    THREADS = 6
+
+    def test_cada_requisicao_vai_para_um_so_almoxarife(self):
+        from django.db import OperationalError, connections
+        from . import notifications
+
+        setor = Sector.objects.create(name='Açougue')
+        encarregado = criar_usuario(Role.Encarregado, 'fila_c', setor=setor)
+        almoxarifes = [
+            criar_usuario(Role.Almoxarife, f'fila_{i}')
+            for i in range(self.THREADS)
+        ]
+        pendentes = {Request.objects.create(requester=encarregado, sector=setor).pk for _ in range(self.THREADS - 2)}
+
+        original = notifications._dispatcher
+        notifications._dispatcher = type('DispatcherFalso', (), {'enfileirar': lambda self, evento: None})()
+        largada = threading.Barrier(self.THREADS)
+        resultados = []
+        erros = []
+
+        def puxar(usuario):
+            try:
+                largada.wait()
+                for _ in range(50):
+                    try:
+                        requisicao = proxima_requisicao(usuario)
+                        resultados.append(requisicao.pk if requisicao else None)
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+                erros.append('banco travado')
+            except Exception as exc:
+                erros.append(exc)
+            finally:
+                connections.close_all()
+
+        try:
+            threads = [threading.Thread(target=puxar, args=(usuario,)) for usuario in almoxarifes]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            notifications._dispatcher = original
+
+        self.assertEqual(erros, [])
+        atendidas = [pk for pk in resultados if pk is not None]
+        self.assertEqual(sorted(atendidas), sorted(pendentes))
+        self.assertEqual(resultados.count(None), 2)
+        self.assertFalse(Request.objects.filter(status=RequestStatus.PENDING).exists())
+
+
+class HistoricoStatusTestCase(TestCase):
+    """Testes do histórico de status e das durações de SLA gravadas na requisição"""
+
+    def setUp(self):
+        self.setor = Sector.objects.create(name='Açougue')
+        self.encarregado = criar_usuario(Role.Encarregado, 'sla', setor=self.setor)
+        self.almoxarife = criar_usuario(Role.Almoxarife, 'sla')
+        self.requisicao = Request.objects.create(requester=self.encarregado, sector=self.setor)
+        self.item = RequestItem.objects.create(request=self.requisicao, item_requested='Bandeja', quantify=4,
+                                               category=ItemCategory.EMBALAGENS)
+
+    def eventos(self):
+        return list(self.requisicao.status_events.order_by('created_at', 'id')
+                    .values_list('action', 'from_status', 'to_status', 'user__username'))
+
+    def test_ciclo_completo_gera_eventos_e_duracoes(self):
+        self.assertIsNone(self.requisicao.started_at)
+        self.assertIsNone(self.requisicao.wait_seconds)
+
+        criada = timezone.now() - timedelta(hours=3)
+        Request.objects.filter(pk=self.requisicao.pk).update(created_at=criada)
+        self.requisicao.refresh_from_db()
+        assumir_requisicao(self.requisicao.pk, self.almoxarife)
+
+        self.client.force_login(self.almoxarife)
+        response = self.client.post(
+            reverse('core:almoxarife_atender_requisicao', args=[self.requisicao.pk]),
+            {'item_id': [str(self.item.pk)], 'quantidade_atendida': ['4'], 'observacao_item': [''],
+             'action': 'finalizar'},
+        )
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(self.eventos(), [
+            (StatusEventAction.CREATED, '', RequestStatus.PENDING, 'encarregado_sla'),
+            (StatusEventAction.CLAIMED, RequestStatus.PENDING, RequestStatus.EM_ATENDIMENTO, 'almoxarife_sla'),
+            (StatusEventAction.FINALIZED, RequestStatus.EM_ATENDIMENTO, RequestStatus.APPROVED, 'almoxarife_sla'),
+        ])
+        self.requisicao.refresh_from_db()
+        self.assertEqual(self.requisicao.status, RequestStatus.APPROVED)
+        self.assertAlmostEqual(self.requisicao.wait_seconds, 3 * 3600, delta=5)
+        self.assertLess(self.requisicao.service_seconds, 5)
+        self.assertEqual(self.requisicao.finished_at, self.requisicao.status_events.get(
+            action=StatusEventAction.FINALIZED).created_at)
+
+    def test_save_com_update_fields_grava_os_marcos(self):
+        self.requisicao.status = RequestStatus.EM_ATENDIMENTO
+        self.requisicao.save(update_fields=['status'])
+        self.requisicao.refresh_from_db()
+        self.assertIsNotNone(self.requisicao.started_at)
+        self.assertIsNotNone(self.requisicao.wait_seconds)
+
+        self.requisicao.status = RequestStatus.APPROVED
+        self.requisicao.save(update_fields=['status'])
+        self.requisicao.refresh_from_db()
+        self.assertIsNotNone(self.requisicao.finished_at)
+        self.assertIsNotNone(self.requisicao.service_seconds)
+
+    def test_save_sem_troca_de_status_nao_gera_evento(self):
+        self.requisicao.observations = 'Só a observação mudou'
+        self.requisicao.save()
+        self.assertEqual(len(self.eventos()), 1)
+
+    def test_eventos_sao_somente_de_insercao(self):
+        evento = self.requisicao.status_events.get()
+        evento.to_status = RequestStatus.APPROVED
+        with self.assertRaises(ValueError):
+            evento.save()
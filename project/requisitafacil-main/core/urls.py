@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'core'
 
@@ -9,14 +9,23 @@ urlpatterns = [
     path('', views.home_view, name='home'),
     path('requisicoes/criar/',views.criar_requisicao,name='criar_requisicao'),
     path('requisicoes/',views.listar_requisicoes,name='listar_requisicoes'),
+    path('requisicoes/exportar/', views.exportar_requisicoes, name='exportar_requisicoes'),
     path('requisicoes/<uuid:pk>/',views.detalhe_requisicao,name='detalhe_requisicao'),
     path('requisicoes/<uuid:pk>/excluir/',views.excluir_requisicao,name='excluir_requisicao'),
     path('requisicao/<uuid:pk>/iniciar-atendimento/', views.iniciar_atendimento_requisicao, name='iniciar_atendimento_requisicao'),
     path('usuarios/criar/', views.criar_usuario, name='criar_usuario'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('almoxarife/dashboard/', views.almoxarife_dashboard, name='almoxarife_dashboard'),
+    path('almoxarife/proxima/', views.almoxarife_proxima_requisicao, name='almoxarife_proxima_requisicao'),
     path('almoxarife/atender_requisicao/<uuid:pk>/', views.almoxarife_atender_requisicao, name='almoxarife_atender_requisicao'),
     path('gestor/dashboard/', views.gestor_dashboard, name='gestor_dashboard'),
+    path('gestor/dashboard/dados/', views.gestor_dashboard_dados, name='gestor_dashboard_dados'),
+    path('realtime/token/', views.realtime_token, name='realtime_token'),
+    path('itens/autocompletar/', views.autocompletar_itens, name='autocompletar_itens'),
+    # API JSON somente leitura
+    path('api/requisicoes/', api.api_requisicoes, name='api_requisicoes'),
+    path('api/requisicoes/<uuid:pk>/', api.api_requisicao, name='api_requisicao'),
+    path('api/requisicoes/<uuid:pk>/itens/', api.api_itens_requisicao, name='api_itens_requisicao'),
     path('configuracoes/usuarios/', views.usuarios_list, name='usuarios_list'),
     path('configuracoes/usuarios/novo/', views.usuario_create, name='usuario_create'),
     path('configuracoes/usuarios/<uuid:user_id>/editar/', views.usuario_edit, name='usuario_edit'),
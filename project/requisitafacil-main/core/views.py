@@ -1,18 +1,30 @@
 from django.shortcuts import render,redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Count, Q, ExpressionWrapper, F, Avg, DurationField, DateField, DateTimeField
-from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 from django.utils import timezone
 from django.db import transaction
 from .forms import RequestForm, CustomUserCreationForm, RequestItemFormSet
-from .models import Request, Role, RequestStatus, RequestItem
+from .models import Request, Role, RequestStatus, RequestItem, Urgency
 from django.contrib.auth import get_user_model
-from django.db.models.functions import TruncDate
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from .dashboard_metrics import calcular_metricas_gestor
+from .queries import filtrar_requisicoes, requisicoes_para_listagem, requisicoes_visiveis, no_dia, no_mes
+from .pagination import PaginaCursor, paginar_por_cursor
+from .fragmentos import pede_fragmento, responder_fragmento
+from .dashboard_cache import contexto_em_cache
+from .exportacao import FORMATOS, filtrar_exportacao, linhas_exportacao
+from .busca import buscar, filtrar_por_busca
+from . import catalogo, daily_stats
+from .atendimento import assumir_requisicao
+from .fila import fila_pendente, proxima_requisicao
 
 from django.views.decorators.http import require_POST
-import requests
+from .notifications import evento_requisicao, notificar, token_realtime
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
 
 # --- Funções Auxiliares de Permissão ---
 # Usamos essas funções para verificar o papel do usuário logado
@@ -48,7 +60,8 @@ def criar_requisicao(request):
         formset = RequestItemFormSet(request.POST, request.FILES)
 
         if form.is_valid() and formset.is_valid():
-            with transaction.atomic():
+            # Consolidado diário ajustado uma vez por linha, não uma vez por item salvo
+            with transaction.atomic(), daily_stats.agrupar_ajustes():
                 requisicao = form.save(commit=False)
                 requisicao.requester = request.user
 
@@ -64,14 +77,8 @@ def criar_requisicao(request):
                 formset.instance = requisicao
                 formset.save()
 
-            # Notifica FastAPI para atualizar clientes
-            try:
-                response = requests.post('http://localhost:8001/notify', 
-                                      json={"action": "created", "message": "Nova requisição criada"})
-                print(f"Notificação enviada: {response.status_code}")
-            except Exception as e:
-                print(f"Erro ao enviar notificação: {e}")
-                pass
+                # Notifica FastAPI para atualizar clientes (enviado em segundo plano, após o commit)
+                notificar(evento_requisicao('created', requisicao))
 
             messages.success(request, 'Requisição criada com sucesso!')
             return redirect('core:listar_requisicoes')
@@ -87,35 +94,72 @@ def criar_requisicao(request):
 
 @login_required
 def listar_requisicoes(request):
-    #Define o queryset base para as requisições
-    if is_gestor(request.user):
-        requisicoes_querysets = Request.objects.all()
-    elif is_almoxarife(request.user):
-        requisicoes_querysets = Request.objects.all()
-    elif request.user.role == Role.Encarregado:
-        requisicoes_querysets = Request.objects.filter(requester=request.user)
-    else:
-        requisicoes_querysets = Request.objects.filter(requester=request.user)
-
-    
+    # Gestor e Almoxarife veem todas as requisições; os demais, só as próprias
+    requisicoes_querysets = filtrar_requisicoes(
+        requisicoes_para_listagem(requisicoes_visiveis(request.user)), request.GET
+    )
     status_filter = request.GET.get('status')
-    if status_filter and status_filter in RequestStatus.values:
-        requisicoes_querysets = requisicoes_querysets.filter(status=status_filter)
+    urgency_filter = request.GET.get('urgency')
+    busca = request.GET.get('q', '').strip()
 
-    # Filtro por data (opcional, se já existir no template)
-    data_filter = request.GET.get('data')
-    if data_filter:
-        requisicoes_querysets = requisicoes_querysets.filter(created_at__date=data_filter)
+    if busca:
+        # Busca textual: resultados por relevância, numa página só (sem cursores)
+        visiveis = requisicoes_querysets
+        requisicoes_querysets = filtrar_por_busca(visiveis, busca)
 
-    requisicoes = requisicoes_querysets.order_by('-created_at')
+        def paginar():
+            return PaginaCursor(buscar(visiveis, busca))
+    else:
+        # Paginação por cursor: páginas profundas custam o mesmo que a primeira
+        def paginar():
+            return paginar_por_cursor(
+                requisicoes_querysets,
+                depois=request.GET.get('depois'),
+                antes=request.GET.get('antes'),
+            )
+
+    # Atualização em tempo real: só as linhas da tabela, com ETag/304
+    if pede_fragmento(request):
+        return responder_fragmento(
+            request, requisicoes_querysets, 'core/fragmentos/linhas_listagem.html',
+            lambda: {'requisicoes': paginar()},
+        )
+
+    requisicoes = paginar()
+
+    # Filtros atuais, preservados nos links de paginação
+    filtros = request.GET.copy()
+    filtros.pop('depois', None)
+    filtros.pop('antes', None)
 
     context = {
         'requisicoes' : requisicoes,
         'RequestStatus': RequestStatus,
+        'Urgency': Urgency,
         'current_status': status_filter,
+        'current_urgency': urgency_filter,
+        'busca': busca,
+        'filtros_querystring': filtros.urlencode(),
     }
     return render(request, 'core/listar_requisicoes.html', context)
 
+@login_required
+def exportar_requisicoes(request):
+    # Mesmos filtros e regras de acesso da listagem, mais o período data_inicio/data_fim
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        formato = 'csv'
+    try:
+        queryset = filtrar_exportacao(requisicoes_visiveis(request.user), request.GET)
+    except ValueError:
+        messages.error(request, 'Período inválido para exportação. Use datas no formato AAAA-MM-DD.')
+        return redirect('core:listar_requisicoes')
+
+    gerar, content_type = FORMATOS[formato]
+    response = StreamingHttpResponse(gerar(linhas_exportacao(queryset)), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="requisicoes_{timezone.localdate():%Y%m%d}.{formato}"'
+    return response
+
 @login_required
 def detalhe_requisicao(request, pk):
     # Tenta pegar a requisição pelo UUID (pk) ou retorna erro 404 se não encontrar
@@ -130,14 +174,16 @@ def detalhe_requisicao(request, pk):
 
 @login_required
 def excluir_requisicao(request,pk):
-    requisicao = get_object_or_404(Request, pk=pk)
+    requisicao = get_object_or_404(Request.objects.select_related('requester', 'sector'), pk=pk)
 
     # Permite excluir APENAS se:
     # 1. O usuário logado é o mesmo que criou a requisição E
     # 2. O status da requisição ainda é PENDENTE
     if requisicao.requester == request.user and requisicao.status == RequestStatus.PENDING:
         if request.method == 'POST':
+            evento = evento_requisicao('deleted', requisicao, requisicao.status, excluida=True)
             requisicao.delete()
+            notificar(evento)
             messages.success(request, 'Requisição excluida com sucesso!')
             return redirect('core:listar_requisicoes')
          # Se for GET (primeira vez acessando a URL), mostra a página de confirmação
@@ -159,35 +205,21 @@ def criar_usuario(request):
         form = CustomUserCreationForm()
     return render(request, 'core/criar_usuario.html', {'form': form})
 
-@login_required
-def dashboard(request):
-    now = timezone.now()
-    papel = request.user.role
-    today = timezone.localdate()
+# Cards do dashboard atualizados em tempo real (data-kpi nos templates)
+KPIS_CARDS = ('pendentes', 'em_atendimento', 'aprovadas_hoje', 'total_mes', 'urgentes_pendentes')
 
-    # Filtra as requisições do dia com base no papel do usuário
-    if papel == Role.Encarregado:
-        # Encarregado vê apenas as suas requisições do dia
-        requisicoes_do_dia = Request.objects.filter(requester=request.user, created_at__date=today).order_by('-created_at')
-    else:
-        # Outros papéis (Gestor, Almoxarife) veem todas as requisições do dia
-        requisicoes_do_dia = Request.objects.filter(created_at__date=today).order_by('-created_at')
-
-    context = {
-        'now': now,
-        'user': request.user,
-        'papel': papel,
-        'requisicoes_do_dia': requisicoes_do_dia,
-        'data_today': today,
-    }
+def _contexto_dashboard(user, requisicoes_do_dia, today):
+    """Parte calculada do dashboard (tabelas e cards), guardada em cache por papel/usuário/dia."""
+    papel = user.role
+    context = {'requisicoes_do_dia': list(requisicoes_do_dia)}
 
     # --- Estatísticas do Painel (cards) ---
     stats_qs = Request.objects.all()
-    user_stats_qs = Request.objects.filter(requester=request.user)
+    user_stats_qs = Request.objects.filter(requester=user)
     if papel == Role.Encarregado:
         pendentes = user_stats_qs.filter(status=RequestStatus.PENDING).count()
-        aprovadas_hoje = user_stats_qs.filter(status=RequestStatus.APPROVED, updated_at__date=today).count()
-        total_mes = user_stats_qs.filter(created_at__month=now.month, created_at__year=now.year).count()
+        aprovadas_hoje = user_stats_qs.filter(no_dia('updated_at', today), status=RequestStatus.APPROVED).count()
+        total_mes = user_stats_qs.filter(no_mes('created_at', today)).count()
         context.update({
             'pendentes': pendentes,
             'aprovadas_hoje': aprovadas_hoje,
@@ -196,7 +228,7 @@ def dashboard(request):
     else: # Gestor e Almoxarife
         pendentes = stats_qs.filter(status=RequestStatus.PENDING).count()
         em_atendimento = stats_qs.filter(status=RequestStatus.EM_ATENDIMENTO).count()
-        aprovadas_hoje = stats_qs.filter(status=RequestStatus.APPROVED, updated_at__date=today).count()
+        aprovadas_hoje = stats_qs.filter(no_dia('updated_at', today), status=RequestStatus.APPROVED).count()
         context.update({
             'pendentes': pendentes,
             'em_atendimento': em_atendimento,
@@ -216,9 +248,9 @@ def dashboard(request):
     context['alertas'] = alertas
 
     # --- Tabela de Requisições Recentes/Ativas ---
-    base_recentes_qs = Request.objects.all()
+    base_recentes_qs = requisicoes_para_listagem()
     if papel == Role.Encarregado:
-        base_recentes_qs = Request.objects.filter(requester=request.user)
+        base_recentes_qs = base_recentes_qs.filter(requester=user)
     
     # Prioriza requisições ativas (Em Atendimento e Pendentes)
     recentes_qs = base_recentes_qs.filter(
@@ -240,13 +272,51 @@ def dashboard(request):
             'status': dict(RequestStatus.choices).get(req.status, req.status),
             'status_cor': status_cor,
             'request_code': req.request_code,
-            'first_item': req.items.first().item_requested if req.items.exists() else 'N/A',
+            'first_item': req.first_item or 'N/A',
             'solicitante': req.requester.get_full_name() or req.requester.username,
             'setor': req.sector.name if req.sector else '',
             'data': req.updated_at, # Usar updated_at para refletir atividade recente
             'id': req.id
         })
     context['recentes'] = recentes
+    return context
+
+@login_required
+def dashboard(request):
+    now = timezone.now()
+    papel = request.user.role
+    today = timezone.localdate()
+
+    # Filtra as requisições do dia com base no papel do usuário
+    if papel == Role.Encarregado:
+        # Encarregado vê apenas as suas requisições do dia
+        requisicoes_do_dia = requisicoes_para_listagem().filter(no_dia('created_at', today), requester=request.user).order_by('-created_at')
+    else:
+        # Outros papéis (Gestor, Almoxarife) veem todas as requisições do dia
+        requisicoes_do_dia = requisicoes_para_listagem().filter(no_dia('created_at', today)).order_by('-created_at')
+
+    if pede_fragmento(request):
+        return responder_fragmento(
+            request, requisicoes_do_dia, 'core/fragmentos/linhas_dashboard.html',
+            lambda: {'requisicoes_do_dia': requisicoes_do_dia},
+        )
+
+    context = {
+        'now': now,
+        'user': request.user,
+        'papel': papel,
+        'data_today': today,
+    }
+
+    context.update(contexto_em_cache(
+        'geral', request.user, lambda: _contexto_dashboard(request.user, requisicoes_do_dia, today),
+    ))
+
+    if request.GET.get('cards'):
+        # Valores absolutos dos cards, relidos pelo dashboard-realtime.js quando pode ter perdido eventos
+        response = JsonResponse({nome: context[nome] for nome in KPIS_CARDS if nome in context})
+        response['Cache-Control'] = 'no-store'
+        return response
     
     return render(request, 'core/dashboard.html', context)
 
@@ -254,30 +324,56 @@ def dashboard(request):
 @user_passes_test(is_almoxarife)
 @require_POST
 def iniciar_atendimento_requisicao(request, pk):
-    requisicao = get_object_or_404(Request, pk=pk)
-    if requisicao.status == RequestStatus.PENDING:
-        requisicao.status = RequestStatus.EM_ATENDIMENTO
-        requisicao.atendido_por = request.user
-        requisicao.save()
+    # UPDATE condicional: só um almoxarife consegue assumir a requisição
+    requisicao = assumir_requisicao(pk, request.user)
+    if requisicao is not None:
         messages.info(request, f'Você iniciou o atendimento da requisição {requisicao.request_code}.')
         return redirect('core:almoxarife_atender_requisicao', pk=requisicao.pk)
+
+    requisicao = get_object_or_404(Request.objects.select_related('atendido_por'), pk=pk)
+    if requisicao.status == RequestStatus.EM_ATENDIMENTO and requisicao.atendido_por_id == request.user.pk:
+        return redirect('core:almoxarife_atender_requisicao', pk=requisicao.pk)
+    if requisicao.status == RequestStatus.EM_ATENDIMENTO and requisicao.atendido_por_id:
+        messages.warning(request, f'Esta requisição já está sendo atendida por {requisicao.atendido_por.get_full_name() or requisicao.atendido_por.username}.')
     else:
         messages.warning(request, 'Esta requisição não está pendente.')
-        return redirect('core:listar_requisicoes')
+    return redirect('core:listar_requisicoes')
+
+@login_required
+@user_passes_test(is_almoxarife)
+@require_POST
+def almoxarife_proxima_requisicao(request):
+    # Próxima da fila (urgentes e mais antigas primeiro), de preferência do setor pedido ou do próprio almoxarife
+    setor_id = request.POST.get('setor') or request.user.sector_id
+    try:
+        requisicao = proxima_requisicao(request.user, setor_id=setor_id)
+    except ValidationError:
+        requisicao = proxima_requisicao(request.user)
+    if requisicao is None:
+        messages.info(request, 'Nenhuma requisição pendente no momento.')
+        return redirect('core:almoxarife_dashboard')
+    messages.info(request, f'Você iniciou o atendimento da requisição {requisicao.request_code}.')
+    return redirect('core:almoxarife_atender_requisicao', pk=requisicao.pk)
 
 @login_required
 @user_passes_test(is_almoxarife)
 def almoxarife_dashboard(request):
-    requisicoes_pendentes = Request.objects.filter(status=RequestStatus.PENDING).order_by('-created_at')
-    context = {
-        'requisicoes_pendentes': requisicoes_pendentes,
-    }
+    # Na ordem da fila de atendimento: urgentes primeiro, depois as mais antigas
+    requisicoes_pendentes = fila_pendente(requisicoes_para_listagem())
+    if pede_fragmento(request):
+        return responder_fragmento(
+            request, requisicoes_pendentes, 'core/fragmentos/linhas_almoxarife.html',
+            lambda: {'requisicoes_pendentes': requisicoes_pendentes},
+        )
+    context = contexto_em_cache('almoxarife', request.user, lambda: {
+        'requisicoes_pendentes': list(requisicoes_pendentes),
+    })
     return render(request, 'core/almoxarife_dashboard_requests.html', context)
 
 @login_required
 @user_passes_test(is_almoxarife)
 def almoxarife_atender_requisicao(request, pk):
-    requisicao = get_object_or_404(Request, pk=pk)
+    requisicao = get_object_or_404(Request.objects.select_related('requester', 'sector', 'atendido_por'), pk=pk)
 
     if request.method == 'POST':
         try:
@@ -291,35 +387,42 @@ def almoxarife_atender_requisicao(request, pk):
                     messages.error(request, 'Erro de inconsistência nos dados do formulário. Tente novamente.')
                     return redirect('core:almoxarife_atender_requisicao', pk=pk)
 
+                # Carrega todos os itens da requisição em uma consulta só
+                itens = {str(item.id): item for item in requisicao.items.all()}
+                agora = timezone.now()
+                atualizados = {}
                 for i, item_id in enumerate(item_ids):
+                    item = itens.get(item_id)
+                    if item is None:
+                        # Ignora se um item não pertencer a esta requisição por segurança
+                        continue
                     try:
-                        item = RequestItem.objects.get(id=item_id, request=requisicao)
                         quantidade_str = quantidades[i]
                         item.quantidade_atendida = int(quantidade_str) if quantidade_str.isdigit() else 0
                         item.observacao_item = observacoes[i]
-                        item.save()
-                    except RequestItem.DoesNotExist:
-                        # Ignora se um item não pertencer a esta requisição por segurança
-                        continue
                     except (ValueError, IndexError) as e:
                         raise Exception(f"Erro ao processar o item {item_id}: {e}")
+                    # bulk_update não aplica o auto_now
+                    item.updated_at = agora
+                    atualizados[item.id] = item
+
+                RequestItem.objects.bulk_update(atualizados.values(), ['quantidade_atendida', 'observacao_item', 'updated_at'])
 
                 # Atualiza o status da requisição principal
+                status_anterior = requisicao.status
                 requisicao.status = RequestStatus.APPROVED
+                if requisicao.atendido_por_id is None:
+                    requisicao.atendido_por = request.user
+                # Autor da troca no histórico de status (ver signals.registrar_troca_de_status)
+                requisicao._usuario_transicao = request.user
                 # Adiciona as observações do atendimento ao campo já existente.
                 obs_finais = request.POST.get('observacoes_atendimento', '')
                 if obs_finais:
                     requisicao.observations = f"{requisicao.observations or ''}\n\n--- Observações do Atendimento ---\n{obs_finais}"
                 requisicao.save()
 
-            # Notifica FastAPI para atualizar clientes
-            try:
-                response = requests.post('http://localhost:8001/notify', 
-                                      json={"action": "finalized", "message": "Requisição finalizada"})
-                print(f"Notificação enviada: {response.status_code}")
-            except Exception as e:
-                print(f"Erro ao enviar notificação: {e}")
-                pass
+                # Notifica FastAPI para atualizar clientes (enviado em segundo plano, após o commit)
+                notificar(evento_requisicao('finalized', requisicao, status_anterior))
 
             messages.success(request, f'Requisição {requisicao.request_code} finalizada com sucesso!')
             return redirect('core:listar_requisicoes')
@@ -327,12 +430,8 @@ def almoxarife_atender_requisicao(request, pk):
             messages.error(request, f'Ocorreu um erro ao finalizar a requisição: {e}')
             return redirect('core:almoxarife_atender_requisicao', pk=pk)
 
-    # Lógica para GET
-    if requisicao.status == RequestStatus.PENDING:
-        requisicao.status = RequestStatus.EM_ATENDIMENTO
-        requisicao.atendido_por = request.user
-        requisicao.save()
-    elif requisicao.status == RequestStatus.EM_ATENDIMENTO and requisicao.atendido_por != request.user:
+    # GET não altera nada: uma requisição pendente é assumida pelo botão "Iniciar atendimento" (POST)
+    if requisicao.status == RequestStatus.EM_ATENDIMENTO and requisicao.atendido_por != request.user:
         messages.error(request, f'Esta requisição já está sendo atendida por {requisicao.atendido_por.get_full_name()}.')
         return redirect('core:listar_requisicoes')
     elif requisicao.status not in [RequestStatus.PENDING, RequestStatus.EM_ATENDIMENTO]:
@@ -345,107 +444,47 @@ def almoxarife_atender_requisicao(request, pk):
     return render(request, 'core/almoxarife_atender_requisicao.html', context)
 
 
-def format_timedelta(td):
-    if not td:
-        return "N/A"
-    total_seconds = int(td.total_seconds())
-    hours, remainder = divmod(total_seconds, 3600)
-    minutes, _ = divmod(remainder, 60)
-    if hours > 0:
-        return f"{hours}h {minutes}min"
-    else:
-        return f"{minutes}min"
-
 @login_required
 @user_passes_test(is_gestor)
 def gestor_dashboard(request):
-    today = timezone.localdate()
-    month_start = today.replace(day=1)
-    qs = Request.objects.all()
-
-    # KPIs
-    pendentes = qs.filter(status=RequestStatus.PENDING).count()
-    aprovadas_hoje = qs.filter(status=RequestStatus.APPROVED, updated_at__date=today).count()
-    total_mes = qs.filter(created_at__month=today.month, created_at__year=today.year).count()
-    departamentos_ativos = qs.values('sector').distinct().count()
-    urgentes_pendentes = qs.filter(status=RequestStatus.PENDING, urgency='URGENTE').count()
-
-    # Tempo médio de atendimento (apenas aprovadas)
-    tempo_medio = qs.filter(status=RequestStatus.APPROVED, created_at__isnull=False, updated_at__isnull=False)
-    tempo_medio = tempo_medio.annotate(
-        tempo_espera=ExpressionWrapper(F('updated_at') - F('created_at'), output_field=DurationField())
-    ).aggregate(media=Avg('tempo_espera'))['media']
-
-    # % atendidas no prazo (exemplo: menos de 24h)
-    atendidas_no_prazo = qs.filter(status=RequestStatus.APPROVED, created_at__isnull=False, updated_at__isnull=False)
-    atendidas_no_prazo = atendidas_no_prazo.annotate(
-        tempo_espera=ExpressionWrapper(F('updated_at') - F('created_at'), output_field=DurationField())
-    ).filter(tempo_espera__lte=timedelta(hours=24)).count()
-    total_aprovadas = qs.filter(status=RequestStatus.APPROVED).count()
-    pct_no_prazo = (atendidas_no_prazo / total_aprovadas * 100) if total_aprovadas else 0
-
-    # Gráfico: Requisições por setor (últimos 30 dias)
-    setores = qs.filter(created_at__gte=today - timedelta(days=30)).values('sector__name').annotate(total=Count('id')).order_by('-total')
-    setores_labels = [s['sector__name'] or 'N/A' for s in setores]
-    setores_data = [s['total'] for s in setores]
-
-    # Gráfico: Distribuição por status
-    status_dist = qs.values('status').annotate(total=Count('id'))
-    status_labels = [dict(RequestStatus.choices).get(s['status'], s['status']) for s in status_dist]
-    status_data = [s['total'] for s in status_dist]
-
-    # Gráfico: Evolução diária (linha)
-    evolucao = qs.filter(created_at__gte=month_start).annotate(data=TruncDate('created_at')).values('data').annotate(total=Count('id')).order_by('data')
-    evolucao_labels = [e['data'].strftime('%d/%m') for e in evolucao]
-    evolucao_data = [e['total'] for e in evolucao]
-
-    # Top 5 usuários que mais requisitam
-    top_users = qs.values('requester__username').annotate(total=Count('id')).order_by('-total')[:5]
-    top_users_labels = [u['requester__username'] for u in top_users]
-    top_users_data = [u['total'] for u in top_users]
-
-    # Setor com mais requisições
-    setor_top = setores_labels[0] if setores_labels else 'N/A'
-    # Usuário com mais requisições
-    user_top = top_users_labels[0] if top_users_labels else 'N/A'
-
-    # Tabela de requisições recentes
-    requisicoes_do_dia = qs.order_by('-created_at')[:20]
-
-    tempo_medio_str = format_timedelta(tempo_medio)
-    context = {
-        'pendentes': pendentes,
-        'aprovadas_hoje': aprovadas_hoje,
-        'total_mes': total_mes,
-        'departamentos_ativos': departamentos_ativos,
-        'urgentes_pendentes': urgentes_pendentes,
-        'tempo_medio': tempo_medio,
-        'tempo_medio_str': tempo_medio_str,
-        'pct_no_prazo': round(pct_no_prazo, 1),
-        'setor_top': setor_top,
-        'user_top': user_top,
-        'setores_labels': setores_labels,
-        'setores_data': setores_data,
-        'status_labels': status_labels,
-        'status_data': status_data,
-        'evolucao_labels': evolucao_labels,
-        'evolucao_data': evolucao_data,
-        'top_users_labels': top_users_labels,
-        'top_users_data': top_users_data,
-        'requisicoes_do_dia': requisicoes_do_dia,
-    }
-    # Gráfico: Categorias mais requisitadas (últimos 30 dias)
-    from .models import RequestItem, ItemCategory
-    categorias = RequestItem.objects.filter(created_at__gte=today - timedelta(days=30)) \
-        .values('category') \
-        .annotate(total=Count('id')) \
-        .order_by('-total')
-    categorias_labels = [dict(ItemCategory.choices).get(c['category'], c['category']) for c in categorias]
-    categorias_data = [c['total'] for c in categorias]
-    context['categorias_labels'] = categorias_labels
-    context['categorias_data'] = categorias_data
+    def calcular():
+        context = calcular_metricas_gestor().as_context()
+        # Tabela de requisições recentes
+        context['requisicoes_do_dia'] = list(requisicoes_para_listagem().order_by('-created_at')[:20])
+        return context
+
+    context = contexto_em_cache('gestor', request.user, calcular)
     return render(request, 'core/dashboard_gestor.html', context)
 
+@login_required
+@user_passes_test(is_gestor)
+def gestor_dashboard_dados(request):
+    return JsonResponse(contexto_em_cache('gestor_dados', request.user, lambda: calcular_metricas_gestor().as_json()))
+
+@login_required
+def realtime_token(request):
+    # Token curto para a conexão WebSocket; gerado a cada (re)conexão, nunca guardado em cache
+    response = JsonResponse({
+        'token': token_realtime(request.user),
+        'url': settings.REALTIME_WS_URL,
+        'validade': settings.REALTIME_TOKEN_VALIDADE,
+    })
+    response['Cache-Control'] = 'no-store'
+    return response
+
+@login_required
+def autocompletar_itens(request):
+    # Servido do índice em memória do catálogo, sem consulta ao banco (ver core/catalogo.py).
+    # O navegador sempre revalida; o ETag é a versão do catálogo, então a resposta
+    # é um 304 até o catálogo mudar
+    etag = f'"catalogo-{catalogo.versao_atual()}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'itens': catalogo.sugerir(request.GET.get('q', ''))})
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 @user_passes_test(is_gestor)
 def usuarios_list(request):
     User = get_user_model()
@@ -0,0 +1,169 @@
+"""
+Registro mínimo de métricas no formato de exposição em texto do Prometheus.
+
+Usado pelo Django (core/monitoramento.py) e pelo servidor de tempo real
+(realtime_server.py), sem depender do prometheus_client.
+
+Feito para ficar no caminho de toda requisição: cada thread soma nos próprios
+dicionários (um "fragmento" por thread), sem trava nenhuma. A única trava é
+tomada quando uma thread registra o seu fragmento pela primeira vez e quando a
+exportação copia a lista de fragmentos. Na exportação os fragmentos são somados;
+como só a thread dona escreve em cada um, o pior caso é ler uma contagem que
+acabou de mudar, nunca perder incrementos.
+
+Nessas duas ocasiões os fragmentos de threads que já terminaram são somados em
+um total único e saem da lista, então servidores com uma thread por requisição
+(runserver) não acumulam um fragmento por requisição atendida.
+
+Os valores são por processo: com vários workers (Gunicorn), cada um expõe os
+próprios números e o Prometheus soma as séries.
+"""
+import bisect
+import threading
+
+# Limites (em segundos) dos histogramas de latência
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _formatar_rotulos(rotulos):
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos) + '}'
+
+
+def _formatar_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer() and abs(valor) < 1e15:
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+def _somar(total, fragmento):
+    for chave, valor in list(fragmento.items()):
+        if isinstance(valor, list):
+            acumulado = total.setdefault(chave, [0] * len(valor))
+            for i, parcela in enumerate(list(valor)):
+                acumulado[i] += parcela
+        else:
+            total[chave] = total.get(chave, 0) + valor
+
+
+class Registro:
+    def __init__(self):
+        self._definicoes = {}
+        self._medidores = {}
+        self._local = threading.local()
+        # (thread dona, fragmento) das threads que já registraram algum valor
+        self._fragmentos = []
+        # Soma dos fragmentos de threads que já terminaram
+        self._encerrados = {}
+        self._trava = threading.Lock()
+
+    # --- Definição ---
+
+    def contador(self, nome, ajuda):
+        self._definicoes[nome] = ('counter', ajuda, None)
+
+    def histograma(self, nome, ajuda, buckets=BUCKETS_PADRAO):
+        self._definicoes[nome] = ('histogram', ajuda, tuple(sorted(buckets)))
+
+    def medidor(self, nome, ajuda, funcao, tipo='gauge'):
+        """
+        Valor lido só na exportação: `funcao()` retorna um número ou {rótulos: número},
+        com os rótulos como tupla de pares (nome, valor). `tipo='counter'` expõe um
+        contador mantido fora do registro.
+        """
+        self._medidores[nome] = (ajuda, funcao, tipo)
+
+    # --- Registro de valores (sem trava) ---
+
+    def _fragmento(self):
+        try:
+            return self._local.fragmento
+        except AttributeError:
+            fragmento = self._local.fragmento = {}
+            with self._trava:
+                self._recolher_encerrados()
+                self._fragmentos.append((threading.current_thread(), fragmento))
+            return fragmento
+
+    def _recolher_encerrados(self):
+        """Soma no total os fragmentos das threads encerradas (chamado com a trava)."""
+        vivos = []
+        for thread, fragmento in self._fragmentos:
+            if thread.is_alive():
+                vivos.append((thread, fragmento))
+            else:
+                # A thread dona terminou: ninguém mais escreve neste fragmento
+                _somar(self._encerrados, fragmento)
+        self._fragmentos = vivos
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        fragmento = self._fragmento()
+        fragmento[chave] = fragmento.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **rotulos):
+        buckets = self._definicoes[nome][2]
+        chave = (nome, tuple(sorted(rotulos.items())))
+        fragmento = self._fragmento()
+        contagens = fragmento.get(chave)
+        if contagens is None:
+            # Uma posição por bucket, mais +Inf, soma e total
+            contagens = fragmento[chave] = [0] * (len(buckets) + 3)
+        contagens[bisect.bisect_left(buckets, valor)] += 1
+        contagens[-2] += valor
+        contagens[-1] += 1
+
+    # --- Exportação ---
+
+    def valores(self):
+        """{(nome, rótulos): valor} somando os fragmentos de todas as threads."""
+        total = {}
+        with self._trava:
+            self._recolher_encerrados()
+            fragmentos = [fragmento for _, fragmento in self._fragmentos]
+            _somar(total, self._encerrados)
+        for fragmento in fragmentos:
+            _somar(total, fragmento)
+        return total
+
+    def exportar(self):
+        valores = self.valores()
+        por_nome = {}
+        for (nome, rotulos), valor in valores.items():
+            por_nome.setdefault(nome, []).append((rotulos, valor))
+
+        linhas = []
+        for nome, (tipo, ajuda, buckets) in sorted(self._definicoes.items()):
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+            for rotulos, valor in sorted(por_nome.get(nome, [])):
+                if tipo == 'histogram':
+                    acumulado = 0
+                    for limite, contagem in zip(buckets + (float('inf'),), valor):
+                        acumulado += contagem
+                        rotulos_bucket = rotulos + (('le', _formatar_numero(float(limite))),)
+                        linhas.append(f'{nome}_bucket{_formatar_rotulos(rotulos_bucket)} {acumulado}')
+                    linhas.append(f'{nome}_sum{_formatar_rotulos(rotulos)} {_formatar_numero(valor[-2])}')
+                    linhas.append(f'{nome}_count{_formatar_rotulos(rotulos)} {valor[-1]}')
+                else:
+                    linhas.append(f'{nome}{_formatar_rotulos(rotulos)} {_formatar_numero(valor)}')
+
+        for nome, (ajuda, funcao, tipo) in sorted(self._medidores.items()):
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+            valor = funcao()
+            if isinstance(valor, dict):
+                for rotulos, parcela in sorted(valor.items()):
+                    linhas.append(f'{nome}{_formatar_rotulos(tuple(sorted(rotulos)))} {_formatar_numero(parcela)}')
+            else:
+                linhas.append(f'{nome} {_formatar_numero(valor)}')
+        return '\n'.join(linhas) + '\n'
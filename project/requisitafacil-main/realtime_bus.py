@@ -0,0 +1,185 @@
+"""
+Barramento de publicação/assinatura entre os workers do servidor de tempo real.
+
+Cada worker do uvicorn (ou cada máquina) guarda apenas os próprios WebSockets.
+O /notify que chega em um worker publica o evento no barramento, e todos os
+workers, inclusive o que publicou, recebem a mensagem e a entregam aos seus
+clientes. Backends disponíveis (variável de ambiente REALTIME_BUS):
+
+- "memoria": sem barramento, só o próprio processo (padrão; um único worker);
+- "sqlite": tabela compartilhada consultada periodicamente; vários workers na
+  mesma máquina, sem nenhum serviço extra (também usado nos testes);
+- "postgres": LISTEN/NOTIFY do PostgreSQL; vários workers e várias máquinas.
+
+REALTIME_BUS_URL indica o arquivo do SQLite ou a URL do PostgreSQL (padrão: DATABASE_URL).
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+BACKENDS = ('memoria', 'sqlite', 'postgres')
+
+
+class BarramentoMemoria:
+    """Entrega direto no próprio processo."""
+
+    def __init__(self, ao_receber):
+        self.ao_receber = ao_receber
+
+    async def iniciar(self):
+        pass
+
+    async def parar(self):
+        pass
+
+    async def publicar(self, mensagem):
+        self.ao_receber(mensagem)
+
+
+class BarramentoSQLite:
+    """
+    Publica inserindo numa tabela do SQLite e recebe consultando as linhas novas
+    a cada `intervalo` segundos. Mensagens mais antigas que `retencao` segundos são apagadas.
+    """
+
+    def __init__(self, caminho, ao_receber, intervalo=0.05, retencao=60):
+        self.caminho = caminho
+        self.ao_receber = ao_receber
+        self.intervalo = intervalo
+        self.retencao = retencao
+        self._lock = threading.Lock()
+        self._escrita = None
+        self._leitura = None
+        self._ultimo_id = 0
+        self._tarefa = None
+
+    def _conectar(self):
+        conexao = sqlite3.connect(self.caminho, isolation_level=None, check_same_thread=False, timeout=5)
+        conexao.execute('PRAGMA journal_mode=WAL')
+        return conexao
+
+    async def iniciar(self):
+        self._escrita = self._conectar()
+        self._escrita.execute(
+            'CREATE TABLE IF NOT EXISTS mensagens ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, criado_em REAL NOT NULL, conteudo TEXT NOT NULL)'
+        )
+        self._leitura = self._conectar()
+        # Só interessam as mensagens publicadas a partir de agora
+        self._ultimo_id = self._leitura.execute('SELECT COALESCE(MAX(id), 0) FROM mensagens').fetchone()[0]
+        self._tarefa = asyncio.create_task(self._consultar())
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            self._tarefa = None
+        for conexao in (self._leitura, self._escrita):
+            if conexao is not None:
+                conexao.close()
+        self._leitura = self._escrita = None
+
+    async def publicar(self, mensagem):
+        await asyncio.get_running_loop().run_in_executor(None, self._inserir, mensagem)
+
+    def _inserir(self, mensagem):
+        agora = time.time()
+        with self._lock:
+            self._escrita.execute('INSERT INTO mensagens (criado_em, conteudo) VALUES (?, ?)', (agora, mensagem))
+            self._escrita.execute('DELETE FROM mensagens WHERE criado_em < ?', (agora - self.retencao,))
+
+    def receber_pendentes(self):
+        linhas = self._leitura.execute(
+            'SELECT id, conteudo FROM mensagens WHERE id > ? ORDER BY id', (self._ultimo_id,)
+        ).fetchall()
+        for id_mensagem, conteudo in linhas:
+            self._ultimo_id = id_mensagem
+            self.ao_receber(conteudo)
+        return len(linhas)
+
+    async def _consultar(self):
+        while True:
+            try:
+                self.receber_pendentes()
+            except sqlite3.Error as e:
+                print(f"Erro ao consultar o barramento SQLite: {e}")
+            await asyncio.sleep(self.intervalo)
+
+
+class BarramentoPostgres:
+    """
+    LISTEN/NOTIFY do PostgreSQL. A conexão de escuta é registrada no loop do
+    asyncio (add_reader), então as notificações chegam sem thread nem polling.
+    """
+
+    def __init__(self, dsn, ao_receber, canal='requisita_realtime'):
+        if not re.fullmatch(r'[a-z_][a-z0-9_]*', canal):
+            raise ValueError(f'Canal inválido: {canal}')
+        self.dsn = dsn
+        self.ao_receber = ao_receber
+        self.canal = canal
+        self._lock = threading.Lock()
+        self._escuta = None
+        self._publicacao = None
+
+    def _conectar(self):
+        import psycopg2
+
+        conexao = psycopg2.connect(self.dsn)
+        conexao.autocommit = True
+        return conexao
+
+    async def iniciar(self):
+        self._escuta = self._conectar()
+        with self._escuta.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.canal}')
+        asyncio.get_running_loop().add_reader(self._escuta.fileno(), self._ler)
+
+    async def parar(self):
+        if self._escuta is not None:
+            asyncio.get_running_loop().remove_reader(self._escuta.fileno())
+            self._escuta.close()
+            self._escuta = None
+        if self._publicacao is not None:
+            self._publicacao.close()
+            self._publicacao = None
+
+    def _ler(self):
+        self._escuta.poll()
+        while self._escuta.notifies:
+            self.ao_receber(self._escuta.notifies.pop(0).payload)
+
+    async def publicar(self, mensagem):
+        await asyncio.get_running_loop().run_in_executor(None, self._notificar, mensagem)
+
+    def _notificar(self, mensagem):
+        import psycopg2
+
+        with self._lock:
+            for tentativa in range(2):
+                try:
+                    if self._publicacao is None or self._publicacao.closed:
+                        self._publicacao = self._conectar()
+                    with self._publicacao.cursor() as cursor:
+                        cursor.execute('SELECT pg_notify(%s, %s)', (self.canal, mensagem))
+                    return
+                except psycopg2.OperationalError:
+                    # Conexão caiu: tenta uma vez com uma conexão nova
+                    self._publicacao = None
+                    if tentativa:
+                        raise
+
+
+def criar_barramento(ao_receber, backend=None, url=None):
+    backend = backend or os.environ.get('REALTIME_BUS', 'memoria')
+    url = url or os.environ.get('REALTIME_BUS_URL')
+    if backend == 'memoria':
+        return BarramentoMemoria(ao_receber)
+    if backend == 'sqlite':
+        return BarramentoSQLite(url or os.path.join(tempfile.gettempdir(), 'requisita_realtime_bus.sqlite3'), ao_receber)
+    if backend == 'postgres':
+        return BarramentoPostgres(url or os.environ['DATABASE_URL'], ao_receber)
+    raise ValueError(f'Barramento inválido: {backend}. Use um de {BACKENDS}')
@@ -0,0 +1,156 @@
+"""
+Fan-out das mensagens do servidor de tempo real para os WebSockets conectados.
+
+Cada cliente tem uma fila própria e limitada e uma tarefa escritora. Um broadcast
+apenas coloca a mensagem na fila de cada cliente (O(1) por cliente, sem await),
+então um cliente lento não atrasa os outros. Quando a fila de um cliente enche,
+a política configurada decide o que fazer:
+
+- "coalesce": descarta a mensagem mais antiga da fila e mantém a mais nova;
+- "drop": desconecta o cliente lento (o navegador reconecta sozinho).
+
+Cada conexão assina um conjunto de tópicos (all, user:<id>, role:Almoxarife). Um índice tópico -> clientes permite entregar cada evento só
+a quem assinou algum dos tópicos dele, sem percorrer todas as conexões.
+
+Quando mensagens de um cliente são descartadas, a escritora manda antes da
+próxima mensagem um aviso {"v": 1, "action": "resync"}: o navegador sabe que
+perdeu eventos e relê do servidor as tabelas e os cards.
+
+Cada mensagem vai para a fila com o instante em que foi enfileirada; se
+`ao_enviar` for informado, ele recebe a latência (segundos entre enfileirar e
+concluir o envio) de cada mensagem entregue, usada nas métricas do servidor.
+"""
+import asyncio
+import json
+import time
+
+POLITICAS = ('coalesce', 'drop')
+
+AVISO_RESSINCRONIZAR = json.dumps({'v': 1, 'action': 'resync'})
+
+
+class ClienteConectado:
+    def __init__(self, websocket, tamanho_fila, politica, topicos=()):
+        self.websocket = websocket
+        self.topicos = frozenset(topicos)
+        self.politica = politica
+        self.fila = asyncio.Queue(maxsize=tamanho_fila)
+        self.tarefa = None
+        self.descartadas = 0
+
+    def enfileirar(self, mensagem):
+        """Coloca a mensagem na fila; retorna False se o cliente deve ser desconectado."""
+        item = (mensagem, time.perf_counter())
+        try:
+            self.fila.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            if self.politica == 'drop':
+                return False
+            self.fila.get_nowait()
+            self.fila.put_nowait(item)
+            self.descartadas += 1
+            return True
+
+
+class FanoutEngine:
+    def __init__(self, tamanho_fila=100, politica='coalesce', ao_enviar=None):
+        if politica not in POLITICAS:
+            raise ValueError(f'Política inválida: {politica}. Use uma de {POLITICAS}')
+        self.tamanho_fila = tamanho_fila
+        self.politica = politica
+        self.ao_enviar = ao_enviar
+        self.clientes = {}
+        self.topicos = {}
+        # Contadores acumulados desde o início do processo
+        self.derrubados = 0
+        self._descartadas_desconectados = 0
+
+    def __len__(self):
+        return len(self.clientes)
+
+    @property
+    def descartadas(self):
+        """Mensagens descartadas pela política "coalesce", somando os clientes já desconectados."""
+        return self._descartadas_desconectados + sum(cliente.descartadas for cliente in self.clientes.values())
+
+    def conectar(self, websocket, topicos=('all',)):
+        cliente = ClienteConectado(websocket, self.tamanho_fila, self.politica, topicos)
+        cliente.tarefa = asyncio.create_task(self._escrever(cliente))
+        self.clientes[websocket] = cliente
+        for topico in cliente.topicos:
+            self.topicos.setdefault(topico, set()).add(cliente)
+        return cliente
+
+    def desconectar(self, websocket):
+        # Pode ser chamado mais de uma vez (escritora e endpoint), por isso o pop com default
+        cliente = self.clientes.pop(websocket, None)
+        if cliente is not None:
+            self._descartadas_desconectados += cliente.descartadas
+            for topico in cliente.topicos:
+                assinantes = self.topicos.get(topico)
+                if assinantes is not None:
+                    assinantes.discard(cliente)
+                    if not assinantes:
+                        del self.topicos[topico]
+        if cliente is not None and cliente.tarefa is not None and cliente.tarefa is not asyncio.current_task():
+            cliente.tarefa.cancel()
+        return cliente
+
+    def assinantes(self, topicos=None):
+        """Clientes que assinam algum dos tópicos; sem tópicos, todos os clientes."""
+        if topicos is None:
+            return list(self.clientes.values())
+        destino = set()
+        for topico in topicos:
+            destino.update(self.topicos.get(topico, ()))
+        return list(destino)
+
+    def broadcast(self, mensagem, topicos=None):
+        """Enfileira a mensagem para os assinantes dos tópicos e retorna quantos a receberam."""
+        lentos = []
+        entregues = 0
+        for cliente in self.assinantes(topicos):
+            if cliente.enfileirar(mensagem):
+                entregues += 1
+            else:
+                lentos.append(cliente)
+        for cliente in lentos:
+            self._derrubar(cliente)
+        return entregues
+
+    def enviar(self, cliente, mensagem):
+        """Enfileira uma mensagem só para este cliente (ex.: o pong); retorna False se ele foi derrubado."""
+        if cliente.enfileirar(mensagem):
+            return True
+        self._derrubar(cliente)
+        return False
+
+    def _derrubar(self, cliente):
+        print(f"Cliente lento desconectado (fila com {cliente.fila.qsize()} mensagens)")
+        self.derrubados += 1
+        self.desconectar(cliente.websocket)
+        asyncio.create_task(self._fechar(cliente.websocket))
+
+    async def _fechar(self, websocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    async def _escrever(self, cliente):
+        avisadas = 0
+        try:
+            while True:
+                mensagem, enfileirada_em = await cliente.fila.get()
+                if cliente.descartadas != avisadas:
+                    avisadas = cliente.descartadas
+                    await cliente.websocket.send_text(AVISO_RESSINCRONIZAR)
+                await cliente.websocket.send_text(mensagem)
+                if self.ao_enviar is not None:
+                    self.ao_enviar(time.perf_counter() - enfileirada_em)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Erro ao enviar para cliente: {e}")
+            self.desconectar(cliente.websocket)
@@ -1,9 +1,35 @@
 from fastapi import FastAPI, WebSocket, Request as FastAPIRequest
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio
-from fastapi.responses import JSONResponse
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+import hmac
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-app = FastAPI()
+from metricas_prometheus import CONTENT_TYPE, Registro
+from realtime_bus import criar_barramento
+from realtime_fanout import FanoutEngine
+from realtime_token import (
+    CABECALHO_ASSINATURA, CABECALHO_MOMENTO, segredo_configurado, validar_notificacao, validar_token,
+)
+
+# Mesmo .env do Django (settings.py), para os dois lados chegarem ao mesmo segredo
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await barramento.iniciar()
+    try:
+        yield
+    finally:
+        await barramento.parar()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,45 +39,105 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-clients = set()
+# Métricas deste worker, expostas em /metrics no formato do Prometheus
+metricas = Registro()
+metricas.contador("realtime_notificacoes_total", "Eventos recebidos do Django em /notify")
+metricas.contador("realtime_broadcasts_total", "Eventos distribuídos aos clientes deste worker")
+metricas.contador("realtime_mensagens_enfileiradas_total", "Mensagens colocadas nas filas dos clientes")
+metricas.histograma(
+    "realtime_envio_segundos",
+    "Tempo entre enfileirar uma mensagem e concluir o envio ao cliente",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+# Fan-out com fila por cliente; política para clientes lentos: "coalesce" ou "drop"
+engine = FanoutEngine(
+    tamanho_fila=int(os.environ.get("REALTIME_CLIENT_QUEUE", "100")),
+    politica=os.environ.get("REALTIME_SLOW_CLIENT_POLICY", "coalesce"),
+    ao_enviar=lambda latencia: metricas.observar("realtime_envio_segundos", latencia),
+)
+
+metricas.medidor("realtime_clientes_conectados", "Conexões WebSocket abertas neste worker", lambda: len(engine))
+metricas.medidor(
+    "realtime_mensagens_descartadas_total", "Mensagens descartadas de filas cheias (política coalesce)",
+    lambda: engine.descartadas, tipo="counter",
+)
+metricas.medidor(
+    "realtime_clientes_derrubados_total", "Clientes lentos desconectados (política drop)",
+    lambda: engine.derrubados, tipo="counter",
+)
+
+# Token exigido em /metrics ("Authorization: Bearer <token>"); sem ele o endpoint fica fechado
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+def entregar(mensagem: str):
+    """Recebe do barramento um evento publicado por qualquer worker e entrega aos clientes deste."""
+    dados = json.loads(mensagem)
+    entregues = engine.broadcast(json.dumps(dados["event"]), dados.get("topics"))
+    metricas.incrementar("realtime_broadcasts_total")
+    metricas.incrementar("realtime_mensagens_enfileiradas_total", entregues)
+    logger.debug("Broadcast para %s clientes: %s", entregues, dados["event"].get("action", "update"))
+
+# Barramento entre workers (REALTIME_BUS: memoria, sqlite ou postgres)
+barramento = criar_barramento(entregar)
+
+# Segredo compartilhado com o Django para validar os tokens das conexões e as notificações;
+# sem REALTIME_TOKEN_SECRET nem SECRET_KEY no ambiente o servidor não sobe
+SEGREDO_TOKEN = segredo_configurado()
 
 @app.websocket("/ws/updates")
 async def websocket_endpoint(websocket: WebSocket):
+    # O token assinado pelo Django autentica a conexão e define os tópicos assinados
+    dados = validar_token(SEGREDO_TOKEN, websocket.query_params.get("token", ""))
+    if dados is None:
+        await websocket.close(code=4401)
+        return
     await websocket.accept()
-    clients.add(websocket)
-    print(f"Novo cliente conectado. Total: {len(clients)}")
+    cliente = engine.conectar(websocket, dados["t"])
+    print(f"Novo cliente conectado (usuário {dados['u']}, tópicos {sorted(cliente.topicos)}). Total: {len(engine)}")
     try:
         while True:
             data = await websocket.receive_text()
             if data == 'ping':
-                # Responde ao ping para manter a conexão ativa
-                await websocket.send_text('pong')
-                print(f"Ping recebido e respondido. Clientes ativos: {len(clients)}")
+                # Responde ao ping pela fila do cliente, mantendo uma única escritora por socket;
+                # com a política "drop" e a fila cheia o cliente é derrubado, como no broadcast
+                if not engine.enviar(cliente, 'pong'):
+                    break
     except Exception as e:
         print(f"Cliente desconectado: {e}")
     finally:
-        clients.remove(websocket)
-        print(f"Cliente removido. Total: {len(clients)}")
-
-async def broadcast_update(data: str):
-    print(f"Broadcasting para {len(clients)} clientes: {data}")
-    to_remove = set()
-    for ws in clients:
-        try:
-            await ws.send_text(data)
-            print(f"Mensagem enviada para cliente")
-        except Exception as e:
-            print(f"Erro ao enviar para cliente: {e}")
-            to_remove.add(ws)
-    for ws in to_remove:
-        clients.remove(ws)
-    print(f"Clientes restantes: {len(clients)}")
+        engine.desconectar(websocket)
+        print(f"Cliente removido. Total: {len(engine)}")
+
+async def broadcast_update(evento: dict, topicos=None):
+    # Publica no barramento; cada worker entrega aos próprios clientes em entregar()
+    await barramento.publicar(json.dumps({"topics": topicos, "event": evento}))
 
 @app.post("/notify")
 async def notify(request: FastAPIRequest):
-    data = await request.json()
-    action = data.get("action", "update")
-    message = data.get("message", "")
-    print(f"Notificação recebida: {action} - {message}")
-    await broadcast_update(action)
-    return JSONResponse(content={"status": "ok", "action": action}) 
\ No newline at end of file
+    # Só o Django publica eventos: o corpo vem assinado com o segredo compartilhado
+    corpo = await request.body()
+    if not validar_notificacao(SEGREDO_TOKEN, corpo, request.headers.get(CABECALHO_MOMENTO),
+                               request.headers.get(CABECALHO_ASSINATURA)):
+        return JSONResponse(content={"status": "não autorizado"}, status_code=401)
+    data = json.loads(corpo)
+    # O Django envia lotes {"events": [...]}; um evento avulso também é aceito
+    eventos = data["events"] if "events" in data else [data]
+    action = "update"
+    for evento in eventos:
+        action = evento.get("action", "update")
+        # Eventos sem tópicos (avulsos) vão para todas as conexões
+        topicos = evento.pop("topics", None)
+        logger.debug("Notificação recebida: %s - %s", action, evento.get("request_code", ""))
+        metricas.incrementar("realtime_notificacoes_total")
+        # Repassa o evento estruturado (JSON versionado) só para quem assinou os tópicos dele
+        await broadcast_update(evento, topicos)
+    return JSONResponse(content={"status": "ok", "action": action, "events": len(eventos)})
+
+@app.get("/metrics")
+async def metrics(request: FastAPIRequest):
+    cabecalho = request.headers.get("authorization", "")
+    if not (METRICS_TOKEN and cabecalho.startswith("Bearer ")
+            and hmac.compare_digest(cabecalho[7:].encode(), METRICS_TOKEN.encode())):
+        return PlainTextResponse("Não autorizado\n", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(metricas.exportar(), media_type=CONTENT_TYPE)
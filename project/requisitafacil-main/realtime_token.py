@@ -0,0 +1,100 @@
+"""
+Token curto e assinado (HMAC-SHA256) que autoriza uma conexão WebSocket no
+servidor de tempo real, e assinatura das notificações que o Django envia ao /notify.
+
+O Django gera o token a partir da sessão do usuário (core.notifications.token_realtime)
+e o realtime_server.py só confere a assinatura e a validade, sem acessar o banco:
+o próprio token carrega os tópicos que a conexão pode assinar. Os dois lados
+precisam do mesmo segredo: a variável de ambiente REALTIME_TOKEN_SECRET ou, sem
+ela, um segredo derivado do SECRET_KEY do Django (ver segredo_configurado).
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import time
+
+# Cabeçalhos da assinatura das notificações enviadas ao /notify
+CABECALHO_ASSINATURA = 'X-Realtime-Signature'
+CABECALHO_MOMENTO = 'X-Realtime-Timestamp'
+
+# Diferença máxima (segundos) entre o momento assinado e o recebimento de uma notificação
+TOLERANCIA_NOTIFICACAO = 300
+
+
+def derivar_segredo(chave_secreta):
+    """Segredo dos tokens derivado do SECRET_KEY; o próprio SECRET_KEY nunca sai do Django."""
+    return hmac.new(chave_secreta.encode(), b'requisita-facil:realtime-token', hashlib.sha256).hexdigest()
+
+
+def segredo_configurado(chave_secreta=None):
+    """
+    REALTIME_TOKEN_SECRET, ou o segredo derivado de `chave_secreta` (por padrão a
+    variável de ambiente SECRET_KEY). Sem nenhum dos dois não há segredo que os
+    dois processos compartilhem: levanta RuntimeError em vez de usar um valor fixo.
+    """
+    segredo = os.environ.get('REALTIME_TOKEN_SECRET')
+    if segredo:
+        return segredo
+    chave_secreta = chave_secreta or os.environ.get('SECRET_KEY')
+    if not chave_secreta:
+        raise RuntimeError('Defina REALTIME_TOKEN_SECRET ou SECRET_KEY (o mesmo valor usado pelo Django).')
+    return derivar_segredo(chave_secreta)
+
+
+def _codificar(dados):
+    return base64.urlsafe_b64encode(dados).decode().rstrip('=')
+
+
+def _decodificar(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def _assinar(segredo, carga):
+    return _codificar(hmac.new(segredo.encode(), carga.encode(), hashlib.sha256).digest())
+
+
+def gerar_token(segredo, usuario_id, topicos, validade=300, agora=None):
+    agora = time.time() if agora is None else agora
+    corpo = {'u': str(usuario_id), 't': list(topicos), 'exp': int(agora + validade)}
+    carga = _codificar(json.dumps(corpo, separators=(',', ':')).encode())
+    return f'{carga}.{_assinar(segredo, carga)}'
+
+
+def validar_token(segredo, token, agora=None):
+    """Retorna o conteúdo do token ({'u', 't', 'exp'}) ou None se for inválido ou expirado."""
+    try:
+        carga, assinatura = token.split('.')
+        if not hmac.compare_digest(assinatura, _assinar(segredo, carga)):
+            return None
+        corpo = json.loads(_decodificar(carga))
+    except (ValueError, binascii.Error, AttributeError):
+        return None
+    agora = time.time() if agora is None else agora
+    if corpo.get('exp', 0) < agora or not isinstance(corpo.get('t'), list):
+        return None
+    return corpo
+
+
+def _assinar_notificacao(segredo, momento, corpo):
+    mensagem = momento.encode() + b'.' + corpo
+    return hmac.new(segredo.encode(), mensagem, hashlib.sha256).hexdigest()
+
+
+def cabecalhos_notificacao(segredo, corpo, agora=None):
+    """Cabeçalhos que autenticam o corpo (bytes) de um POST ao /notify."""
+    momento = str(int(time.time() if agora is None else agora))
+    return {CABECALHO_MOMENTO: momento, CABECALHO_ASSINATURA: _assinar_notificacao(segredo, momento, corpo)}
+
+
+def validar_notificacao(segredo, corpo, momento, assinatura, agora=None):
+    """Confere a assinatura do corpo e se o momento assinado está dentro da tolerância."""
+    try:
+        diferenca = abs((time.time() if agora is None else agora) - int(momento))
+    except (TypeError, ValueError):
+        return False
+    if diferenca > TOLERANCIA_NOTIFICACAO:
+        return False
+    return hmac.compare_digest(str(assinatura or ''), _assinar_notificacao(segredo, momento, corpo))
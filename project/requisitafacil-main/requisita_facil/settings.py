@@ -15,6 +15,8 @@ import os
 import dj_database_url
 from dotenv import load_dotenv
 
+from realtime_token import segredo_configurado
+
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
 
@@ -47,6 +49,8 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
 
 MIDDLEWARE = [
+    # Primeiro da lista, para medir a requisição inteira (ver core/monitoramento.py)
+    'core.monitoramento.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,7 +64,8 @@ ROOT_URLCONF = 'requisita_facil.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates com o tempo de renderização medido para o /metrics
+        'BACKEND': 'core.monitoramento.DjangoTemplatesMedidos',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,6 +91,29 @@ DATABASES = {
 
 AUTH_USER_MODEL = 'core.User'
 
+# Servidor de tempo real (realtime_server.py) que recebe as notificações das views
+REALTIME_NOTIFY_URL = os.environ.get('REALTIME_NOTIFY_URL', 'http://localhost:8001/notify')
+REALTIME_WS_URL = os.environ.get('REALTIME_WS_URL', 'ws://localhost:8001/ws/updates')
+# Segredo dos tokens das conexões WebSocket e das notificações; deve ser o mesmo do
+# realtime_server.py (REALTIME_TOKEN_SECRET ou derivado do SECRET_KEY, ver realtime_token.py)
+REALTIME_TOKEN_SECRET = segredo_configurado(SECRET_KEY)
+REALTIME_TOKEN_VALIDADE = int(os.environ.get('REALTIME_TOKEN_VALIDADE', '300'))
+
+# Cache (memória local por padrão). Com vários processos, use o backend de arquivo
+# para que a invalidação dos dashboards valha para todos:
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache CACHE_LOCATION=/var/tmp/requisita_cache
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'requisita-facil'),
+    }
+}
+# Token do endpoint /metrics (no Prometheus: authorization.credentials). Sem token, só superusuários logados
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Tempo máximo (segundos) do contexto dos dashboards em cache; 0 desativa
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', '300'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -1,11 +1,15 @@
 import os
 from pathlib import Path
 from .settings import *
+from realtime_token import segredo_configurado
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-j_2q$hjrx4^n=s84#v5m-^(1os+7pa4v!um88r^jou3entdi&)')
 DEBUG = False
+# Em produção o segredo do tempo real vem só do ambiente (REALTIME_TOKEN_SECRET ou
+# SECRET_KEY); sem nenhum dos dois o processo não sobe com um segredo conhecido
+REALTIME_TOKEN_SECRET = segredo_configurado()
 ALLOWED_HOSTS = [
     'requisita-facil-web.onrender.com',
     'requisita-facil-realtime.onrender.com',
@@ -23,6 +27,8 @@ DATABASES = {
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles_collected'
 MIDDLEWARE = [
+    # Primeiro da lista, para medir a requisição inteira (ver core/monitoramento.py)
+    'core.monitoramento.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
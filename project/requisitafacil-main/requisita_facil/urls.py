@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from core import monitoramento
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', monitoramento.metricas, name='metricas'),
     path('accounts/', include('django.contrib.auth.urls')),
     path('', include('core.urls')),
 ]
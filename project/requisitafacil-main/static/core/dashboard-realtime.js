@@ -1,98 +1,272 @@
 // Dashboard Real-time Updates
-document.addEventListener('DOMContentLoaded', function() {
-    console.log('Dashboard Real-time JS carregado');
-    
-    // Conecta ao WebSocket do FastAPI
-    const ws = new WebSocket('ws://localhost:8001/ws/updates');
-    
-    // Mantém a conexão ativa mesmo quando a página perde foco
-    document.addEventListener('visibilitychange', function() {
-        if (!document.hidden && ws.readyState === WebSocket.CLOSED) {
-            console.log('🔄 Reconectando WebSocket após retorno à página...');
-            location.reload();
+// Aplica os eventos de tempo real (recebidos pelo global-websocket.js) nas
+// tabelas e cards da página, sem recarregar nada do servidor.
+//
+// Marcações usadas nos templates:
+//   <tbody data-realtime-tabela data-colunas="codigo,requisitante,..." ...>
+//       data-filtro-status / data-filtro-urgencia: só mostra linhas com esse status/urgência
+//       data-escopo-requester: só considera requisições desse requisitante
+//       data-inserir: insere novas requisições no topo (primeira página sem filtro de data);
+//           data-inserir="fila" busca as linhas no servidor, que sabe a posição na fila
+//       data-limite: número máximo de linhas mantidas na tabela
+//       data-url-detalhe / data-url-atender: URLs com o UUID zerado como marcador
+//   <tr data-request-id="..."> e <td data-campo="status|urgencia">
+//   <div data-realtime-cards data-escopo-requester="..."> com <div data-kpi="pendentes">
+//       data-url-cards: URL com os valores absolutos dos cards em JSON
+//
+// Tabelas com data-fragmento também sabem buscar só as próprias linhas no servidor
+// (?fragmento=1, com ETag/304), e os cards relêem os valores em data-url-cards.
+// Isso é usado quando a página pode ter perdido eventos: reconexão do WebSocket,
+// aviso "resync" do servidor (mensagens descartadas da fila) ou evento de versão
+// desconhecida. Sem isso, uma variação perdida deixaria o card errado até recarregar.
+
+(function() {
+    'use strict';
+
+    const UUID_MARCADOR = '00000000-0000-0000-0000-000000000000';
+    const VERSAO_SUPORTADA = 1;
+
+    const STATUS_CLASSES = {
+        'PENDING': 'bg-warning',
+        'EM_ATENDIMENTO': 'bg-primary',
+        'APPROVED': 'bg-success'
+    };
+
+    function badge(classe, texto) {
+        const span = document.createElement('span');
+        span.className = 'badge ' + classe;
+        span.textContent = texto;
+        return span;
+    }
+
+    function badgeStatus(evento) {
+        let texto = evento.status_display;
+        if (evento.status === 'EM_ATENDIMENTO' && evento.atendido_por) {
+            texto += ' por ' + evento.atendido_por;
         }
-    });
-    
-    ws.onopen = function() {
-        console.log('✅ WebSocket conectado ao dashboard');
-        // Envia uma mensagem de ping para manter a conexão ativa
-        ws.send('ping');
-        
-        // Configura ping periódico para manter a conexão ativa
-        setInterval(() => {
-            if (ws.readyState === WebSocket.OPEN) {
-                console.log('🔄 Enviando ping para manter conexão...');
-                ws.send('ping');
+        return badge(STATUS_CLASSES[evento.status] || 'bg-secondary', texto);
+    }
+
+    function badgeUrgencia(evento) {
+        return badge(evento.urgency === 'URGENTE' ? 'bg-danger' : 'bg-info', evento.urgency_display);
+    }
+
+    function formatarData(iso, formato) {
+        const data = new Date(iso);
+        if (formato === 'hora') {
+            return data.toLocaleTimeString('pt-BR');
+        }
+        return data.toLocaleDateString('pt-BR') + ' ' +
+            data.toLocaleTimeString('pt-BR', {hour: '2-digit', minute: '2-digit'});
+    }
+
+    function link(href, texto, classe) {
+        const a = document.createElement('a');
+        a.href = href;
+        a.textContent = texto;
+        if (classe) {
+            a.className = classe;
+        }
+        return a;
+    }
+
+    // Mesmo corte do filtro truncatechars do Django
+    function truncar(texto, limite) {
+        return texto.length > limite ? texto.slice(0, limite - 1) + '…' : texto;
+    }
+
+    function url(tbody, atributo, evento) {
+        return (tbody.dataset[atributo] || '').replace(UUID_MARCADOR, evento.request_id);
+    }
+
+    function criarCelula(tbody, coluna, evento) {
+        const td = document.createElement('td');
+        switch (coluna) {
+            case 'codigo':
+                td.appendChild(link(url(tbody, 'urlDetalhe', evento), evento.request_code));
+                break;
+            case 'requisitante':
+                td.textContent = evento.requester;
+                break;
+            case 'setor':
+                td.textContent = evento.sector;
+                break;
+            case 'urgencia':
+                td.dataset.campo = 'urgencia';
+                td.appendChild(badgeUrgencia(evento));
+                break;
+            case 'status':
+                td.dataset.campo = 'status';
+                td.appendChild(badgeStatus(evento));
+                break;
+            case 'data':
+                td.textContent = formatarData(evento.created_at, tbody.dataset.formatoData);
+                break;
+            case 'observacoes':
+                td.textContent = truncar(evento.observations || '', 50);
+                break;
+            case 'detalhes':
+                td.appendChild(link(url(tbody, 'urlDetalhe', evento), 'Detalhes', 'btn btn-sm btn-info'));
+                break;
+            case 'atender':
+                td.appendChild(link(url(tbody, 'urlAtender', evento), 'Atender', 'btn btn-sm btn-primary'));
+                break;
+        }
+        return td;
+    }
+
+    function pertenceATabela(tbody, evento) {
+        const escopo = tbody.dataset.escopoRequester;
+        if (escopo && escopo !== evento.requester_id) {
+            return false;
+        }
+        if (tbody.dataset.filtroStatus && tbody.dataset.filtroStatus !== evento.status) {
+            return false;
+        }
+        if (tbody.dataset.filtroUrgencia && tbody.dataset.filtroUrgencia !== evento.urgency) {
+            return false;
+        }
+        return evento.status !== null;
+    }
+
+    function aplicarNaTabela(tbody, evento) {
+        const linha = tbody.querySelector(`tr[data-request-id="${evento.request_id}"]`);
+
+        if (!pertenceATabela(tbody, evento)) {
+            if (linha) {
+                linha.remove();
             }
-        }, 20000); // Ping a cada 20 segundos
-    };
-    
-    ws.onmessage = function(event) {
-        console.log('📨 Mensagem recebida no dashboard:', event.data);
-        
-        // Se recebeu pong, a conexão está ativa
-        if (event.data === 'pong') {
-            console.log('✅ Conexão WebSocket ativa');
             return;
         }
-        
-        // Recarrega a página quando receber uma atualização
-        if (event.data === 'created' || event.data === 'finalized' || event.data === 'update') {
-            console.log('🔄 Atualizando dashboard...');
-            // Mostra uma notificação visual antes de recarregar
-            if (typeof showNotification === 'function') {
-                showNotification('Nova atualização recebida!', 'info');
+
+        if (linha) {
+            const status = linha.querySelector('[data-campo="status"]');
+            if (status) {
+                status.replaceChildren(badgeStatus(evento));
+            }
+            const urgencia = linha.querySelector('[data-campo="urgencia"]');
+            if (urgencia) {
+                urgencia.replaceChildren(badgeUrgencia(evento));
             }
-            setTimeout(function() {
-                location.reload();
-            }, 1000);
+            return;
         }
-    };
-    
-    ws.onerror = function(error) {
-        console.error('❌ Erro no WebSocket:', error);
-    };
-    
-    ws.onclose = function() {
-        console.log('🔌 WebSocket desconectado do dashboard');
-        // Tenta reconectar após 5 segundos
-        setTimeout(function() {
-            console.log('🔄 Tentando reconectar...');
-            location.reload();
-        }, 5000);
-    };
-    
-    // Função para mostrar notificações (se não existir)
-    if (typeof showNotification === 'undefined') {
-        window.showNotification = function(message, type = 'info') {
-            const notification = document.createElement('div');
-            notification.style.cssText = `
-                position: fixed;
-                top: 20px;
-                right: 20px;
-                padding: 15px;
-                border-radius: 5px;
-                color: white;
-                z-index: 9999;
-                font-weight: bold;
-            `;
-            
-            if (type === 'info') {
-                notification.style.backgroundColor = '#007bff';
-            } else if (type === 'success') {
-                notification.style.backgroundColor = '#28a745';
-            } else if (type === 'warning') {
-                notification.style.backgroundColor = '#ffc107';
-            } else {
-                notification.style.backgroundColor = '#dc3545';
+
+        if (evento.action !== 'created' || !tbody.hasAttribute('data-inserir')) {
+            return;
+        }
+        if (tbody.dataset.inserir === 'fila' && tbody.hasAttribute('data-fragmento')) {
+            recarregarFragmento(tbody);
+            return;
+        }
+        const nova = document.createElement('tr');
+        nova.dataset.requestId = evento.request_id;
+        (tbody.dataset.colunas || '').split(',').forEach(coluna => {
+            nova.appendChild(criarCelula(tbody, coluna.trim(), evento));
+        });
+        tbody.querySelectorAll('tr[data-vazio]').forEach(tr => tr.remove());
+        tbody.prepend(nova);
+
+        const limite = parseInt(tbody.dataset.limite || '0', 10);
+        if (limite) {
+            while (tbody.rows.length > limite) {
+                tbody.deleteRow(-1);
+            }
+        }
+    }
+
+    function aplicarNosCards(container, evento) {
+        const escopo = container.dataset.escopoRequester;
+        if (escopo && escopo !== evento.requester_id) {
+            return;
+        }
+        Object.entries(evento.counters || {}).forEach(([nome, variacao]) => {
+            const card = container.querySelector(`[data-kpi="${nome}"]`);
+            if (!card) {
+                return;
+            }
+            const valor = card.querySelector('.card-value') || card;
+            const atual = parseInt(valor.textContent, 10);
+            if (!isNaN(atual)) {
+                valor.textContent = Math.max(0, atual + variacao);
             }
-            
-            notification.textContent = message;
-            document.body.appendChild(notification);
-            
-            setTimeout(function() {
-                notification.remove();
-            }, 3000);
-        };
+        });
     }
-}); 
\ No newline at end of file
+
+    function recarregarFragmento(tbody) {
+        const url = new URL(window.location.href);
+        url.searchParams.set('fragmento', '1');
+        const headers = {'X-Requested-With': 'XMLHttpRequest'};
+        if (tbody.dataset.etag) {
+            headers['If-None-Match'] = tbody.dataset.etag;
+        }
+        return fetch(url, {headers: headers, credentials: 'same-origin', cache: 'no-store'})
+            .then(response => {
+                // 304: nada mudou desde o último fragmento
+                if (response.status === 304 || !response.ok) {
+                    return;
+                }
+                tbody.dataset.etag = response.headers.get('ETag') || '';
+                return response.text().then(html => {
+                    tbody.innerHTML = html;
+                });
+            })
+            .catch(error => console.log('❌ Erro ao atualizar a tabela:', error.message));
+    }
+
+    function recarregarCards(container) {
+        return fetch(container.dataset.urlCards, {
+            headers: {'Accept': 'application/json', 'X-Requested-With': 'XMLHttpRequest'},
+            credentials: 'same-origin',
+            cache: 'no-store'
+        })
+            .then(response => response.ok ? response.json() : null)
+            .then(dados => {
+                if (!dados) {
+                    return;
+                }
+                container.querySelectorAll('[data-kpi]').forEach(card => {
+                    const valor = dados[card.dataset.kpi];
+                    if (typeof valor === 'number') {
+                        (card.querySelector('.card-value') || card).textContent = valor;
+                    }
+                });
+            })
+            .catch(error => console.log('❌ Erro ao atualizar os cards:', error.message));
+    }
+
+    let recargaAgendada = null;
+
+    function recarregarFragmentos() {
+        // Junta pedidos próximos em uma única busca por tabela e por grupo de cards
+        clearTimeout(recargaAgendada);
+        recargaAgendada = setTimeout(() => {
+            document.querySelectorAll('[data-realtime-tabela][data-fragmento]').forEach(recarregarFragmento);
+            document.querySelectorAll('[data-realtime-cards][data-url-cards]').forEach(recarregarCards);
+        }, 300);
+    }
+
+    function aplicarEvento(evento) {
+        if (!evento || typeof evento !== 'object') {
+            return;
+        }
+        if (evento.v !== VERSAO_SUPORTADA || !evento.request_id) {
+            // Aviso de mensagens descartadas ou evento que esta versão do script não sabe
+            // aplicar: pede as linhas e os cards ao servidor
+            recarregarFragmentos();
+            return;
+        }
+        document.querySelectorAll('[data-realtime-tabela]').forEach(tbody => aplicarNaTabela(tbody, evento));
+        document.querySelectorAll('[data-realtime-cards]').forEach(container => aplicarNosCards(container, evento));
+    }
+
+    window.addEventListener('requisita:evento', function(e) {
+        aplicarEvento(e.detail);
+    });
+
+    window.addEventListener('requisita:reconectado', recarregarFragmentos);
+
+    window.DashboardRealtime = {
+        aplicarEvento: aplicarEvento,
+        recarregarFragmentos: recarregarFragmentos
+    };
+})();
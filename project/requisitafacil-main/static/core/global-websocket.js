@@ -1,25 +1,50 @@
 // Global WebSocket Manager
 // Mantém a conexão WebSocket ativa em todas as páginas do sistema
+// A conexão é autenticada por um token curto pedido ao Django a cada (re)conexão;
+// o token define os tópicos (setor, usuário, papel) cujos eventos a página recebe.
 
 (function() {
     'use strict';
     
+    const tokenUrl = document.currentScript && document.currentScript.dataset.tokenUrl;
     let ws = null;
     let reconnectAttempts = 0;
+    let jaConectou = false;
     const maxReconnectAttempts = 5;
     
     function connectWebSocket() {
-        if (ws && ws.readyState === WebSocket.OPEN) {
+        if (ws && (ws.readyState === WebSocket.OPEN || ws.readyState === WebSocket.CONNECTING)) {
             return; // Já está conectado
         }
+        if (!tokenUrl) {
+            return; // Usuário não autenticado
+        }
         
         console.log('🔌 Conectando WebSocket global...');
-        ws = new WebSocket('ws://localhost:8001/ws/updates');
+        fetch(tokenUrl, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+            .then(response => {
+                if (!response.ok || !(response.headers.get('Content-Type') || '').includes('application/json')) {
+                    throw new Error('Sessão expirada');
+                }
+                return response.json();
+            })
+            .then(abrirConexao)
+            .catch(error => console.log('❌ Não foi possível obter o token do WebSocket:', error.message));
+    }
+    
+    function abrirConexao(dados) {
+        ws = new WebSocket(`${dados.url}?token=${encodeURIComponent(dados.token)}`);
         
         ws.onopen = function() {
             console.log('✅ WebSocket global conectado');
             reconnectAttempts = 0;
             
+            // Eventos podem ter se perdido enquanto estava desconectado
+            if (jaConectou) {
+                window.dispatchEvent(new CustomEvent('requisita:reconectado'));
+            }
+            jaConectou = true;
+            
             // Envia ping inicial
             ws.send('ping');
             
@@ -40,20 +65,24 @@
                 return;
             }
             
-            // Se recebeu notificação de atualização
-            if (event.data === 'created' || event.data === 'finalized' || event.data === 'update') {
-                console.log('🔄 Atualização recebida globalmente:', event.data);
-                
-                // Mostra notificação visual
-                showGlobalNotification('Nova atualização no sistema!', 'info');
-                
-                // Se estiver na página do dashboard, recarrega
-                if (window.location.pathname.includes('/dashboard')) {
-                    console.log('🔄 Recarregando dashboard...');
-                    setTimeout(() => {
-                        location.reload();
-                    }, 1000);
-                }
+            // Eventos estruturados (JSON versionado) são repassados para quem aplica
+            // a mudança na página (dashboard-realtime.js); nada é recarregado
+            let evento;
+            try {
+                evento = JSON.parse(event.data);
+            } catch (e) {
+                return;
+            }
+            if (!evento || typeof evento !== 'object') {
+                return;
+            }
+            console.log('🔄 Atualização recebida globalmente:', evento.action, evento.request_code);
+            window.dispatchEvent(new CustomEvent('requisita:evento', {detail: evento}));
+
+            if (evento.action === 'created') {
+                showGlobalNotification(`Nova requisição ${evento.request_code}`, 'info');
+            } else if (evento.action === 'finalized') {
+                showGlobalNotification(`Requisição ${evento.request_code} finalizada`, 'success');
             }
         };
         